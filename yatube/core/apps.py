@@ -1,5 +1,22 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
+
+
+def clear_caches(**kwargs):
+    """Очистить кеши с CLEAR_ON_MIGRATE после migrate и flush.
+
+    Общий кеш переживает пересоздание базы, и без очистки в нём
+    остались бы фрагменты страниц со старыми данными.
+    """
+    from django.conf import settings
+    from django.core.cache import caches
+    for alias in settings.CACHES:
+        if getattr(caches[alias], 'clear_on_migrate', False):
+            caches[alias].clear()
 
 
 class CoreConfig(AppConfig):
     name = 'core'
+
+    def ready(self):
+        post_migrate.connect(clear_caches, sender=self)
@@ -0,0 +1,173 @@
+"""ASGI-приложение поверх WSGI-приложения Django.
+
+Django 2.2 не поддерживает ни ASGI, ни асинхронные представления, поэтому
+соединения с клиентами держит цикл событий, а сам запрос выполняется
+в потоке из пула ограниченного размера. Пока клиент медленно присылает
+тело запроса или забирает ответ, поток не занят. Число одновременных
+запросов к базе не превышает размера пула.
+"""
+import asyncio
+import sys
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+
+# Сколько байт ответа накапливается перед отправкой клиенту. Страница
+# целиком укладывается в один кусок и обрабатывается одним потоком.
+CHUNK_SIZE = 64 * 1024
+
+
+def build_environ(scope, body):
+    """WSGI environ для HTTP-запроса из ASGI scope."""
+    server = scope.get('server') or ('localhost', 80)
+    client = scope.get('client') or ('', 0)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', '').encode().decode('latin-1'),
+        'PATH_INFO': scope['path'].encode().decode('latin-1'),
+        'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+        'SERVER_NAME': server[0],
+        'SERVER_PORT': str(server[1]),
+        'REMOTE_ADDR': client[0],
+        'REMOTE_PORT': str(client[1]),
+        'SERVER_PROTOCOL': 'HTTP/{}'.format(scope.get('http_version', '1.1')),
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': body,
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+    }
+    for name, value in scope.get('headers', ()):
+        name = name.decode('latin-1').upper().replace('-', '_')
+        value = value.decode('latin-1')
+        if name not in ('CONTENT_TYPE', 'CONTENT_LENGTH'):
+            name = 'HTTP_' + name
+        if name in environ:
+            separator = '; ' if name == 'HTTP_COOKIE' else ','
+            value = environ[name] + separator + value
+        environ[name] = value
+    # Тело уже прочитано целиком, даже если клиент слал его кусками.
+    body.seek(0, 2)
+    environ['CONTENT_LENGTH'] = str(body.tell())
+    body.seek(0)
+    return environ
+
+
+def close_response(iterable):
+    """Закрыть ответ; по сигналу request_finished Django закрывает
+    соединение с базой потока, в котором это делается."""
+    close = getattr(iterable, 'close', None)
+    if close is not None:
+        close()
+
+
+def pull(iterable, chunks):
+    """Следующий кусок ответа и признак того, что ответ закончился.
+
+    Закончившийся ответ закрывается в том же потоке (см. close_response).
+    """
+    data = []
+    size = 0
+    for chunk in chunks:
+        data.append(chunk)
+        size += len(chunk)
+        if size >= CHUNK_SIZE:
+            return b''.join(data), False
+    close_response(iterable)
+    return b''.join(data), True
+
+
+class WsgiToAsgi:
+    """Выполняет WSGI-приложение в пуле из max_workers потоков."""
+
+    def __init__(self, wsgi_application, max_workers):
+        self.wsgi_application = wsgi_application
+        self.executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix='asgi'
+        )
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'http':
+            await self.http(scope, receive, send)
+        elif scope['type'] == 'lifespan':
+            await self.lifespan(receive, send)
+        else:
+            raise ValueError(f'Неподдерживаемый тип ASGI: {scope["type"]}')
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def read_body(self, receive):
+        """Тело запроса в файле; None, если клиент отключился."""
+        body = tempfile.SpooledTemporaryFile(
+            max_size=settings.FILE_UPLOAD_MAX_MEMORY_SIZE
+        )
+        while True:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                body.close()
+                return None
+            body.write(message.get('body', b''))
+            if not message.get('more_body', False):
+                return body
+
+    async def http(self, scope, receive, send):
+        body = await self.read_body(receive)
+        if body is None:
+            return
+        started = {}
+
+        def start_response(status, headers, exc_info=None):
+            started['status'] = int(status.split(' ', 1)[0])
+            started['headers'] = [
+                (name.lower().encode('latin-1'), value.encode('latin-1'))
+                for name, value in headers
+            ]
+
+        def run():
+            iterable = self.wsgi_application(
+                build_environ(scope, body), start_response
+            )
+            chunks = iter(iterable)
+            return (iterable, chunks) + pull(iterable, chunks)
+
+        loop = asyncio.get_running_loop()
+        iterable = None
+        done = False
+        try:
+            iterable, chunks, chunk, done = await loop.run_in_executor(
+                self.executor, run
+            )
+            await send({
+                'type': 'http.response.start',
+                'status': started['status'],
+                'headers': started['headers'],
+            })
+            while not done:
+                await send({
+                    'type': 'http.response.body',
+                    'body': chunk,
+                    'more_body': True,
+                })
+                chunk, done = await loop.run_in_executor(
+                    self.executor, pull, iterable, chunks
+                )
+            await send({'type': 'http.response.body', 'body': chunk})
+        finally:
+            body.close()
+            # Клиент отключился или запрос отменён посреди ответа: без
+            # close() не было бы request_finished, а генератор потокового
+            # ответа остался бы открытым.
+            if iterable is not None and not done:
+                await loop.run_in_executor(
+                    self.executor, close_response, iterable
+                )
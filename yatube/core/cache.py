@@ -0,0 +1,367 @@
+"""Общий для всех процессов кеш в файле SQLite.
+
+В отличие от LocMemCache кеш видят все воркеры одного сервера,
+поэтому сброс фрагмента или поколения ленты доходит до каждого,
+а внешний сервис (memcached, Redis) не нужен.
+
+Чтения попадают в замеры запроса (core.timing).
+
+Записи вытесняются по давности последнего чтения (LRU). Время чтения
+обновляется не чаще раза в TOUCH_INTERVAL секунд, чтобы обычное
+попадание не превращалось в запись. Счётчики попаданий, промахов, записей
+и вытеснений ведутся по пространствам имён (см. namespace) и
+сбрасываются в файл пачками.
+"""
+import os
+import pickle
+import re
+import sqlite3
+import threading
+import time
+from collections import Counter, defaultdict
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+from . import timing
+
+NAMESPACE_RE = re.compile(r'(template\.cache\.[^.]+|[^.:|]+)')
+
+SCHEMA = (
+    'CREATE TABLE IF NOT EXISTS cache_entry ('
+    'key TEXT PRIMARY KEY, namespace TEXT NOT NULL, value BLOB NOT NULL, '
+    'expires REAL, accessed REAL NOT NULL) WITHOUT ROWID',
+    'CREATE INDEX IF NOT EXISTS cache_entry_accessed '
+    'ON cache_entry (accessed)',
+    'CREATE TABLE IF NOT EXISTS cache_stats ('
+    'namespace TEXT NOT NULL, name TEXT NOT NULL, value INTEGER NOT NULL, '
+    'PRIMARY KEY (namespace, name)) WITHOUT ROWID',
+)
+
+STATS = ('hits', 'misses', 'sets', 'evictions')
+
+
+def namespace(key):
+    """Пространство имён ключа: фрагмент шаблона или начало ключа.
+
+    'template.cache.index_page_cache.<хеш>' ->
+    'template.cache.index_page_cache', 'feed:index' -> 'feed',
+    'sorl-thumbnail||image||…' -> 'sorl-thumbnail'.
+    """
+    match = NAMESPACE_RE.match(key)
+    return match.group(1) if match else ''
+
+
+class SQLiteCache(BaseCache):
+    """Кеш в файле SQLite: LOCATION — путь к файлу.
+
+    OPTIONS: MAX_ENTRIES и CULL_FREQUENCY — как у остальных бэкендов
+    Django, TOUCH_INTERVAL — как часто обновлять время чтения записи,
+    STATS_FLUSH_EVERY — через сколько операций сбрасывать счётчики,
+    CLEAR_ON_MIGRATE — очищать кеш после migrate (см. core.apps).
+    """
+    CULL_CHECK_EVERY = 32
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self.location = location
+        self.touch_interval = float(options.get('TOUCH_INTERVAL', 60))
+        self.stats_flush_every = int(options.get('STATS_FLUSH_EVERY', 100))
+        self.clear_on_migrate = bool(options.get('CLEAR_ON_MIGRATE', False))
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._stats = defaultdict(Counter)
+        self._pending_stats = 0
+        self._sets_since_cull = 0
+
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None or self._local.pid != os.getpid():
+            directory = os.path.dirname(self.location)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            connection = sqlite3.connect(
+                self.location, timeout=30, isolation_level=None,
+                check_same_thread=False,
+            )
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            for sql in SCHEMA:
+                connection.execute(sql)
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return connection
+
+    def _write(self, func):
+        """Выполнить func(connection) в транзакции с блокировкой записи."""
+        connection = self._connection()
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            result = func(connection)
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+        connection.execute('COMMIT')
+        return result
+
+    def _count(self, key, name, value=1):
+        with self._lock:
+            self._stats[namespace(key)][name] += value
+            self._pending_stats += value
+            flush = self._pending_stats >= self.stats_flush_every
+        if flush:
+            self.flush_stats()
+
+    def flush_stats(self):
+        """Добавить накопленные счётчики процесса к счётчикам в файле."""
+        with self._lock:
+            stats, self._stats = self._stats, defaultdict(Counter)
+            self._pending_stats = 0
+        rows = [
+            (ns, name, value)
+            for ns, counter in stats.items()
+            for name, value in counter.items() if value
+        ]
+        if not rows:
+            return
+        self._write(lambda connection: connection.executemany(
+            'INSERT INTO cache_stats (namespace, name, value) '
+            'VALUES (?, ?, ?) ON CONFLICT (namespace, name) '
+            'DO UPDATE SET value = value + excluded.value',
+            rows,
+        ))
+
+    def stats(self):
+        """Счётчики по пространствам имён: {ns: {'hits': …, …}}."""
+        self.flush_stats()
+        result = {}
+        rows = self._connection().execute(
+            'SELECT namespace, name, value FROM cache_stats'
+        )
+        for ns, name, value in rows:
+            result.setdefault(ns, dict.fromkeys(STATS, 0))[name] = value
+        return result
+
+    def _expires(self, timeout):
+        return self.get_backend_timeout(timeout)
+
+    def _is_alive(self, expires, now):
+        return expires is None or expires > now
+
+    def _touch_stale(self, keys, now):
+        if keys:
+            self._connection().executemany(
+                'UPDATE cache_entry SET accessed = ? WHERE key = ?',
+                [(now, key) for key in keys],
+            )
+
+    def get(self, key, default=None, version=None):
+        return self.get_many([key], version=version).get(key, default)
+
+    def get_many(self, keys, version=None):
+        keys = list(keys)
+        if not keys:
+            return {}
+        start = time.perf_counter()
+        made = {}
+        for key in keys:
+            made_key = self.make_key(key, version=version)
+            self.validate_key(made_key)
+            made[made_key] = key
+        now = time.time()
+        placeholders = ', '.join('?' * len(made))
+        rows = self._connection().execute(
+            'SELECT key, value, expires, accessed FROM cache_entry '
+            f'WHERE key IN ({placeholders})',
+            list(made),
+        ).fetchall()
+        result = {}
+        stale = []
+        for made_key, value, expires, accessed in rows:
+            if not self._is_alive(expires, now):
+                continue
+            result[made[made_key]] = pickle.loads(value)
+            if accessed < now - self.touch_interval:
+                stale.append(made_key)
+        self._touch_stale(stale, now)
+        for key in keys:
+            self._count(key, 'hits' if key in result else 'misses')
+        timing.record_cache(
+            len(result), len(keys) - len(result), time.perf_counter() - start
+        )
+        return result
+
+    def _set_rows(self, connection, rows, now):
+        connection.executemany(
+            'INSERT OR REPLACE INTO cache_entry '
+            '(key, namespace, value, expires, accessed) '
+            'VALUES (?, ?, ?, ?, ?)',
+            [
+                (made_key, namespace(key), value, expires, now)
+                for made_key, key, value, expires in rows
+            ],
+        )
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self.set_many({key: value}, timeout=timeout, version=version)
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        expires = self._expires(timeout)
+        now = time.time()
+        rows = []
+        for key, value in data.items():
+            made_key = self.make_key(key, version=version)
+            self.validate_key(made_key)
+            rows.append((
+                made_key, key,
+                pickle.dumps(value, pickle.HIGHEST_PROTOCOL), expires,
+            ))
+        if not rows:
+            return []
+        self._write(lambda connection: self._set_rows(connection, rows, now))
+        for _, key, _, _ in rows:
+            self._count(key, 'sets')
+        self._maybe_cull(len(rows))
+        return []
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        made_key = self.make_key(key, version=version)
+        self.validate_key(made_key)
+        expires = self._expires(timeout)
+        data = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        now = time.time()
+
+        def add(connection):
+            connection.execute(
+                'DELETE FROM cache_entry WHERE key = ? AND expires <= ?',
+                (made_key, now),
+            )
+            return connection.execute(
+                'INSERT OR IGNORE INTO cache_entry '
+                '(key, namespace, value, expires, accessed) '
+                'VALUES (?, ?, ?, ?, ?)',
+                (made_key, namespace(key), data, expires, now),
+            ).rowcount == 1
+
+        added = self._write(add)
+        if added:
+            self._count(key, 'sets')
+            self._maybe_cull(1)
+        return added
+
+    def incr(self, key, delta=1, version=None):
+        """Атомарно: чтение и запись идут под одной блокировкой файла."""
+        made_key = self.make_key(key, version=version)
+        self.validate_key(made_key)
+        now = time.time()
+
+        def incr(connection):
+            row = connection.execute(
+                'SELECT value, expires FROM cache_entry WHERE key = ?',
+                (made_key,),
+            ).fetchone()
+            if row is None or not self._is_alive(row[1], now):
+                raise ValueError(f"Key '{key}' not found")
+            value = pickle.loads(row[0]) + delta
+            connection.execute(
+                'UPDATE cache_entry SET value = ?, accessed = ? '
+                'WHERE key = ?',
+                (pickle.dumps(value, pickle.HIGHEST_PROTOCOL), now, made_key),
+            )
+            return value
+
+        value = self._write(incr)
+        self._count(key, 'sets')
+        return value
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        made_key = self.make_key(key, version=version)
+        self.validate_key(made_key)
+        now = time.time()
+        return self._write(lambda connection: connection.execute(
+            'UPDATE cache_entry SET expires = ?, accessed = ? '
+            'WHERE key = ? AND (expires IS NULL OR expires > ?)',
+            (self._expires(timeout), now, made_key, now),
+        ).rowcount == 1)
+
+    def has_key(self, key, version=None):
+        made_key = self.make_key(key, version=version)
+        self.validate_key(made_key)
+        return self._connection().execute(
+            'SELECT 1 FROM cache_entry WHERE key = ? '
+            'AND (expires IS NULL OR expires > ?)',
+            (made_key, time.time()),
+        ).fetchone() is not None
+
+    def delete(self, key, version=None):
+        self.delete_many([key], version=version)
+
+    def delete_many(self, keys, version=None):
+        made_keys = []
+        for key in keys:
+            made_key = self.make_key(key, version=version)
+            self.validate_key(made_key)
+            made_keys.append((made_key,))
+        if made_keys:
+            self._write(lambda connection: connection.executemany(
+                'DELETE FROM cache_entry WHERE key = ?', made_keys
+            ))
+
+    def clear(self):
+        self._write(lambda connection: connection.execute(
+            'DELETE FROM cache_entry'
+        ))
+
+    def _maybe_cull(self, added):
+        with self._lock:
+            self._sets_since_cull += added
+            if self._sets_since_cull < self.CULL_CHECK_EVERY:
+                return
+            self._sets_since_cull = 0
+        self.cull()
+
+    def cull(self):
+        """Удалить просроченные записи, а при переполнении — самые давние.
+
+        Как и в других бэкендах Django, за раз удаляется
+        1/CULL_FREQUENCY записей (все — при CULL_FREQUENCY = 0).
+        """
+        now = time.time()
+
+        def cull(connection):
+            evicted = Counter(dict(connection.execute(
+                'SELECT namespace, count(*) FROM cache_entry '
+                'WHERE expires <= ? GROUP BY namespace', (now,)
+            ).fetchall()))
+            connection.execute(
+                'DELETE FROM cache_entry WHERE expires <= ?', (now,)
+            )
+            count = connection.execute(
+                'SELECT count(*) FROM cache_entry'
+            ).fetchone()[0]
+            if count > self._max_entries:
+                if self._cull_frequency:
+                    limit = count - self._max_entries + (
+                        self._max_entries // self._cull_frequency
+                    )
+                else:
+                    limit = count
+                oldest = connection.execute(
+                    'SELECT key, namespace FROM cache_entry '
+                    'ORDER BY accessed LIMIT ?', (limit,)
+                ).fetchall()
+                connection.executemany(
+                    'DELETE FROM cache_entry WHERE key = ?',
+                    [(key,) for key, _ in oldest],
+                )
+                evicted.update(ns for _, ns in oldest)
+            return evicted
+
+        evicted = self._write(cull)
+        with self._lock:
+            for ns, value in evicted.items():
+                self._stats[ns]['evictions'] += value
+        self.flush_stats()
+
+    def close(self, **kwargs):
+        """Соединения живут всё время потока: так дешевле, чем на запрос."""
@@ -0,0 +1,23 @@
+from django.core.cache import caches
+from django.core.management.base import BaseCommand, CommandError
+
+from core.cache import STATS
+
+
+class Command(BaseCommand):
+    help = 'Показывает счётчики кеша по пространствам имён.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--alias', default='default')
+
+    def handle(self, *args, **options):
+        cache = caches[options['alias']]
+        if not hasattr(cache, 'stats'):
+            raise CommandError('Бэкенд кеша не ведёт счётчиков.')
+        self.stdout.write('\t'.join(('namespace', *STATS, 'hit rate')))
+        for namespace, stats in sorted(cache.stats().items()):
+            reads = stats['hits'] + stats['misses']
+            rate = f'{stats["hits"] / reads:.1%}' if reads else '-'
+            self.stdout.write('\t'.join(
+                (namespace, *(str(stats[name]) for name in STATS), rate)
+            ))
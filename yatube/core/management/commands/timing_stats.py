@@ -0,0 +1,66 @@
+from django.core.management.base import BaseCommand
+
+from core.timing import (
+    BUCKETS, METRICS, bucket_label, histograms, percentile,
+)
+
+
+def percentile_label(counts, fraction):
+    index = percentile(counts, fraction)
+    return '-' if index is None else bucket_label(index)
+
+
+class Command(BaseCommand):
+    help = (
+        'Показывает замеры запросов по маршрутам: SQL, кеш, шаблоны и '
+        'общее время (средние и процентили, мс).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--histogram', choices=METRICS,
+            help='Вывести гистограмму этого замера по корзинам.',
+        )
+        parser.add_argument(
+            '--reset', action='store_true', help='Обнулить замеры.',
+        )
+
+    def handle(self, *args, **options):
+        if options['reset']:
+            histograms.reset()
+            return
+        stats = sorted(histograms.stats().items())
+        if options['histogram']:
+            self.histogram(stats, options['histogram'])
+            return
+        self.stdout.write('\t'.join((
+            'url name', 'requests', 'queries', 'sql ms', 'cache ms',
+            'cache hit rate', 'template ms', 'total ms', 'p50', 'p95', 'p99',
+        )))
+        for url_name, data in stats:
+            totals = data['totals']
+            requests = totals['requests'] or 1
+            reads = totals['cache_hits'] + totals['cache_misses']
+            rate = f'{totals["cache_hits"] / reads:.1%}' if reads else '-'
+            counts = data['buckets']['total']
+            self.stdout.write('\t'.join((
+                url_name,
+                str(int(totals['requests'])),
+                f'{totals["queries"] / requests:.1f}',
+                f'{totals["sql_ms"] / requests:.2f}',
+                f'{totals["cache_ms"] / requests:.2f}',
+                rate,
+                f'{totals["template_ms"] / requests:.2f}',
+                f'{totals["total_ms"] / requests:.2f}',
+                *(percentile_label(counts, fraction)
+                  for fraction in (0.5, 0.95, 0.99)),
+            )))
+
+    def histogram(self, stats, metric):
+        self.stdout.write('\t'.join((
+            'url name', *map(bucket_label, range(len(BUCKETS) + 1)),
+        )))
+        for url_name, data in stats:
+            self.stdout.write('\t'.join(
+                (url_name, *map(str, data['buckets'][metric]))
+            ))
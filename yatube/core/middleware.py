@@ -0,0 +1,168 @@
+import os
+import posixpath
+import random
+import time
+from contextlib import ExitStack
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.staticfiles import finders
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.exceptions import MiddlewareNotUsed, SuspiciousFileOperation
+from django.db import connections
+from django.urls import Resolver404, resolve
+from django.utils._os import safe_join
+from django.utils.cache import patch_vary_headers
+
+from . import profiler, timing
+from .staticfiles import ENCODINGS
+from .storage import file_version
+from .views import serve_file
+
+
+def accepted_encodings(request):
+    """Кодировки из Accept-Encoding, кроме запрещённых через q=0."""
+    accepted = set()
+    for item in request.META.get('HTTP_ACCEPT_ENCODING', '').split(','):
+        coding, _, params = item.partition(';')
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                if float(params[2:]) == 0:
+                    continue
+            except ValueError:
+                continue
+        accepted.add(coding.strip().lower())
+    return accepted
+
+
+def url_name(request):
+    """Имя маршрута запроса; '-', если маршрута нет."""
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        try:
+            match = resolve(request.path_info)
+        except Resolver404:
+            return '-'
+    return match.view_name
+
+
+class StaticFilesMiddleware:
+    """Отдаёт статику сам, без отдельного веб-сервера.
+
+    Файлы берутся из STATIC_ROOT (см. core.staticfiles), а пока
+    collectstatic не запускали — из исходных каталогов статики.
+    Из сжатых копий выбирается та, что принимает клиент. Файлы с хешем
+    из манифеста отдаются как неизменные на STATIC_IMMUTABLE_MAX_AGE
+    секунд, остальные — с перепроверкой по ETag и Last-Modified.
+    Стоит первым после SecurityMiddleware, чтобы запрос статики не
+    трогал сессию и кеш страниц.
+    """
+
+    def __init__(self, get_response):
+        if not settings.SERVE_STATIC:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.prefix = settings.STATIC_URL
+        self.immutable = set(
+            getattr(staticfiles_storage, 'hashed_files', {}).values()
+        )
+
+    def __call__(self, request):
+        if (
+            request.method in ('GET', 'HEAD')
+            and request.path_info.startswith(self.prefix)
+        ):
+            response = self.serve(
+                request, request.path_info[len(self.prefix):]
+            )
+            if response is not None:
+                return response
+        return self.get_response(request)
+
+    def find(self, path):
+        """Файл в STATIC_ROOT или, если его там нет, в исходниках."""
+        try:
+            if settings.STATIC_ROOT:
+                fullpath = Path(safe_join(settings.STATIC_ROOT, path))
+                if fullpath.is_file():
+                    return fullpath
+            found = finders.find(path)
+        except SuspiciousFileOperation:
+            return None
+        return Path(found) if found else None
+
+    def serve(self, request, path):
+        path = posixpath.normpath(path).lstrip('/')
+        fullpath = self.find(path)
+        if fullpath is None:
+            return None
+        served, encoding = fullpath, None
+        accepted = accepted_encodings(request)
+        for coding, suffix in ENCODINGS:
+            compressed = fullpath.with_name(fullpath.name + suffix)
+            if coding in accepted and compressed.is_file():
+                served, encoding = compressed, coding
+                break
+        immutable = path in self.immutable
+        response = serve_file(
+            request, served,
+            version=file_version(path) if immutable else None,
+            max_age=settings.STATIC_IMMUTABLE_MAX_AGE if immutable else None,
+            name=str(fullpath), encoding=encoding,
+        )
+        patch_vary_headers(response, ('Accept-Encoding',))
+        return response
+
+
+class ProfilerMiddleware:
+    """Профилирует выборку запросов (см. core.profiler).
+
+    Стоит первым в MIDDLEWARE, чтобы в стеки попадала и работа
+    остальных middleware, в том числе ответы из кеша страниц.
+    """
+
+    def __init__(self, get_response):
+        if not (settings.PROFILER_ENABLED or settings.PROFILER_SIGNAL_FILE):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.switch = profiler.Switch()
+
+    def __call__(self, request):
+        rates = self.switch.rates()
+        if not rates:
+            return self.get_response(request)
+        name = url_name(request)
+        if random.random() >= profiler.rate(rates, name):
+            return self.get_response(request)
+        with profiler.Sampler(settings.PROFILER_INTERVAL) as sampler:
+            response = self.get_response(request)
+        sampler.dump(os.path.join(
+            settings.PROFILER_DIR, name.replace(':', '-') + '.folded'
+        ))
+        return response
+
+
+class TimingMiddleware:
+    """Замеряет запрос: SQL, кеш, шаблоны и общее время (core.timing).
+
+    Стоит сразу после ProfilerMiddleware: в общее время попадают
+    и статика, и ответы из кеша страниц.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        start = time.perf_counter()
+        with timing.collect() as timings, ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(
+                    connection.execute_wrapper(timing.execute_wrapper)
+                )
+            response = self.get_response(request)
+        total = time.perf_counter() - start
+        if settings.SERVER_TIMING:
+            response['Server-Timing'] = timings.server_timing(total)
+        timing.histograms.add(url_name(request), timings, total)
+        return response
@@ -0,0 +1,143 @@
+"""Выборочный профилировщик запросов.
+
+Пока запрос выполняется, отдельный поток раз в PROFILER_INTERVAL
+секунд снимает стек потока запроса (sys._current_frames). Стеки
+сворачиваются в строки «кадр;кадр;кадр число» — формат, который
+понимают flamegraph.pl, speedscope и inferno, — и дописываются в файл
+<PROFILER_DIR>/<имя маршрута>.folded.
+
+Включается настройкой PROFILER_ENABLED или, без перезапуска,
+файлом PROFILER_SIGNAL_FILE, если его путь задан. Без обеих настроек
+ProfilerMiddleware не подключается. Доли профилируемых запросов по именам
+маршрутов задаёт PROFILER_RATES; если в файле-сигнале лежит JSON с
+таким же словарём, действует он.
+"""
+import json
+import os
+import sys
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+
+# Как часто проверять файл-сигнал, секунд.
+SIGNAL_CHECK_INTERVAL = 1
+
+
+def frame_label(code):
+    """Подпись кадра: функция и файл относительно проекта или пакетов."""
+    filename = code.co_filename
+    if filename.startswith(settings.BASE_DIR):
+        filename = os.path.relpath(filename, settings.BASE_DIR)
+    else:
+        filename = filename.rpartition('site-packages' + os.sep)[2]
+    return f'{code.co_name} ({filename}:{code.co_firstlineno})'.replace(
+        ';', ':'
+    )
+
+
+def fold(frame):
+    """Стек от внешнего кадра к внутреннему одной строкой."""
+    labels = []
+    while frame is not None:
+        labels.append(frame_label(frame.f_code))
+        frame = frame.f_back
+    return ';'.join(reversed(labels))
+
+
+class Sampler:
+    """Снимает стеки одного потока, пока открыт контекст."""
+
+    def __init__(self, interval, thread_id=None):
+        self.interval = interval
+        self.thread_id = thread_id or threading.get_ident()
+        self.stacks = Counter()
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(
+            target=self.run, name='profiler', daemon=True
+        )
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stopped.set()
+        self.thread.join()
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is not None:
+                self.stacks[fold(frame)] += 1
+
+    def dump(self, path):
+        """Дописать свёрнутые стеки в файл одной записью."""
+        if not self.stacks:
+            return
+        data = ''.join(
+            f'{stack} {count}\n' for stack, count in self.stacks.items()
+        )
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'a', encoding='utf-8') as file:
+            file.write(data)
+
+
+class Switch:
+    """Включён ли профилировщик и с какими долями запросов.
+
+    Файл-сигнал проверяется не чаще раза в SIGNAL_CHECK_INTERVAL
+    секунд, чтобы обычный запрос не платил за обращение к диску.
+    """
+
+    def __init__(self):
+        self.checked = None
+        self.mtime = None
+        self.signal_rates = None
+
+    def rates(self):
+        """Словарь долей или None, если профилировщик выключен."""
+        signal_rates = self.read_signal()
+        if signal_rates is not None:
+            return signal_rates
+        if settings.PROFILER_ENABLED:
+            return settings.PROFILER_RATES
+        return None
+
+    def read_signal(self):
+        path = settings.PROFILER_SIGNAL_FILE
+        if not path:
+            return None
+        now = time.monotonic()
+        if (
+            self.checked is not None
+            and now - self.checked < SIGNAL_CHECK_INTERVAL
+        ):
+            return self.signal_rates
+        self.checked = now
+        try:
+            mtime = os.stat(path).st_mtime
+        except OSError:
+            self.mtime = self.signal_rates = None
+            return None
+        if mtime != self.mtime:
+            self.mtime = mtime
+            self.signal_rates = self.parse(path)
+        return self.signal_rates
+
+    def parse(self, path):
+        try:
+            with open(path, encoding='utf-8') as file:
+                content = file.read().strip()
+            rates = json.loads(content) if content else {}
+        except (OSError, ValueError):
+            rates = {}
+        if not isinstance(rates, dict):
+            rates = {}
+        return rates or settings.PROFILER_RATES
+
+
+def rate(rates, url_name):
+    """Доля профилируемых запросов к маршруту."""
+    return rates.get(url_name, rates.get('*', 0))
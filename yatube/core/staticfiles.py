@@ -0,0 +1,90 @@
+"""Статика с хешами в именах и заранее сжатыми копиями.
+
+collectstatic кладёт в STATIC_ROOT файлы с хешем содержимого в имени
+(css/bootstrap.min.1a2b3c4d5e6f.css) и манифест, а рядом со сжимаемыми
+файлами — копии .gz и, если установлен пакет brotli, .br. Отдаёт их
+core.middleware.StaticFilesMiddleware.
+"""
+import gzip
+import os
+
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.core.files.base import ContentFile
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Форматы, которые уже сжаты: повторное сжатие их только увеличит.
+SKIP_EXTENSIONS = frozenset((
+    '.avif', '.br', '.gif', '.gz', '.ico', '.jpeg', '.jpg', '.png',
+    '.webp', '.woff', '.woff2', '.zip',
+))
+# Сжатая копия сохраняется, только если она меньше этой доли оригинала.
+MIN_RATIO = 0.95
+
+
+def gzip_compress(data):
+    # mtime=0: одинаковый файл даёт одинаковую копию при каждой сборке.
+    return gzip.compress(data, compresslevel=9, mtime=0)
+
+
+def brotli_compress(data):
+    return brotli.compress(data, quality=11)
+
+
+# Content-Encoding и суффикс сжатой копии в порядке предпочтения.
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+COMPRESSORS = {'gzip': gzip_compress}
+if brotli is not None:
+    COMPRESSORS['br'] = brotli_compress
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """ManifestStaticFilesStorage, который ещё и сжимает файлы.
+
+    Пока collectstatic не запускали, манифеста нет, и {% static %}
+    отдаёт имена без хеша — так работают тесты и разработка. Так же
+    выводятся и файлы, которых в манифесте нет: битая ссылка в шаблоне
+    не должна ронять страницу.
+    """
+
+    def stored_name(self, name):
+        if self.hashed_files:
+            try:
+                return super().stored_name(name)
+            except ValueError:
+                pass
+        return name
+
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run, **options)
+        if dry_run:
+            return
+        names = set(paths) | set(self.hashed_files.values())
+        for name in sorted(names):
+            for compressed in self.compress(name):
+                yield name, compressed, True
+
+    def compress(self, name):
+        """Записать сжатые копии файла; вернуть их имена."""
+        if os.path.splitext(name)[1].lower() in SKIP_EXTENSIONS:
+            return []
+        if not self.exists(name):
+            return []
+        with self.open(name) as original:
+            data = original.read()
+        written = []
+        for encoding, suffix in ENCODINGS:
+            if encoding not in COMPRESSORS:
+                continue
+            compressed = COMPRESSORS[encoding](data)
+            if len(compressed) >= len(data) * MIN_RATIO:
+                continue
+            compressed_name = name + suffix
+            if self.exists(compressed_name):
+                self.delete(compressed_name)
+            self._save(compressed_name, ContentFile(compressed))
+            written.append(compressed_name)
+        return written
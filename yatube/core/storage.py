@@ -0,0 +1,80 @@
+"""Хранилище загрузок с адресами, зависящими от содержимого.
+
+Загруженный файл сохраняется под именем с хешем содержимого
+(posts/photo.1a2b3c4d5e6f.jpg), так что по одному адресу всегда
+лежат одни и те же байты, и браузеры и прокси могут хранить файл
+сколько угодно (см. core.views.media). Одинаковые файлы хранятся один
+раз.
+
+Миниатюры sorl (settings.THUMBNAIL_PREFIX) не переименовываются:
+sorl ищет их по имени, которое сам вычисляет из имени оригинала
+и параметров, а значит, для оригинала с хешем оно тоже неизменно.
+"""
+import hashlib
+import os
+import re
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+
+HASH_LENGTH = 12
+HASHED_NAME_RE = re.compile(r'\.([0-9a-f]{%d})(\.[^./]+)?$' % HASH_LENGTH)
+
+
+def thumbnail_prefix():
+    return getattr(settings, 'THUMBNAIL_PREFIX', 'cache/')
+
+
+def content_hash(content):
+    """Первые HASH_LENGTH знаков md5 содержимого файла."""
+    md5 = hashlib.md5()
+    if content.seekable():
+        content.seek(0)
+    for chunk in content.chunks():
+        md5.update(chunk)
+    if content.seekable():
+        content.seek(0)
+    return md5.hexdigest()[:HASH_LENGTH]
+
+
+def file_version(name):
+    """Хеш из имени файла или None, если имя его не содержит."""
+    match = HASHED_NAME_RE.search(name)
+    return match.group(1) if match else None
+
+
+def is_immutable(name):
+    """Содержимое файла с таким именем никогда не меняется."""
+    return (
+        file_version(name) is not None
+        or name.startswith(thumbnail_prefix())
+    )
+
+
+class HashedMediaStorage(FileSystemStorage):
+    """FileSystemStorage, добавляющий к именам загрузок хеш содержимого."""
+
+    def hashed_name(self, name, content, max_length=None):
+        """Имя с хешем; основа имени укорачивается до max_length."""
+        root, ext = os.path.splitext(name)
+        if file_version(name) is not None:
+            root = root[:-HASH_LENGTH - 1]
+        suffix = f'.{content_hash(content)}{ext}'
+        if max_length is not None:
+            directory, stem = os.path.split(root)
+            prefix = len(os.path.join(directory, ''))
+            stem = stem[:max(1, max_length - prefix - len(suffix))]
+            root = os.path.join(directory, stem)
+        return f'{root}{suffix}'
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        if not name.startswith(thumbnail_prefix()):
+            name = self.hashed_name(name, content, max_length)
+            if self.exists(name):
+                return name.replace('\\', '/')
+        return super().save(name, content, max_length)
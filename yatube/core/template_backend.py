@@ -0,0 +1,19 @@
+from django.template.backends import django
+
+from . import timing
+
+
+class Template(django.Template):
+    def render(self, context=None, request=None):
+        with timing.template_render():
+            return super().render(context, request)
+
+
+class DjangoTemplates(django.DjangoTemplates):
+    """Шаблонизатор Django, который замеряет время рендеринга."""
+
+    def from_string(self, template_code):
+        return Template(super().from_string(template_code).template, self)
+
+    def get_template(self, template_name):
+        return Template(super().get_template(template_name).template, self)
@@ -0,0 +1,166 @@
+import asyncio
+import threading
+import time
+
+from django.test import SimpleTestCase
+
+from core.asgi import CHUNK_SIZE, WsgiToAsgi
+
+
+def call(application, scope, messages):
+    """Выполнить ASGI-приложение; вернуть отправленные им сообщения."""
+    received = list(messages)
+    sent = []
+
+    async def receive():
+        return received.pop(0)
+
+    async def send(message):
+        sent.append(message)
+
+    asyncio.run(application(scope, receive, send))
+    return sent
+
+
+def http_scope(path='/', method='GET', query_string=b'', headers=()):
+    return {
+        'type': 'http', 'method': method, 'path': path,
+        'query_string': query_string, 'headers': list(headers),
+        'server': ('testserver', 80), 'client': ('127.0.0.1', 5000),
+    }
+
+
+class WsgiToAsgiTests(SimpleTestCase):
+    def test_request_reaches_wsgi_application(self):
+        environs = []
+
+        def wsgi_application(environ, start_response):
+            environs.append(dict(environ, body=environ['wsgi.input'].read()))
+            start_response('201 Created', [('Content-Type', 'text/plain')])
+            return [b'ok']
+
+        sent = call(
+            WsgiToAsgi(wsgi_application, 1),
+            http_scope(
+                '/группа/', 'POST', b'a=1',
+                [(b'cookie', b'a=1'), (b'cookie', b'b=2'),
+                 (b'content-type', b'text/plain')],
+            ),
+            [{'type': 'http.request', 'body': b'te', 'more_body': True},
+             {'type': 'http.request', 'body': b'xt'}],
+        )
+        environ = environs[0]
+        self.assertEqual(environ['REQUEST_METHOD'], 'POST')
+        self.assertEqual(
+            environ['PATH_INFO'].encode('latin-1').decode(), '/группа/'
+        )
+        self.assertEqual(environ['QUERY_STRING'], 'a=1')
+        self.assertEqual(environ['HTTP_COOKIE'], 'a=1; b=2')
+        self.assertEqual(environ['CONTENT_TYPE'], 'text/plain')
+        self.assertEqual(environ['CONTENT_LENGTH'], '4')
+        self.assertEqual(environ['body'], b'text')
+        self.assertEqual(sent, [
+            {'type': 'http.response.start', 'status': 201,
+             'headers': [(b'content-type', b'text/plain')]},
+            {'type': 'http.response.body', 'body': b'ok'},
+        ])
+
+    def test_large_response_is_streamed(self):
+        closed = []
+
+        class Response(list):
+            def close(self):
+                closed.append(True)
+
+        def wsgi_application(environ, start_response):
+            start_response('200 OK', [])
+            return Response([b'x' * CHUNK_SIZE, b'y'])
+
+        sent = call(
+            WsgiToAsgi(wsgi_application, 1), http_scope(),
+            [{'type': 'http.request'}],
+        )
+        self.assertEqual([message.get('more_body') for message in sent], [
+            None, True, None,
+        ])
+        self.assertEqual(sent[-1]['body'], b'y')
+        self.assertEqual(len(closed), 1)
+
+    def test_response_is_closed_when_send_fails(self):
+        closed = []
+
+        class Response(list):
+            def close(self):
+                closed.append(threading.current_thread().name)
+
+        def wsgi_application(environ, start_response):
+            start_response('200 OK', [])
+            return Response([b'x' * CHUNK_SIZE, b'y'])
+
+        async def receive():
+            return {'type': 'http.request'}
+
+        async def send(message):
+            if message.get('more_body'):
+                raise OSError('клиент отключился')
+
+        with self.assertRaises(OSError):
+            asyncio.run(
+                WsgiToAsgi(wsgi_application, 1)(http_scope(), receive, send)
+            )
+        self.assertEqual(len(closed), 1)
+        self.assertTrue(closed[0].startswith('asgi'))
+
+    def test_pool_bounds_concurrent_requests(self):
+        lock = threading.Lock()
+        running = []
+        peak = []
+
+        def wsgi_application(environ, start_response):
+            with lock:
+                running.append(1)
+                peak.append(len(running))
+            time.sleep(0.05)
+            with lock:
+                running.pop()
+            start_response('200 OK', [])
+            return [b'']
+
+        application = WsgiToAsgi(wsgi_application, 2)
+
+        async def request():
+            messages = [{'type': 'http.request'}]
+
+            async def receive():
+                return messages.pop(0)
+
+            async def send(message):
+                pass
+
+            await application(http_scope(), receive, send)
+
+        async def main():
+            await asyncio.gather(*(request() for _ in range(6)))
+
+        asyncio.run(main())
+        self.assertEqual(len(peak), 6)
+        self.assertEqual(max(peak), 2)
+
+    def test_project_application(self):
+        from yatube.asgi import application
+
+        sent = call(
+            application, http_scope('/static/css/bootstrap.min.css'),
+            [{'type': 'http.request'}],
+        )
+        self.assertEqual(sent[0]['status'], 200)
+        self.assertIn(
+            (b'content-type', b'text/css'), sent[0]['headers']
+        )
+        self.assertEqual(call(
+            application, {'type': 'lifespan'},
+            [{'type': 'lifespan.startup'}, {'type': 'lifespan.shutdown'}],
+        ), [
+            {'type': 'lifespan.startup.complete'},
+            {'type': 'lifespan.shutdown.complete'},
+        ])
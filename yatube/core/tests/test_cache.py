@@ -0,0 +1,99 @@
+import os
+import shutil
+import tempfile
+import threading
+
+from django.test import SimpleTestCase
+
+from core.cache import SQLiteCache, namespace
+
+
+class SQLiteCacheTests(SimpleTestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.location = os.path.join(self.directory, 'cache.sqlite3')
+        self.cache = self._cache()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def _cache(self, **options):
+        return SQLiteCache(self.location, {
+            'OPTIONS': {'STATS_FLUSH_EVERY': 1, **options},
+        })
+
+    def test_values_are_shared_between_instances(self):
+        """Запись одного экземпляра видна другому (другому процессу)."""
+        other = self._cache()
+        self.cache.set('key', {'a': 1})
+        self.assertEqual(other.get('key'), {'a': 1})
+        other.delete('key')
+        self.assertIsNone(self.cache.get('key'))
+
+    def test_bulk_operations_and_expiry(self):
+        """get_many/set_many/add работают, просроченное не отдаётся."""
+        self.cache.set_many({'a': 1, 'b': 2})
+        self.cache.set('gone', 3, timeout=-1)
+        self.assertEqual(
+            self.cache.get_many(['a', 'b', 'gone', 'missing']),
+            {'a': 1, 'b': 2},
+        )
+        self.assertFalse(self.cache.add('a', 10))
+        self.assertTrue(self.cache.add('gone', 4))
+        self.assertEqual(self.cache.get('gone'), 4)
+        self.assertTrue(self.cache.has_key('a'))
+        self.cache.clear()
+        self.assertFalse(self.cache.has_key('a'))
+
+    def test_incr_is_atomic(self):
+        """Параллельные incr из разных потоков не теряют приращений."""
+        self.cache.set('counter', 0)
+
+        def work():
+            cache = self._cache()
+            for _ in range(50):
+                cache.incr('counter')
+
+        threads = [threading.Thread(target=work) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(self.cache.get('counter'), 200)
+        with self.assertRaises(ValueError):
+            self.cache.incr('missing')
+
+    def test_least_recently_used_entries_are_evicted(self):
+        """При переполнении вытесняются записи, которые давно не читали."""
+        cache = self._cache(
+            MAX_ENTRIES=4, CULL_FREQUENCY=4, TOUCH_INTERVAL=0
+        )
+        for i in range(4):
+            cache.set(f'old:{i}', i)
+        cache.get('old:0')
+        cache.set_many({f'new:{i}': i for i in range(2)})
+        cache.cull()
+        self.assertEqual(
+            sorted(cache.get_many(
+                ['old:0', 'old:1', 'old:2', 'old:3', 'new:0', 'new:1']
+            )),
+            ['new:0', 'new:1', 'old:0'],
+        )
+        self.assertEqual(cache.stats()['old']['evictions'], 3)
+
+    def test_stats_by_namespace(self):
+        """Попадания и промахи считаются по пространствам имён."""
+        self.cache.set('feed:index', 1)
+        self.cache.get('feed:index')
+        self.cache.get('feed:group:x')
+        self.cache.get('template.cache.index_page_cache.abc')
+        stats = self.cache.stats()
+        self.assertEqual(
+            stats['feed'],
+            {'hits': 1, 'misses': 1, 'sets': 1, 'evictions': 0},
+        )
+        self.assertEqual(
+            stats['template.cache.index_page_cache']['misses'], 1
+        )
+        self.assertEqual(namespace('sorl-thumbnail||image||x'),
+                         'sorl-thumbnail')
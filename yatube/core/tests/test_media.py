@@ -0,0 +1,92 @@
+import os
+import shutil
+import tempfile
+
+from django.core.files.base import ContentFile
+from django.test import Client, SimpleTestCase, override_settings
+
+from core.storage import HashedMediaStorage, file_version, is_immutable
+
+
+class HashedMediaStorageTests(SimpleTestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.storage = HashedMediaStorage(location=self.directory)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def test_name_contains_content_hash(self):
+        """Одинаковое содержимое — одно имя, другое — другое."""
+        first = self.storage.save('posts/photo.jpg', ContentFile(b'one'))
+        again = self.storage.save('posts/photo.jpg', ContentFile(b'one'))
+        other = self.storage.save('posts/photo.jpg', ContentFile(b'two'))
+        self.assertRegex(first, r'^posts/photo\.[0-9a-f]{12}\.jpg$')
+        self.assertEqual(again, first)
+        self.assertNotEqual(other, first)
+        self.assertEqual(len(os.listdir(self.storage.path('posts'))), 2)
+        self.assertTrue(is_immutable(first))
+        self.assertIsNotNone(file_version(first))
+
+    def test_long_names_keep_hash(self):
+        """Укорачивается основа имени, хеш и расширение остаются."""
+        name = self.storage.save(
+            'posts/' + 'x' * 200 + '.jpg', ContentFile(b'data'), 40
+        )
+        self.assertEqual(len(name), 40)
+        self.assertIsNotNone(file_version(name))
+
+    def test_thumbnails_are_not_renamed(self):
+        """Миниатюры sorl сохраняются под своими именами."""
+        name = self.storage.save('cache/ab/cd/thumb.jpg', ContentFile(b'x'))
+        self.assertEqual(name, 'cache/ab/cd/thumb.jpg')
+        self.assertTrue(is_immutable(name))
+        self.assertFalse(is_immutable('posts/IMG_6845_Iq7yEWf.jpg'))
+
+
+class MediaViewTests(SimpleTestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.settings = override_settings(MEDIA_ROOT=self.directory)
+        self.settings.enable()
+        self.client = Client()
+        os.makedirs(os.path.join(self.directory, 'posts'))
+        for name in ('photo.0123456789ab.jpg', 'old.jpg'):
+            with open(os.path.join(self.directory, 'posts', name), 'wb') as f:
+                f.write(b'image')
+
+    def tearDown(self):
+        self.settings.disable()
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def test_hashed_files_are_immutable(self):
+        response = self.client.get('/media/posts/photo.0123456789ab.jpg')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), b'image')
+        self.assertEqual(response['ETag'], '"0123456789ab"')
+        self.assertIn('immutable', response['Cache-Control'])
+        self.assertIn('max-age=31536000', response['Cache-Control'])
+
+    def test_conditional_requests(self):
+        """ETag и Last-Modified дают 304 без тела."""
+        for url in ('/media/posts/photo.0123456789ab.jpg',
+                    '/media/posts/old.jpg'):
+            response = self.client.get(url)
+            for header, value in (
+                ('HTTP_IF_NONE_MATCH', response['ETag']),
+                ('HTTP_IF_MODIFIED_SINCE', response['Last-Modified']),
+            ):
+                with self.subTest(url=url, header=header):
+                    conditional = self.client.get(url, **{header: value})
+                    self.assertEqual(conditional.status_code, 304)
+                    self.assertEqual(conditional.content, b'')
+
+    def test_other_files_are_revalidated(self):
+        response = self.client.get('/media/posts/old.jpg')
+        self.assertIn('no-cache', response['Cache-Control'])
+        self.assertNotIn('immutable', response['Cache-Control'])
+
+    def test_missing_and_outside_files(self):
+        for url in ('/media/posts/missing.jpg', '/media/posts/'):
+            with self.subTest(url=url):
+                self.assertEqual(self.client.get(url).status_code, 404)
@@ -0,0 +1,87 @@
+import os
+import shutil
+import tempfile
+import time
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, override_settings
+
+from core.middleware import ProfilerMiddleware
+from core.profiler import Sampler
+
+
+def slow_view(request):
+    deadline = time.monotonic() + 0.05
+    while time.monotonic() < deadline:
+        pass
+    return HttpResponse()
+
+
+class ProfilerTests(SimpleTestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.signal_file = os.path.join(self.directory, 'enabled')
+        self.settings = override_settings(
+            PROFILER_ENABLED=False,
+            PROFILER_DIR=self.directory,
+            PROFILER_SIGNAL_FILE=self.signal_file,
+            PROFILER_RATES={'about:author': 1, '*': 0},
+            PROFILER_INTERVAL=0.001,
+        )
+        self.settings.enable()
+        self.factory = RequestFactory()
+
+    def tearDown(self):
+        self.settings.disable()
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def request(self, path):
+        ProfilerMiddleware(slow_view)(self.factory.get(path))
+
+    def dump(self, url_name):
+        path = os.path.join(self.directory, url_name + '.folded')
+        if not os.path.exists(path):
+            return None
+        with open(path, encoding='utf-8') as file:
+            return file.read()
+
+    def test_sampler_writes_folded_stacks(self):
+        with Sampler(0.001) as sampler:
+            slow_view(None)
+        path = os.path.join(self.directory, 'stacks.folded')
+        sampler.dump(path)
+        with open(path, encoding='utf-8') as file:
+            lines = file.read().splitlines()
+        self.assertTrue(lines)
+        for line in lines:
+            stack, count = line.rsplit(' ', 1)
+            self.assertGreater(int(count), 0)
+        self.assertTrue(any(
+            'slow_view (core/tests/test_profiler.py' in line for line in lines
+        ))
+
+    def test_rates_follow_url_name(self):
+        with override_settings(PROFILER_ENABLED=True):
+            self.request('/about/author/')
+            self.request('/about/tech/')
+        self.assertIn('slow_view', self.dump('about-author'))
+        self.assertIsNone(self.dump('about-tech'))
+
+    def test_signal_file_turns_profiler_on(self):
+        self.request('/about/author/')
+        self.assertIsNone(self.dump('about-author'))
+        with open(self.signal_file, 'w') as file:
+            file.write('{"about:tech": 1}')
+        self.request('/about/tech/')
+        self.assertIn('slow_view', self.dump('about-tech'))
+
+    def test_middleware_is_not_used_when_off(self):
+        with override_settings(PROFILER_SIGNAL_FILE=None):
+            with self.assertRaises(MiddlewareNotUsed):
+                ProfilerMiddleware(slow_view)
+
+    def test_toolbar_is_development_only(self):
+        self.assertFalse(settings.DEBUG)
+        self.assertNotIn('debug_toolbar', settings.INSTALLED_APPS)
@@ -0,0 +1,80 @@
+import os
+import shutil
+import tempfile
+
+from django.core.management import call_command
+from django.templatetags.static import static
+from django.test import (
+    Client, RequestFactory, SimpleTestCase, override_settings,
+)
+
+from core.middleware import accepted_encodings
+
+
+class StaticFilesTests(SimpleTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.directory = tempfile.mkdtemp()
+        cls.settings = override_settings(STATIC_ROOT=cls.directory)
+        cls.settings.enable()
+        call_command('collectstatic', interactive=False, verbosity=0)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.settings.disable()
+        shutil.rmtree(cls.directory, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        self.client = Client()
+        self.css_url = static('css/bootstrap.min.css')
+
+    def test_collectstatic_writes_hashed_and_compressed_files(self):
+        self.assertRegex(
+            self.css_url, r'^/static/css/bootstrap\.min\.[0-9a-f]{12}\.css$'
+        )
+        css = os.path.join(self.directory, self.css_url[len('/static/'):])
+        self.assertTrue(os.path.isfile(css + '.gz'))
+        self.assertFalse(os.path.isfile(
+            os.path.join(self.directory, 'img', 'logo2.png.gz')
+        ))
+
+    def test_hashed_file_is_immutable_and_compressed(self):
+        response = self.client.get(self.css_url, HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(response['Content-Type'], 'text/css')
+        self.assertIn('Accept-Encoding', response['Vary'])
+        self.assertIn('immutable', response['Cache-Control'])
+        conditional = self.client.get(
+            self.css_url, HTTP_ACCEPT_ENCODING='gzip',
+            HTTP_IF_NONE_MATCH=response['ETag'],
+        )
+        self.assertEqual(conditional.status_code, 304)
+
+    def test_encoding_follows_accept_encoding(self):
+        for header, encoding in (
+            ('', None),
+            ('gzip;q=0, deflate', None),
+            ('br, gzip', 'gzip'),
+        ):
+            with self.subTest(header=header):
+                response = self.client.get(
+                    self.css_url, HTTP_ACCEPT_ENCODING=header
+                )
+                self.assertEqual(response.get('Content-Encoding'), encoding)
+
+    def test_unhashed_file_is_revalidated(self):
+        response = self.client.get('/static/css/bootstrap.min.css')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('no-cache', response['Cache-Control'])
+        self.assertEqual(
+            self.client.get('/static/css/missing.css').status_code, 404
+        )
+
+    def test_accepted_encodings(self):
+        request = RequestFactory().get(
+            '/', HTTP_ACCEPT_ENCODING='gzip, br;q=0, deflate;q=0.5'
+        )
+        self.assertEqual(accepted_encodings(request), {'gzip', 'deflate'})
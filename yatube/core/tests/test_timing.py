@@ -0,0 +1,90 @@
+import os
+import shutil
+import tempfile
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.template.loader import render_to_string
+from django.test import Client, SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+
+from core import timing
+from posts.models import Post
+
+User = get_user_model()
+
+
+class ServerTimingTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.directory = tempfile.mkdtemp()
+        cls.settings = override_settings(
+            TIMING_LOCATION=os.path.join(cls.directory, 'timing.sqlite3'),
+        )
+        cls.settings.enable()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.settings.disable()
+        shutil.rmtree(cls.directory, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        cache.clear()
+        timing.histograms.reset()
+        author = User.objects.create_user(username='author')
+        self.post = Post.objects.create(author=author, text='Текст')
+
+    def test_header_reports_queries_cache_and_templates(self):
+        response = Client().get(
+            reverse('posts:post_detail', args=(self.post.id,))
+        )
+        header = response['Server-Timing']
+        self.assertRegex(header, r'sql;dur=[\d.]+;desc="[1-9]\d* queries"')
+        self.assertRegex(header, r'cache;dur=[\d.]+;desc="\d+ hits, \d+ ')
+        self.assertRegex(header, r'tpl;dur=[\d.]+')
+        self.assertRegex(header, r'total;dur=[\d.]+')
+        with override_settings(SERVER_TIMING=False):
+            response = Client().get(reverse('posts:index'))
+        self.assertFalse(response.has_header('Server-Timing'))
+
+    def test_histograms_by_url_name(self):
+        client = Client()
+        for _ in range(3):
+            client.get(reverse('posts:post_detail', args=(self.post.id,)))
+        stats = timing.histograms.stats()
+        self.assertEqual(stats['posts:post_detail']['totals']['requests'], 3)
+        self.assertEqual(
+            sum(stats['posts:post_detail']['buckets']['total']), 3
+        )
+        out = StringIO()
+        call_command('timing_stats', stdout=out)
+        self.assertIn('posts:post_detail\t3\t', out.getvalue())
+        call_command('timing_stats', histogram='sql', stdout=out)
+        call_command('timing_stats', reset=True)
+        self.assertEqual(timing.histograms.stats(), {})
+
+
+class TimingTests(SimpleTestCase):
+    def test_nested_templates_are_counted_once(self):
+        with timing.collect() as timings:
+            render_to_string('includes/holes/nav.html', {'view_name': ''})
+            with timing.template_render():
+                with timing.template_render():
+                    pass
+        self.assertGreater(timings.template, 0)
+        self.assertEqual(timings.template_depth, 0)
+        self.assertIsNone(timing.current())
+
+    def test_percentile(self):
+        counts = [0] * (len(timing.BUCKETS) + 1)
+        counts[timing.bucket(3)] = 90
+        counts[timing.bucket(10 ** 6)] = 10
+        self.assertEqual(timing.percentile(counts, 0.5), timing.bucket(5))
+        self.assertEqual(
+            timing.bucket_label(timing.percentile(counts, 0.99)), '>5000'
+        )
+        self.assertIsNone(timing.percentile([0, 0], 0.5))
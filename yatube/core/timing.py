@@ -0,0 +1,264 @@
+"""Замеры запросов: SQL, кеш и шаблоны по маршрутам.
+
+core.middleware.TimingMiddleware открывает для запроса набор замеров
+(collect) и подключает execute_wrapper ко всем соединениям с базой.
+Кеш (core.cache.SQLiteCache) и шаблонизатор (core.template_backend)
+сами дописывают свои замеры в набор текущего потока. Итог уходит
+клиенту в заголовке Server-Timing и копится в гистограммах по именам
+маршрутов в файле TIMING_LOCATION; их выводит команда timing_stats.
+"""
+import atexit
+import os
+import sqlite3
+import threading
+import time
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+
+from django.conf import settings
+
+# Верхние границы корзин гистограмм, миллисекунд; последняя — для
+# всего, что дольше.
+BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000)
+# Замеры с гистограммами.
+METRICS = ('total', 'sql', 'template', 'cache')
+# Счётчики, по которым считаются средние.
+TOTALS = (
+    'requests', 'queries', 'cache_hits', 'cache_misses',
+    *(f'{metric}_ms' for metric in METRICS),
+)
+
+SCHEMA = (
+    'CREATE TABLE IF NOT EXISTS timing_total ('
+    'url_name TEXT NOT NULL, name TEXT NOT NULL, value REAL NOT NULL, '
+    'PRIMARY KEY (url_name, name)) WITHOUT ROWID',
+    'CREATE TABLE IF NOT EXISTS timing_bucket ('
+    'url_name TEXT NOT NULL, metric TEXT NOT NULL, bucket INTEGER NOT NULL, '
+    'count INTEGER NOT NULL, PRIMARY KEY (url_name, metric, bucket)) '
+    'WITHOUT ROWID',
+)
+
+_local = threading.local()
+
+
+class Timings:
+    """Замеры одного запроса; время — в секундах."""
+
+    def __init__(self):
+        self.queries = 0
+        self.sql = 0.0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.cache = 0.0
+        self.template = 0.0
+        self.template_depth = 0
+
+    def server_timing(self, total):
+        """Значение заголовка Server-Timing."""
+        return ', '.join((
+            f'sql;dur={self.sql * 1000:.1f};desc="{self.queries} queries"',
+            f'cache;dur={self.cache * 1000:.1f};'
+            f'desc="{self.cache_hits} hits, {self.cache_misses} misses"',
+            f'tpl;dur={self.template * 1000:.1f}',
+            f'total;dur={total * 1000:.1f}',
+        ))
+
+
+def current():
+    """Замеры запроса, который выполняет этот поток, или None."""
+    return getattr(_local, 'timings', None)
+
+
+@contextmanager
+def collect():
+    timings = Timings()
+    previous, _local.timings = current(), timings
+    try:
+        yield timings
+    finally:
+        _local.timings = previous
+
+
+def execute_wrapper(execute, sql, params, many, context):
+    """execute_wrapper соединения: число и время SQL-запросов."""
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        timings = current()
+        if timings is not None:
+            timings.queries += 1
+            timings.sql += time.perf_counter() - start
+
+
+def record_cache(hits, misses, seconds):
+    timings = current()
+    if timings is not None:
+        timings.cache_hits += hits
+        timings.cache_misses += misses
+        timings.cache += seconds
+
+
+@contextmanager
+def template_render():
+    """Время рендеринга; вложенные шаблоны не считаются дважды."""
+    timings = current()
+    if timings is None:
+        yield
+        return
+    timings.template_depth += 1
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.template_depth -= 1
+        if not timings.template_depth:
+            timings.template += time.perf_counter() - start
+
+
+def bucket(milliseconds):
+    """Номер корзины гистограммы."""
+    for index, bound in enumerate(BUCKETS):
+        if milliseconds <= bound:
+            return index
+    return len(BUCKETS)
+
+
+class Histograms:
+    """Гистограммы по маршрутам в файле SQLite, общем для процессов.
+
+    Замеры копятся в памяти процесса и сбрасываются в файл раз в
+    TIMING_FLUSH_EVERY запросов и при выходе.
+    """
+
+    def __init__(self):
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._totals = defaultdict(Counter)
+        self._buckets = Counter()
+        self._pending = 0
+        atexit.register(self.flush)
+
+    def _connection(self):
+        location = settings.TIMING_LOCATION
+        connection = getattr(self._local, 'connection', None)
+        if (
+            connection is None
+            or self._local.pid != os.getpid()
+            or self._local.location != location
+        ):
+            directory = os.path.dirname(location)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            connection = sqlite3.connect(
+                location, timeout=30, isolation_level=None,
+            )
+            connection.execute('PRAGMA journal_mode=WAL')
+            for sql in SCHEMA:
+                connection.execute(sql)
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+            self._local.location = location
+        return connection
+
+    def add(self, url_name, timings, total):
+        milliseconds = {
+            'total': total * 1000,
+            'sql': timings.sql * 1000,
+            'template': timings.template * 1000,
+            'cache': timings.cache * 1000,
+        }
+        with self._lock:
+            totals = self._totals[url_name]
+            totals['requests'] += 1
+            totals['queries'] += timings.queries
+            totals['cache_hits'] += timings.cache_hits
+            totals['cache_misses'] += timings.cache_misses
+            for metric, value in milliseconds.items():
+                totals[f'{metric}_ms'] += value
+                self._buckets[url_name, metric, bucket(value)] += 1
+            self._pending += 1
+            flush = self._pending >= settings.TIMING_FLUSH_EVERY
+        if flush:
+            self.flush()
+
+    def flush(self):
+        """Добавить накопленные замеры процесса к замерам в файле."""
+        with self._lock:
+            totals, self._totals = self._totals, defaultdict(Counter)
+            buckets, self._buckets = self._buckets, Counter()
+            self._pending = 0
+        if not buckets:
+            return
+        connection = self._connection()
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            connection.executemany(
+                'INSERT INTO timing_total (url_name, name, value) '
+                'VALUES (?, ?, ?) ON CONFLICT (url_name, name) '
+                'DO UPDATE SET value = value + excluded.value',
+                [
+                    (url_name, name, value)
+                    for url_name, counter in totals.items()
+                    for name, value in counter.items()
+                ],
+            )
+            connection.executemany(
+                'INSERT INTO timing_bucket '
+                '(url_name, metric, bucket, count) VALUES (?, ?, ?, ?) '
+                'ON CONFLICT (url_name, metric, bucket) '
+                'DO UPDATE SET count = count + excluded.count',
+                [key + (count,) for key, count in buckets.items()],
+            )
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+        connection.execute('COMMIT')
+
+    def stats(self):
+        """{url_name: {'totals': {...}, 'buckets': {metric: [...]}}}."""
+        self.flush()
+        connection = self._connection()
+        result = defaultdict(lambda: {
+            'totals': dict.fromkeys(TOTALS, 0),
+            'buckets': {
+                metric: [0] * (len(BUCKETS) + 1) for metric in METRICS
+            },
+        })
+        for url_name, name, value in connection.execute(
+            'SELECT url_name, name, value FROM timing_total'
+        ):
+            result[url_name]['totals'][name] = value
+        for url_name, metric, index, count in connection.execute(
+            'SELECT url_name, metric, bucket, count FROM timing_bucket'
+        ):
+            result[url_name]['buckets'][metric][index] = count
+        return dict(result)
+
+    def reset(self):
+        self.flush()
+        connection = self._connection()
+        connection.execute('DELETE FROM timing_total')
+        connection.execute('DELETE FROM timing_bucket')
+
+
+def bucket_label(index):
+    if index < len(BUCKETS):
+        return f'<={BUCKETS[index]}'
+    return f'>{BUCKETS[-1]}'
+
+
+def percentile(counts, fraction):
+    """Корзина, в которую попадает доля fraction замеров, или None."""
+    total = sum(counts)
+    if not total:
+        return None
+    seen = 0
+    for index, count in enumerate(counts):
+        seen += count
+        if seen >= total * fraction:
+            return index
+    return len(counts) - 1
+
+
+histograms = Histograms()
@@ -1,4 +1,16 @@
+import mimetypes
+import posixpath
+from pathlib import Path
+
+from django.conf import settings
+from django.http import FileResponse, Http404
 from django.shortcuts import render
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+from django.views.decorators.http import require_safe
+
+from . import storage
 
 
 def page_not_found(request, exception):
@@ -15,3 +27,62 @@ def server_error(request):
 
 def permission_denied(request, exception):
     return render(request, 'core/403.html', status=403)
+
+
+def serve_file(request, fullpath, version=None, max_age=None,
+               name=None, encoding=None):
+    """Ответ с файлом и валидаторами; 304, если у клиента он уже есть.
+
+    version — неизменная версия файла (хеш из имени) или None, тогда
+    ETag считается по времени изменения и размеру. С max_age файл
+    отдаётся как неизменный, без него клиент перепроверяет его при
+    каждом обращении. name — имя для типа содержимого, если файл
+    хранится сжатым (encoding) под другим именем.
+    """
+    stat = fullpath.stat()
+    etag = version or f'{int(stat.st_mtime):x}-{stat.st_size:x}'
+    if version and encoding:
+        etag = f'{etag}-{encoding}'
+    etag = quote_etag(etag)
+    response = get_conditional_response(
+        request, etag=etag, last_modified=int(stat.st_mtime)
+    )
+    if response is None:
+        content_type, guessed = mimetypes.guess_type(name or str(fullpath))
+        response = FileResponse(
+            fullpath.open('rb'),
+            content_type=content_type or 'application/octet-stream',
+        )
+        if encoding or guessed:
+            response['Content-Encoding'] = encoding or guessed
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(stat.st_mtime)
+    if max_age is not None:
+        patch_cache_control(
+            response, public=True, immutable=True, max_age=max_age,
+        )
+    else:
+        patch_cache_control(response, public=True, no_cache=True)
+    return response
+
+
+@require_safe
+def media(request, path):
+    """Загруженный файл с валидаторами для условных запросов.
+
+    Файлы с неизменным адресом (см. core.storage.is_immutable) браузер
+    хранит MEDIA_IMMUTABLE_MAX_AGE секунд и не перепроверяет, остальные
+    перепроверяет каждый раз и получает 304, пока файл не изменился.
+    """
+    path = posixpath.normpath(path).lstrip('/')
+    fullpath = Path(safe_join(settings.MEDIA_ROOT, path))
+    if not fullpath.is_file():
+        raise Http404(path)
+    return serve_file(
+        request, fullpath,
+        version=storage.file_version(path),
+        max_age=(
+            settings.MEDIA_IMMUTABLE_MAX_AGE
+            if storage.is_immutable(path) else None
+        ),
+    )
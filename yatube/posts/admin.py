@@ -1,6 +1,7 @@
 from django.contrib import admin
 
-from .models import Comment, Follow, Group, Post
+from . import search
+from .models import Comment, Follow, Group, Post, Task
 
 
 @admin.register(Post)
@@ -17,7 +18,21 @@ class PostAdmin(admin.ModelAdmin):
     list_filter = ('pub_date',)
     empty_value_display = '-пусто-'
 
+    def get_search_results(self, request, queryset, search_term):
+        """Поиск по индексу FTS5 вместо LIKE '%term%' по тексту."""
+        if not search_term or not search.is_available():
+            return super().get_search_results(
+                request, queryset, search_term
+            )
+        return search.search_queryset(search_term, queryset), False
+
 
 admin.site.register(Group)
 admin.site.register(Comment)
 admin.site.register(Follow)
+
+
+@admin.register(Task)
+class TaskAdmin(admin.ModelAdmin):
+    list_display = ('pk', 'name', 'args', 'created', 'attempts')
+    list_filter = ('name',)
@@ -0,0 +1,137 @@
+from django.db import transaction
+from django.db.models import Count, F, Max, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from .models import Comment, Counter, Follow, Post, TimelineEntry
+
+POSTS = 'posts'
+GROUP_POSTS = 'group_posts'
+AUTHOR_POSTS = 'author_posts'
+FOLLOWERS = 'followers'
+FOLLOWING = 'following'
+TIMELINE = 'timeline'
+
+SCOPES = {
+    POSTS: lambda key: Post.objects.all(),
+    GROUP_POSTS: lambda key: Post.objects.filter(group_id=key),
+    AUTHOR_POSTS: lambda key: Post.objects.filter(author_id=key),
+    FOLLOWERS: lambda key: Follow.objects.filter(author_id=key),
+    FOLLOWING: lambda key: Follow.objects.filter(user_id=key),
+    TIMELINE: lambda key: TimelineEntry.objects.filter(user_id=key),
+}
+
+GROUPED_SCOPES = {
+    GROUP_POSTS: (Post, 'group_id'),
+    AUTHOR_POSTS: (Post, 'author_id'),
+    FOLLOWERS: (Follow, 'author_id'),
+    FOLLOWING: (Follow, 'user_id'),
+    TIMELINE: (TimelineEntry, 'user_id'),
+}
+
+
+def get_count(scope, key=0):
+    """Точное число записей из таблицы счётчиков.
+
+    Счётчик создаётся при первом чтении одним COUNT(*), дальше его
+    поддерживают сигналы записи постов.
+    """
+    value = Counter.objects.filter(scope=scope, key=key).values_list(
+        'value', flat=True
+    ).first()
+    if value is None:
+        counter, _ = Counter.objects.get_or_create(
+            scope=scope, key=key,
+            defaults={'value': SCOPES[scope](key).count()},
+        )
+        value = counter.value
+    return value
+
+
+def get_counts(scope, keys):
+    """Счётчики для нескольких ключей одним запросом."""
+    keys = set(keys)
+    known = dict(
+        Counter.objects.filter(scope=scope, key__in=keys).values_list(
+            'key', 'value'
+        )
+    )
+    for key in keys - known.keys():
+        known[key] = get_count(scope, key)
+    return known
+
+
+def get_scopes(scopes, key):
+    """Счётчики разных областей для одного ключа одним запросом."""
+    known = dict(
+        Counter.objects.filter(scope__in=scopes, key=key).values_list(
+            'scope', 'value'
+        )
+    )
+    for scope in set(scopes) - known.keys():
+        known[scope] = get_count(scope, key)
+    return known
+
+
+def change(scope, key, delta):
+    """Сдвинуть счётчик, если он уже заведён."""
+    Counter.objects.filter(scope=scope, key=key).update(
+        value=F('value') + delta
+    )
+
+
+def reset(scope, key=0):
+    Counter.objects.filter(scope=scope, key=key).delete()
+
+
+def follow_feed_count(user):
+    """Размер ленты подписок: число её записей (см. posts.timeline).
+
+    Посты авторов в ленте не все, а только разложенные в неё, поэтому
+    считаются записи ленты читателя. Раскладка сдвигает счётчик, а
+    подписка, отписка и подтягивание постов сбрасывают его до
+    следующего чтения.
+    """
+    return get_count(TIMELINE, user.pk)
+
+
+def change_comments(post_id, delta):
+    Post.objects.filter(pk=post_id).update(
+        comments_count=F('comments_count') + delta
+    )
+
+
+def rebuild(scope, batch_size=1000):
+    """Пересчитать все счётчики области, вставляя их пачками."""
+    with transaction.atomic():
+        Counter.objects.filter(scope=scope).delete()
+        if scope == POSTS:
+            Counter.objects.create(scope=POSTS, value=Post.objects.count())
+            return 1
+        model, column = GROUPED_SCOPES[scope]
+        rows = model.objects.exclude(**{column: None}).order_by().values_list(
+            column
+        ).annotate(total=Count('pk')).order_by(column)
+        batch = []
+        created = 0
+        for key, value in rows.iterator(chunk_size=batch_size):
+            batch.append(Counter(scope=scope, key=key, value=value))
+            if len(batch) >= batch_size:
+                Counter.objects.bulk_create(batch)
+                created += len(batch)
+                batch = []
+        Counter.objects.bulk_create(batch)
+        return created + len(batch)
+
+
+def rebuild_comments(batch_size=1000):
+    """Пересчитать Post.comments_count диапазонами id."""
+    comments = Comment.objects.filter(post=OuterRef('pk')).order_by().values(
+        'post'
+    ).annotate(total=Count('id')).values('total')
+    last_id = Post.objects.aggregate(last_id=Max('id'))['last_id'] or 0
+    updated = 0
+    for start in range(0, last_id + 1, batch_size):
+        updated += Post.objects.filter(
+            id__gte=start, id__lt=start + batch_size
+        ).update(comments_count=Coalesce(Subquery(comments), 0))
+    return updated
@@ -0,0 +1,79 @@
+"""Выгрузка постов в NDJSON и CSV без загрузки всей выборки в память.
+
+Посты читаются пачками по ключу (pub_date, id), как страницы ленты в
+CursorPaginator: каждая пачка — отдельный запрос по индексу от
+последней выгруженной записи, так что ни OFFSET, ни открытый на всё
+время выгрузки курсор базы не нужны, а память не зависит от размера
+выборки.
+"""
+import csv
+import io
+import json
+
+from .models import Post
+from .utils import CursorPaginator
+
+FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv; charset=utf-8',
+}
+# Колонка выгрузки и поле, из которого она берётся.
+COLUMNS = {
+    'id': 'id',
+    'pub_date': 'pub_date',
+    'author': 'author__username',
+    'group': 'group__slug',
+    'comments_count': 'comments_count',
+    'image': 'image',
+    'text': 'text',
+}
+CHUNK_SIZE = 1000
+
+
+def rows(queryset=None, chunk_size=CHUNK_SIZE):
+    """Посты в порядке ленты словарями COLUMNS, пачка за пачкой."""
+    if queryset is None:
+        queryset = Post.objects.all()
+    paginator = CursorPaginator(
+        queryset.values(*COLUMNS.values()), chunk_size
+    )
+    values = None
+    while True:
+        chunk = list(paginator.window(values))
+        yield [
+            {column: row[field] for column, field in COLUMNS.items()}
+            for row in chunk
+        ]
+        if len(chunk) <= chunk_size:
+            return
+        values = [chunk[-1][key] for key in paginator.keys]
+
+
+def _ndjson(chunk):
+    return ''.join(
+        json.dumps(
+            {**row, 'pub_date': row['pub_date'].isoformat()},
+            ensure_ascii=False,
+        ) + '\n'
+        for row in chunk
+    )
+
+
+def stream(queryset=None, file_format='ndjson', chunk_size=CHUNK_SIZE):
+    """Текст выгрузки кусками, по одному на пачку постов."""
+    if file_format == 'ndjson':
+        for chunk in rows(queryset, chunk_size):
+            if chunk:
+                yield _ndjson(chunk)
+        return
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=list(COLUMNS))
+    writer.writeheader()
+    for chunk in rows(queryset, chunk_size):
+        writer.writerows(
+            {**row, 'pub_date': row['pub_date'].isoformat()}
+            for row in chunk
+        )
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
@@ -0,0 +1,120 @@
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+
+SITE = 'site'
+INDEX = 'index'
+PAGE_PARAMS = ('page', 'after', 'before')
+
+
+def group_scope(slug):
+    return f'group:{slug}'
+
+
+def profile_scope(username):
+    return f'profile:{username}'
+
+
+def post_scope(post_id):
+    return f'post:{post_id}'
+
+
+def author_scope(author_id):
+    """Число постов автора, которое показывают страницы его постов."""
+    return f'author:{author_id}'
+
+
+def post_author_id(post_id):
+    """id автора поста или None; запоминается в кеше навсегда.
+
+    Автор поста не меняется, поэтому страница поста находит свои
+    области без запроса к базе.
+    """
+    from .models import Post
+
+    key = f'post_author:{post_id}'
+    author_id = cache.get(key)
+    if author_id is None:
+        author_id = Post.objects.filter(pk=post_id).values_list(
+            'author_id', flat=True
+        ).first()
+        if author_id is not None:
+            cache.set(key, author_id, timeout=None)
+    return author_id
+
+
+def user_scope(user_id):
+    """Фрагменты страниц, которые видит пользователь (см. posts.holes)."""
+    return f'user:{user_id}'
+
+
+def _key(scope):
+    return f'feed_generation:{scope}'
+
+
+def _now():
+    """Поколение — время последнего изменения области в миллисекундах.
+
+    Поэтому заведённое заново после вытеснения поколение не совпадёт
+    со старым, а по поколениям можно отдать Last-Modified.
+    """
+    return int(time.time() * 1000)
+
+
+def generations(*scopes):
+    """Номера поколений областей; общий для сайта идёт первым."""
+    keys = [_key(scope) for scope in (SITE, *scopes)]
+    known = cache.get_many(keys)
+    for key in keys:
+        if key not in known:
+            cache.add(key, _now(), timeout=None)
+            known[key] = cache.get(key)
+    return [known[key] for key in keys]
+
+
+def bump(*scopes):
+    """Сделать устаревшими все закешированные страницы областей.
+
+    Внутри транзакции поколения сдвигаются ещё раз после её коммита:
+    читатель, пришедший до коммита, видит прежние строки, и без этого
+    его страница осталась бы в кеше под новым поколением.
+    """
+    _bump(scopes)
+    if transaction.get_connection().in_atomic_block:
+        transaction.on_commit(lambda: _bump(scopes))
+
+
+def _bump(scopes):
+    """Поколение растёт атомарно и не меньше чем до текущего времени."""
+    keys = [_key(scope) for scope in scopes]
+    now = _now()
+    for key, generation in cache.get_many(keys).items():
+        try:
+            cache.incr(key, max(1, now - generation))
+        except ValueError:
+            pass
+
+
+def last_modified(generations):
+    """Время последнего изменения по номерам поколений или None.
+
+    В целых секундах, как в заголовке Last-Modified. Пока идёт секунда
+    последнего изменения, времени нет: запись в ту же секунду его бы не
+    сдвинула, и If-Modified-Since получил бы 304 на старую страницу.
+    """
+    seconds = max(generations) // 1000
+    if seconds >= int(time.time()):
+        return None
+    return seconds
+
+
+def feed_version(request, *scopes):
+    """Ключ фрагмента ленты: области, их поколения и позиция страницы."""
+    position = '|'.join(request.GET.get(name, '') for name in PAGE_PARAMS)
+    version = ';'.join(
+        f'{scope}={generation}' for scope, generation in zip(
+            (SITE, *scopes), generations(*scopes)
+        )
+    )
+    return f'{version}:{position}'
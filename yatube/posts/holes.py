@@ -0,0 +1,137 @@
+"""Дыры страниц — небольшие фрагменты, зависящие от пользователя.
+
+Шаблоны выводят на месте такого фрагмента метку (тег {% hole %}),
+поэтому тело страницы одно для всех читателей и целиком лежит в кеше
+(см. posts.middleware). Метки заполняет middleware перед отправкой
+ответа: фрагменты с cache=True берутся из кеша пользователя, ключ
+которого включает поколение его области (feed_cache.user_scope),
+остальные рендерятся заново — они дешёвые или содержат токен CSRF.
+"""
+import re
+from collections import namedtuple
+from urllib.parse import quote, unquote
+
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.template.loader import render_to_string
+
+from . import feed_cache
+from .forms import CommentForm
+from .models import Follow
+
+MARKER_RE = re.compile(rb'<!--hole:(\w+)((?::[^:>]*)*)-->')
+
+Hole = namedtuple('Hole', 'template context cache')
+
+HOLES = {}
+
+
+def register(name, template, cache=True):
+    """Объявить дыру: context(user, *args) возвращает контекст шаблона."""
+    def decorator(func):
+        HOLES[name] = Hole(template, func, cache)
+        return func
+    return decorator
+
+
+@register('nav', 'includes/holes/nav.html')
+def nav(user, view_name):
+    return {'page_view_name': view_name}
+
+
+@register('switcher', 'posts/includes/holes/switcher.html')
+def switcher(user, active):
+    return {'active': active}
+
+
+@register('follow', 'posts/includes/holes/follow.html')
+def follow(user, author_id, username):
+    is_author = user.pk == int(author_id)
+    return {
+        'username': username,
+        'is_author': is_author,
+        'following': (
+            user.is_authenticated and not is_author
+            and Follow.objects.filter(user=user, author_id=author_id).exists()
+        ),
+    }
+
+
+@register('edit', 'posts/includes/holes/edit.html', cache=False)
+def edit(user, post_id, author_id):
+    return {'post_id': post_id, 'can_edit': user.pk == int(author_id)}
+
+
+@register('comment_form', 'posts/includes/holes/comment_form.html',
+          cache=False)
+def comment_form(user, post_id):
+    return {'post_id': post_id, 'form': CommentForm()}
+
+
+def marker(name, args):
+    """Метка дыры в теле страницы: <!--hole:имя:арг1:арг2-->."""
+    if name not in HOLES:
+        raise KeyError(f'Unknown hole {name!r}')
+    raw = ''.join(f':{quote(str(arg), safe="")}' for arg in args)
+    return f'<!--hole:{name}{raw}-->'
+
+
+def _user(request):
+    return getattr(request, 'user', None) or AnonymousUser()
+
+
+def render(request, name, args):
+    """Отрендерить дыру для пользователя запроса."""
+    hole = HOLES[name]
+    user = _user(request)
+    context = hole.context(user, *args)
+    context['user'] = user
+    return render_to_string(hole.template, context, request=request)
+
+
+def _cache_prefix(user):
+    if user.is_authenticated:
+        generations = feed_cache.generations(feed_cache.user_scope(user.pk))
+    else:
+        generations = feed_cache.generations()
+    version = '.'.join(str(generation) for generation in generations)
+    return f'hole:{user.pk or 0}:{version}'
+
+
+def fill(request, content):
+    """Заменить метки в теле страницы фрагментами пользователя.
+
+    Закешированные фрагменты читаются одним запросом к кешу,
+    недостающие рендерятся и записываются тоже одним.
+    """
+    found = {}
+    for match in MARKER_RE.finditer(content):
+        raw = match.group(2).decode()
+        found[match.group(0)] = (
+            match.group(1).decode(), raw,
+            [unquote(arg) for arg in raw.split(':')[1:]],
+        )
+    if not found:
+        return content
+    prefix = _cache_prefix(_user(request))
+    keys = {
+        marker_: f'{prefix}:{name}{raw}'
+        for marker_, (name, raw, _) in found.items() if HOLES[name].cache
+    }
+    cached = cache.get_many(keys.values()) if keys else {}
+    fragments = {}
+    missing = {}
+    for marker_, (name, _, args) in found.items():
+        key = keys.get(marker_)
+        if key in cached:
+            fragments[marker_] = cached[key]
+            continue
+        fragments[marker_] = render(request, name, args).encode(
+            settings.DEFAULT_CHARSET
+        )
+        if key is not None:
+            missing[key] = fragments[marker_]
+    if missing:
+        cache.set_many(missing, settings.HOLE_CACHE_TIMEOUT)
+    return MARKER_RE.sub(lambda match: fragments[match.group(0)], content)
@@ -0,0 +1,147 @@
+"""Обработка картинок из форм постов вне запроса.
+
+post_create и post_edit не пишут загрузку в хранилище, а складывают
+её как есть в IMAGE_STAGING_ROOT и ставят задачу process в очередь
+(posts.tasks). Пока задача не выполнена, у поста заполнено
+staged_image, а шаблоны показывают прежнюю картинку или заглушку.
+Задача убирает EXIF, поворачивает снимок по его метке ориентации,
+уменьшает до IMAGE_MAX_SIZE, сохраняет результат как обычную
+загрузку и сразу создаёт миниатюры.
+"""
+import io
+import logging
+import os
+import uuid
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage, default_storage
+from PIL import Image, ImageOps
+
+from . import tasks, thumbnails
+from .models import Post
+
+logger = logging.getLogger(__name__)
+
+# Форматы, которые сохраняются как есть; остальные — в JPEG.
+KEPT_FORMATS = ('JPEG', 'PNG', 'WEBP')
+
+
+def staging_storage():
+    return FileSystemStorage(location=settings.IMAGE_STAGING_ROOT)
+
+
+def defer(post):
+    """Убрать из поста новую загрузку, отложив её обработку.
+
+    Вызывается перед post.save(); в посте остаётся прежняя картинка.
+    Возвращает имя загрузки в промежуточном хранилище или None, если
+    картинка не менялась.
+    """
+    if not post.image or post.image._committed:
+        return None
+    upload = post.image.file
+    name = staging_storage().save(
+        f'{uuid.uuid4().hex}/{os.path.basename(upload.name)}', upload
+    )
+    post.image = getattr(post, '_loaded_values', {}).get('image', '')
+    post.staged_image = name
+    return name
+
+
+def edited_fields(form, staged):
+    """Поля, которые post_edit сохраняет в пост.
+
+    Картинку, миниатюры и staged_image пишет задача process: полное
+    сохранение правки, начатой до её окончания, вернуло бы в пост
+    прежние значения. Поэтому сохраняются только изменённые формой поля.
+    """
+    fields = [name for name in form.changed_data if name != 'image']
+    if staged:
+        fields.append('staged_image')
+    elif 'image' in form.changed_data:
+        # Картинку убрали из поста.
+        fields += ['image', 'thumbnails']
+    return fields
+
+
+def schedule(post):
+    tasks.enqueue(
+        process, post.pk, post.staged_image,
+        key=f'image:{post.staged_image}',
+    )
+
+
+def prepare(content):
+    """Байты и расширение картинки без EXIF, повёрнутой и уменьшенной.
+
+    Для анимации возвращает (None, None): её пересохранение испортило бы.
+    """
+    size = settings.IMAGE_MAX_SIZE
+    with Image.open(content) as image:
+        if getattr(image, 'is_animated', False):
+            return None, None
+        image_format = image.format
+        # JPEG сразу декодируется в уменьшенном масштабе.
+        image.draft('RGB', (size, size))
+        image = ImageOps.exif_transpose(image)
+    # exif_transpose оставляет EXIF (без ориентации) в info, а PNG и
+    # WebP сохраняют его оттуда.
+    image.info.pop('exif', None)
+    image.thumbnail((size, size), Image.LANCZOS)
+    if image_format not in KEPT_FORMATS:
+        image_format = 'JPEG'
+    if image_format == 'JPEG' and image.mode != 'RGB':
+        image = image.convert('RGB')
+    data = io.BytesIO()
+    image.save(
+        data, image_format, quality=settings.IMAGE_QUALITY, optimize=True
+    )
+    return data.getvalue(), thumbnails.FILE_EXTENSIONS[image_format]
+
+
+def store(staging, staged_name):
+    """Обработать загрузку и сохранить её как картинку поста."""
+    with staging.open(staged_name) as staged:
+        data, extension = prepare(staged)
+        if data is None:
+            staged.seek(0)
+            data = staged.read()
+    root, original_extension = os.path.splitext(
+        os.path.basename(staged_name)
+    )
+    extension = f'.{extension}' if extension else original_extension
+    return default_storage.save(
+        Post.image.field.generate_filename(None, root + extension),
+        ContentFile(data),
+    )
+
+
+def process(post_id, staged_name):
+    """Фоновая задача: обработать загрузку и поставить её в пост.
+
+    Если пост успели удалить или загрузить в него другую картинку,
+    результат не записывается. Картинку, которую Pillow не читает,
+    пост не получает.
+    """
+    from .signals import expire_post_pages
+
+    staging = staging_storage()
+    name = ''
+    if staging.exists(staged_name):
+        try:
+            name = store(staging, staged_name)
+        except (OSError, Image.DecompressionBombError):
+            logger.warning('Картинку %s не удалось обработать', staged_name)
+    posts = Post.objects.filter(pk=post_id, staged_image=staged_name)
+    if not name:
+        if posts.update(staged_image=''):
+            for post in Post.objects.filter(pk=post_id):
+                expire_post_pages(post, [post.group_id])
+    elif posts.update(image=name, thumbnails='', staged_image=''):
+        thumbnails.generate(name)
+    staging.delete(staged_name)
+    try:
+        os.rmdir(os.path.dirname(staging.path(staged_name)))
+    except OSError:
+        pass
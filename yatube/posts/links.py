@@ -0,0 +1,49 @@
+"""Адреса страниц, которые лента выводит для каждого поста.
+
+reverse() на каждый вызов заново подбирает маршрут и проверяет
+аргументы, а в ленте таких вызовов по два-три на пост. Поэтому адрес
+один раз строится через reverse() с заглушкой, а дальше в готовую
+строку подставляется значение, экранированное так же, как в reverse().
+"""
+from functools import lru_cache
+from urllib.parse import quote
+
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.urls import get_script_prefix, reverse
+
+# Символы, которые reverse() оставляет в пути как есть (RFC 3986).
+SAFE = "!$&'()*+,;=/~:@"
+INT_PLACEHOLDER = 987654321
+STR_PLACEHOLDER = 'x987654321x'
+
+
+@lru_cache(maxsize=None)
+def _parts(view_name, kwarg, placeholder, script_prefix):
+    """Части адреса до и после заглушки."""
+    url = reverse(view_name, kwargs={kwarg: placeholder})
+    head, tail = url.split(str(placeholder), 1)
+    return head, tail
+
+
+@receiver(setting_changed)
+def _reset(setting, **kwargs):
+    if setting == 'ROOT_URLCONF':
+        _parts.cache_clear()
+
+
+def _build(view_name, kwarg, placeholder, value):
+    head, tail = _parts(view_name, kwarg, placeholder, get_script_prefix())
+    return f'{head}{quote(str(value), safe=SAFE)}{tail}'
+
+
+def post_detail(post_id):
+    return _build('posts:post_detail', 'post_id', INT_PLACEHOLDER, post_id)
+
+
+def profile(username):
+    return _build('posts:profile', 'username', STR_PLACEHOLDER, username)
+
+
+def group_list(slug):
+    return _build('posts:group_list', 'slug', STR_PLACEHOLDER, slug)
@@ -0,0 +1,120 @@
+import json
+import statistics
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
+from django.core.management.base import BaseCommand
+from django.core.paginator import Paginator
+from django.template import engines
+from django.template.backends.django import DjangoTemplates
+from django.test import RequestFactory, override_settings
+from django.utils import timezone
+
+from posts.models import Group, Post
+
+User = get_user_model()
+
+PAGES = (
+    'posts/index.html',
+    'posts/group_list.html',
+    'posts/profile.html',
+    'posts/follow_index.html',
+)
+PLAIN_LOADERS = [
+    'django.template.loaders.filesystem.Loader',
+    'django.template.loaders.app_directories.Loader',
+]
+
+
+def uncached_backend():
+    """Шаблонизатор проекта, который читает и разбирает шаблоны заново."""
+    params = dict(settings.TEMPLATES[0])
+    del params['BACKEND']
+    options = dict(params.get('OPTIONS', {}))
+    options['loaders'] = PLAIN_LOADERS
+    return DjangoTemplates({
+        **params, 'NAME': 'bench_uncached', 'APP_DIRS': False,
+        'OPTIONS': options,
+    })
+
+
+def make_posts(number):
+    """Посты в памяти: замер не зависит от базы и её наполнения."""
+    group = Group(id=1, title='Группа', slug='bench')
+    authors = [User(id=i + 1, username=f'bench_{i}') for i in range(5)]
+    thumbnails = json.dumps({'feed': {
+        'width': 900, 'height': 339, 'variants': [
+            ['JPEG', width, f'cache/bench/{width}.jpg']
+            for width in (360, 640, 900)
+        ],
+    }})
+    now = timezone.now()
+    posts = []
+    for i in range(number):
+        with_image = i % 2 == 0
+        posts.append(Post(
+            id=i + 1, text=f'Текст поста {i}\n' * 5, pub_date=now,
+            author=authors[i % len(authors)], group=group,
+            comments_count=i,
+            image=f'posts/bench.{i:012x}.jpg' if with_image else '',
+            thumbnails=thumbnails if with_image else '',
+        ))
+    return group, authors[0], posts
+
+
+class Command(BaseCommand):
+    help = (
+        'Замеряет время рендеринга страниц лент: через шаблонизатор '
+        'проекта и через такой же без кеширующего загрузчика.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=200)
+        parser.add_argument(
+            '--posts', type=int, default=settings.NUM_POSTS_ON_PAGE,
+            help='Постов на странице.',
+        )
+
+    def handle(self, *args, **options):
+        group, author, posts = make_posts(options['posts'])
+        page_obj = Paginator(posts, options['posts']).page(1)
+        backends = (
+            ('configured', engines['django']),
+            ('uncached', uncached_backend()),
+        )
+        fragments = {
+            **settings.CACHES,
+            'template_fragments': {
+                'BACKEND': 'django.core.cache.backends.dummy.DummyCache',
+            },
+        }
+        self.stdout.write('template\tloader\tmedian ms\tmean ms')
+        with override_settings(CACHES=fragments):
+            for template_name in PAGES:
+                request = RequestFactory().get('/')
+                request.user = AnonymousUser()
+                context = {
+                    'page_obj': page_obj, 'group': group, 'author': author,
+                    'posts_count': len(posts), 'followers_count': 0,
+                    'following_count': 0, 'feed_version': '',
+                }
+                for label, backend in backends:
+                    timings = self.measure(
+                        backend, template_name, context, request,
+                        options['repeat'],
+                    )
+                    self.stdout.write('\t'.join((
+                        template_name, label,
+                        f'{statistics.median(timings):.3f}',
+                        f'{statistics.mean(timings):.3f}',
+                    )))
+
+    def measure(self, backend, template_name, context, request, repeat):
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            backend.get_template(template_name).render(context, request)
+            timings.append((time.perf_counter() - start) * 1000)
+        return timings
@@ -0,0 +1,153 @@
+import random
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from posts.models import Comment, Follow, Group, Post, TimelineEntry
+from posts.queries import comments_queryset, feed_queryset
+from posts.utils import CursorPaginator
+
+User = get_user_model()
+
+BATCH_SIZE = 5000
+
+
+class Rollback(Exception):
+    """Откатывает тестовые данные после замеров."""
+
+
+def is_bad_plan(details):
+    """Полный просмотр таблицы или сортировка во временном B-дереве."""
+    for detail in details:
+        if 'TEMP B-TREE' in detail:
+            return True
+        if detail.startswith('SCAN') and 'INDEX' not in detail:
+            return True
+    return False
+
+
+class Command(BaseCommand):
+    help = (
+        'Наполняет базу данными, снимает EXPLAIN QUERY PLAN запросов '
+        'лент и падает, если лента читается без индекса.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--posts', type=int, default=100000)
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--groups', type=int, default=50)
+        parser.add_argument(
+            '--keep', action='store_true',
+            help='Не откатывать созданные данные.',
+        )
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError('Команда разбирает планы запросов SQLite.')
+        try:
+            with transaction.atomic():
+                self.seed(options['users'], options['groups'],
+                          options['posts'])
+                with connection.cursor() as cursor:
+                    cursor.execute('ANALYZE')
+                failures = [
+                    name for name, queryset in self.feed_queries()
+                    if self.explain(name, queryset)
+                ]
+                if not options['keep']:
+                    raise Rollback
+        except Rollback:
+            pass
+        if failures:
+            raise CommandError(
+                'Запросы без индекса: ' + ', '.join(failures)
+            )
+
+    def seed(self, users_number, groups_number, posts_number):
+        rng = random.Random(0)
+        first_user = User.objects.order_by('-id').values_list(
+            'id', flat=True
+        ).first() or 0
+        User.objects.bulk_create(
+            User(username=f'explain_{first_user + i}', password='!')
+            for i in range(users_number)
+        )
+        user_ids = list(User.objects.filter(
+            username__startswith='explain_'
+        ).values_list('id', flat=True))
+        first_group = Group.objects.count()
+        Group.objects.bulk_create(
+            Group(title=f'Группа {i}', slug=f'explain-{first_group + i}',
+                  description='')
+            for i in range(groups_number)
+        )
+        group_ids = list(Group.objects.filter(
+            slug__startswith='explain-'
+        ).values_list('id', flat=True))
+        for start in range(0, posts_number, BATCH_SIZE):
+            Post.objects.bulk_create(
+                Post(text='Тестовый пост', author_id=rng.choice(user_ids),
+                     group_id=rng.choice(group_ids + [None]))
+                for _ in range(start, min(start + BATCH_SIZE, posts_number))
+            )
+        self.reader_id = user_ids[0]
+        Follow.objects.bulk_create(
+            Follow(user_id=self.reader_id, author_id=author_id)
+            for author_id in user_ids[1:101]
+        )
+        entries = Post.objects.filter(
+            author_id__in=user_ids[1:101]
+        ).values_list('id', 'author_id', 'pub_date')
+        TimelineEntry.objects.bulk_create(
+            TimelineEntry(user_id=self.reader_id, post_id=post_id,
+                          author_id=author_id, pub_date=pub_date)
+            for post_id, author_id, pub_date in entries
+        )
+        self.post = Post.objects.filter(author_id=self.reader_id).first()
+        Comment.objects.bulk_create(
+            Comment(post_id=post_id, author_id=self.reader_id, text='Да')
+            for post_id in Post.objects.values_list('id', flat=True)[:1000]
+        )
+        self.group_id = group_ids[0]
+
+    def feed_queries(self):
+        feeds = (
+            ('index', feed_queryset(), None),
+            ('group', feed_queryset(
+                Post.objects.filter(group_id=self.group_id)
+            ), None),
+            ('profile', feed_queryset(
+                Post.objects.filter(author_id=self.reader_id)
+            ), None),
+            ('follow', feed_queryset(
+                TimelineEntry.objects.filter(user_id=self.reader_id),
+                prefix='post__', fields=('pub_date', 'post_id'),
+            ), ('pub_date', 'post_id')),
+        )
+        for name, queryset, keys in feeds:
+            paginator = CursorPaginator(queryset, 10, keys=keys)
+            yield name, paginator.window()
+            middle = queryset.order_by(*paginator._ordering())[
+                queryset.count() // 2
+            ]
+            values = paginator.decode_cursor(paginator.encode_cursor(middle))
+            yield f'{name} (deep)', paginator.window(values)
+        yield 'comments', comments_queryset(self.post)
+
+    def explain(self, name, queryset):
+        sql, params = queryset.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute('EXPLAIN QUERY PLAN ' + sql, params)
+            details = [row[-1] for row in cursor.fetchall()]
+            started = time.perf_counter()
+            cursor.execute(sql, params)
+            cursor.fetchall()
+            elapsed = (time.perf_counter() - started) * 1000
+        bad = is_bad_plan(details)
+        status = self.style.ERROR('FAIL') if bad else self.style.SUCCESS('OK')
+        self.stdout.write(f'{status} {name}: {elapsed:.2f} ms')
+        for detail in details:
+            self.stdout.write(f'    {detail}')
+        return bad
@@ -0,0 +1,54 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import export
+from posts.models import Group, Post
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = (
+        'Выгружает посты сайта, группы или автора в NDJSON или CSV '
+        'пачками по ключу (pub_date, id), не держа выборку в памяти.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--group', help='Адрес (slug) группы.')
+        parser.add_argument('--author', help='Имя пользователя автора.')
+        parser.add_argument(
+            '--format', choices=export.FORMATS, default='ndjson',
+        )
+        parser.add_argument(
+            '--output', default='-', help='Файл или - для stdout.',
+        )
+        parser.add_argument(
+            '--chunk-size', type=int, default=export.CHUNK_SIZE,
+            help='Сколько постов читать одним запросом.',
+        )
+
+    def handle(self, *args, **options):
+        posts = Post.objects.all()
+        if options['group']:
+            group = Group.objects.filter(slug=options['group']).first()
+            if group is None:
+                raise CommandError(f'Нет группы {options["group"]}')
+            posts = posts.filter(group=group)
+        if options['author']:
+            author = User.objects.filter(username=options['author']).first()
+            if author is None:
+                raise CommandError(
+                    f'Нет пользователя {options["author"]}'
+                )
+            posts = posts.filter(author=author)
+        chunks = export.stream(
+            posts, options['format'], options['chunk_size']
+        )
+        if options['output'] == '-':
+            for chunk in chunks:
+                self.stdout.write(chunk, ending='')
+            return
+        with open(options['output'], 'w', encoding='utf-8',
+                  newline='') as file:
+            for chunk in chunks:
+                file.write(chunk)
@@ -0,0 +1,47 @@
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+
+from core.storage import file_version
+from posts import thumbnails
+from posts.models import Post
+from posts.signals import expire_post_pages
+
+
+class Command(BaseCommand):
+    help = (
+        'Переименовывает загруженные раньше картинки постов в имена '
+        'с хешем содержимого и ставит в очередь их миниатюры.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--delete', action='store_true',
+            help='Удалить файлы со старыми именами.',
+        )
+
+    def handle(self, *args, **options):
+        max_length = Post._meta.get_field('image').max_length
+        names = Post.objects.exclude(image='').values_list(
+            'image', flat=True
+        ).distinct()
+        total = 0
+        for name in list(names):
+            if file_version(name) is not None:
+                continue
+            if not default_storage.exists(name):
+                self.stderr.write(f'Нет файла: {name}')
+                continue
+            with default_storage.open(name) as content:
+                new_name = default_storage.save(name, content, max_length)
+            Post.objects.filter(image=name).update(
+                image=new_name, thumbnails=''
+            )
+            thumbnails.schedule(new_name)
+            for post in Post.objects.filter(
+                image=new_name
+            ).select_related('author'):
+                expire_post_pages(post, [post.group_id])
+            if options['delete']:
+                default_storage.delete(name)
+            total += 1
+        self.stdout.write(f'Переименовано картинок: {total}')
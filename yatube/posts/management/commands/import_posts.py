@@ -0,0 +1,241 @@
+import csv
+import json
+import os
+import sys
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+from django.contrib.auth import get_user_model
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from posts import counters, feed_cache, search, thumbnails, timeline
+from posts.models import Group, Post
+
+User = get_user_model()
+
+FORMATS = ('jsonl', 'csv')
+# Сколько сообщений о пропущенных строках выводить.
+MAX_ERRORS_SHOWN = 20
+
+
+class RowError(Exception):
+    pass
+
+
+@contextmanager
+def keep_pub_date():
+    """bulk_create с датами из файла, а не текущим временем.
+
+    auto_now_add заменяет pub_date при любой вставке, поэтому на время
+    загрузки он выключается.
+    """
+    field = Post._meta.get_field('pub_date')
+    field.auto_now_add = False
+    try:
+        yield
+    finally:
+        field.auto_now_add = True
+
+
+class Command(BaseCommand):
+    help = (
+        'Загружает посты из JSONL или CSV с полями text, author, '
+        'group, pub_date и image пачками через bulk_create; ленты и '
+        'счётчики авторов и групп сдвигаются на каждую пачку, поисковый '
+        'индекс перестраивается один раз в конце.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Файл с постами или - для stdin.')
+        parser.add_argument(
+            '--format', choices=FORMATS,
+            help='Формат файла (по умолчанию — по расширению).',
+        )
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument(
+            '--images',
+            help='Папка, относительно которой указаны картинки в поле image.',
+        )
+        parser.add_argument(
+            '--create-missing', action='store_true',
+            help='Заводить неизвестных авторов и группы, а не пропускать '
+                 'их посты.',
+        )
+
+    def handle(self, *args, **options):
+        file_format = options['format'] or self.guess_format(options['path'])
+        self.images_dir = options['images']
+        self.create_missing = options['create_missing']
+        self.authors = dict(User.objects.values_list('username', 'id'))
+        self.groups = dict(Group.objects.values_list('slug', 'id'))
+        self.images = {}
+        self.skipped = 0
+        self.entries = 0
+        started = time.perf_counter()
+        created = 0
+        with self.input_file(options['path']) as file, search.suspended(), \
+                keep_pub_date():
+            batch = []
+            for number, record in self.records(file, file_format):
+                try:
+                    batch.append(self.build(record))
+                except RowError as error:
+                    self.skip(number, error)
+                    continue
+                if len(batch) >= options['batch_size']:
+                    created += self.save(batch)
+                    batch = []
+            created += self.save(batch)
+        elapsed = time.perf_counter() - started
+        self.stdout.write(
+            f'posts: {created} за {elapsed:.1f} с, пропущено: {self.skipped}'
+        )
+        if created:
+            self.finish()
+
+    def guess_format(self, path):
+        extension = os.path.splitext(path)[1].lstrip('.').lower()
+        if extension in ('jsonl', 'ndjson'):
+            return 'jsonl'
+        if extension == 'csv':
+            return 'csv'
+        raise CommandError('Укажите --format: jsonl или csv.')
+
+    @contextmanager
+    def input_file(self, path):
+        if path == '-':
+            yield sys.stdin
+            return
+        try:
+            file = open(path, encoding='utf-8', newline='')
+        except OSError as error:
+            raise CommandError(f'Не открыть {path}: {error}')
+        with file:
+            yield file
+
+    def records(self, file, file_format):
+        """(номер строки, запись) по одной, не читая файл целиком."""
+        if file_format == 'csv':
+            reader = csv.DictReader(file)
+            for record in reader:
+                yield reader.line_num, record
+            return
+        for number, line in enumerate(file, 1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError as error:
+                self.skip(number, f'неверный JSON: {error}')
+                continue
+            if not isinstance(record, dict):
+                self.skip(number, 'запись должна быть объектом')
+                continue
+            yield number, record
+
+    def skip(self, number, reason):
+        self.skipped += 1
+        if self.skipped <= MAX_ERRORS_SHOWN:
+            self.stderr.write(f'строка {number}: {reason}')
+
+    def build(self, record):
+        text = (record.get('text') or '').strip()
+        if not text:
+            raise RowError('нет текста')
+        return Post(
+            text=text,
+            author_id=self.author_id(record.get('author')),
+            group_id=self.group_id(record.get('group')),
+            pub_date=self.pub_date(record.get('pub_date')),
+            image=self.image(record.get('image')),
+        )
+
+    def author_id(self, username):
+        if not username:
+            raise RowError('нет автора')
+        if username not in self.authors:
+            if not self.create_missing:
+                raise RowError(f'нет пользователя {username}')
+            user = User(username=username)
+            user.set_unusable_password()
+            user.save()
+            self.authors[username] = user.id
+        return self.authors[username]
+
+    def group_id(self, slug):
+        if not slug:
+            return None
+        if slug not in self.groups:
+            if not self.create_missing:
+                raise RowError(f'нет группы {slug}')
+            group = Group.objects.create(title=slug, slug=slug)
+            self.groups[slug] = group.id
+        return self.groups[slug]
+
+    def pub_date(self, value):
+        if not value:
+            return timezone.now()
+        try:
+            date = parse_datetime(value)
+        except ValueError:
+            date = None
+        if date is None:
+            raise RowError(f'неверная дата {value}')
+        if timezone.is_naive(date):
+            date = timezone.make_aware(date)
+        return date
+
+    def image(self, name):
+        """Имя картинки в хранилище; одна картинка сохраняется один раз."""
+        if not name:
+            return ''
+        if not self.images_dir:
+            raise RowError('картинка без --images')
+        if name not in self.images:
+            path = os.path.join(self.images_dir, name)
+            if not os.path.isfile(path):
+                raise RowError(f'нет файла {path}')
+            with open(path, 'rb') as file:
+                self.images[name] = default_storage.save(
+                    Post.image.field.generate_filename(
+                        None, os.path.basename(name)
+                    ),
+                    File(file),
+                )
+        return self.images[name]
+
+    def save(self, batch):
+        """Записать пачку и сделать за неё то, что обычно делают сигналы.
+
+        Новые посты — это строки с id больше прежнего наибольшего:
+        bulk_create в SQLite id не возвращает.
+        """
+        if not batch:
+            return 0
+        with transaction.atomic():
+            last_id = Post.objects.aggregate(last=Max('id'))['last'] or 0
+            Post.objects.bulk_create(batch)
+            self.entries += timeline.fan_out_loaded(last_id)
+            counters.change(counters.POSTS, 0, len(batch))
+            for scope, keys in (
+                (counters.AUTHOR_POSTS, [post.author_id for post in batch]),
+                (counters.GROUP_POSTS, [post.group_id for post in batch]),
+            ):
+                for key, number in Counter(keys).items():
+                    if key:
+                        counters.change(scope, key, number)
+        return len(batch)
+
+    def finish(self):
+        """Миниатюры и сброс кеша страниц после загрузки."""
+        for name in set(self.images.values()):
+            thumbnails.schedule(name)
+        feed_cache.bump(feed_cache.SITE)
+        self.stdout.write(f'записей в лентах: {self.entries}')
@@ -0,0 +1,398 @@
+import http.client
+import json
+import random
+import statistics
+import threading
+import time
+from collections import Counter, defaultdict
+from urllib.parse import urlencode, urlsplit
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.core.servers.basehttp import (
+    ThreadedWSGIServer, WSGIRequestHandler, get_internal_wsgi_application,
+)
+from django.db.models import Count
+from django.middleware.csrf import get_token
+from django.test import Client, RequestFactory
+
+from posts.models import Follow, Group, Post
+from posts.utils import CursorPaginator
+
+User = get_user_model()
+
+# Сценарий и его доля в трафике по умолчанию.
+DEFAULT_MIX = {
+    'index': 30,
+    'deep': 10,
+    'group': 15,
+    'profile': 15,
+    'post': 20,
+    'follow': 8,
+    'comment': 2,
+}
+# Сколько разных групп, авторов, постов и читателей берётся из базы.
+SAMPLE_SIZE = 200
+# Замеры сравниваются с базовыми, если выросли (упали) больше чем на:
+DEFAULT_THRESHOLD = 0.1
+
+
+def parse_mix(value):
+    """'index=3,post=1' -> {'index': 3, 'post': 1}."""
+    mix = {}
+    for item in value.split(','):
+        name, _, weight = item.partition('=')
+        name = name.strip()
+        if name not in DEFAULT_MIX:
+            raise CommandError(f'Неизвестный сценарий: {name}')
+        try:
+            mix[name] = float(weight)
+        except ValueError:
+            raise CommandError(f'Неверная доля сценария: {item}')
+    return mix
+
+
+def percentile(values, fraction):
+    """Процентиль по ближайшему рангу; values отсортированы."""
+    if not values:
+        return None
+    index = max(0, min(len(values) - 1, round(fraction * len(values)) - 1))
+    return values[index]
+
+
+def fetch(connection, method, path, headers, body):
+    """(статус или None при обрыве, время ответа в мс)."""
+    start = time.perf_counter()
+    try:
+        connection.request(method, path, body, headers)
+        response = connection.getresponse()
+        response.read()
+        status = response.status
+    except (OSError, http.client.HTTPException):
+        connection.close()
+        status = None
+    return status, (time.perf_counter() - start) * 1000
+
+
+class QuietHandler(WSGIRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+class Traffic:
+    """Адреса и сессии, из которых собираются запросы сценариев."""
+
+    def __init__(self):
+        self.groups = list(Group.objects.annotate(
+            posts_number=Count('posts')
+        ).order_by('-posts_number').values_list('slug', flat=True)[
+            :SAMPLE_SIZE
+        ])
+        self.authors = list(User.objects.annotate(
+            posts_number=Count('posts')
+        ).filter(posts_number__gt=0).order_by(
+            '-posts_number'
+        ).values_list('username', flat=True)[:SAMPLE_SIZE])
+        self.posts = list(Post.objects.order_by('?').values_list(
+            'id', flat=True
+        )[:SAMPLE_SIZE])
+        paginator = CursorPaginator(Post.objects.all(), 1)
+        self.cursors = [
+            paginator.encode_cursor(post)
+            for post in Post.objects.order_by('?').only(
+                'pub_date', 'id'
+            )[:SAMPLE_SIZE]
+        ]
+        reader_ids = Follow.objects.values_list(
+            'user_id', flat=True
+        ).distinct()[:SAMPLE_SIZE]
+        self.readers = [
+            self.session(user) for user in User.objects.filter(
+                id__in=list(reader_ids)
+            )
+        ]
+
+    def session(self, user):
+        """Cookie вошедшего пользователя и токен CSRF для его форм."""
+        client = Client()
+        client.force_login(user)
+        request = RequestFactory().get('/')
+        token = get_token(request)
+        cookies = {
+            settings.SESSION_COOKIE_NAME:
+                client.cookies[settings.SESSION_COOKIE_NAME].value,
+            settings.CSRF_COOKIE_NAME: request.META['CSRF_COOKIE'],
+        }
+        return {
+            'cookie': '; '.join(f'{k}={v}' for k, v in cookies.items()),
+            'token': token,
+        }
+
+    def available(self, name):
+        return bool({
+            'index': True,
+            'deep': self.cursors,
+            'group': self.groups,
+            'profile': self.authors,
+            'post': self.posts,
+            'follow': self.readers,
+            'comment': self.readers and self.posts,
+        }[name])
+
+    def request(self, name, rng):
+        """(метод, путь, заголовки, тело) для сценария."""
+        headers = {}
+        body = None
+        method = 'GET'
+        if name == 'index':
+            path = '/'
+        elif name == 'deep':
+            path = '/?' + urlencode({'after': rng.choice(self.cursors)})
+        elif name == 'group':
+            path = f'/group/{rng.choice(self.groups)}/'
+        elif name == 'profile':
+            path = f'/profile/{rng.choice(self.authors)}/'
+        elif name == 'post':
+            path = f'/posts/{rng.choice(self.posts)}/'
+        else:
+            reader = rng.choice(self.readers)
+            headers['Cookie'] = reader['cookie']
+            if name == 'follow':
+                path = '/follow/'
+            else:
+                method = 'POST'
+                path = f'/posts/{rng.choice(self.posts)}/comment/'
+                headers['Content-Type'] = 'application/x-www-form-urlencoded'
+                body = urlencode({
+                    'text': 'Комментарий под нагрузкой',
+                    'csrfmiddlewaretoken': reader['token'],
+                })
+        return method, path, headers, body
+
+
+class Command(BaseCommand):
+    help = (
+        'Нагружает маршруты постов смесью запросов из нескольких потоков '
+        'и пишет отчёт о задержках (p50/p90/p99) и пропускной способности; '
+        'с --baseline сравнивает его с сохранённым и падает при регрессии.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--url',
+            help='Адрес запущенного сервера, например http://127.0.0.1:8000. '
+                 'Без него приложение запускается в этом процессе.',
+        )
+        parser.add_argument('--concurrency', type=int, default=8)
+        parser.add_argument(
+            '--duration', type=float, default=30,
+            help='Сколько секунд длится замер.',
+        )
+        parser.add_argument(
+            '--warmup', type=float, default=3,
+            help='Сколько секунд нагрузки не попадают в отчёт.',
+        )
+        parser.add_argument(
+            '--mix',
+            help='Доли сценариев, например index=3,post=1; сценарии: '
+                 + ', '.join(DEFAULT_MIX) + '.',
+        )
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--json', help='Куда записать отчёт в JSON.')
+        parser.add_argument(
+            '--markdown', help='Куда записать отчёт в markdown.',
+        )
+        parser.add_argument(
+            '--baseline', help='Отчёт JSON, с которым сравнить замер.',
+        )
+        parser.add_argument(
+            '--threshold', type=float, default=DEFAULT_THRESHOLD,
+            help='Допустимое ухудшение p50, p99 и запросов в секунду.',
+        )
+
+    def handle(self, *args, **options):
+        traffic = Traffic()
+        mix = parse_mix(options['mix']) if options['mix'] else DEFAULT_MIX
+        mix = {
+            name: weight
+            for name, weight in mix.items()
+            if weight > 0 and traffic.available(name)
+        }
+        if not mix:
+            raise CommandError(
+                'Нет данных для сценариев: заполните базу (seed_db).'
+            )
+        server = None
+        if options['url']:
+            url = urlsplit(options['url'])
+            address = (url.hostname, url.port or 80)
+        else:
+            server = ThreadedWSGIServer(('127.0.0.1', 0), QuietHandler)
+            server.set_app(get_internal_wsgi_application())
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+            address = server.server_address[:2]
+        try:
+            results = self.run(traffic, mix, address, options)
+        finally:
+            if server is not None:
+                server.shutdown()
+                server.server_close()
+        report = self.report(results, mix, options)
+        baseline = None
+        if options['baseline']:
+            with open(options['baseline'], encoding='utf-8') as file:
+                baseline = json.load(file)
+        regressions = self.compare(report, baseline, options['threshold'])
+        markdown = self.markdown(report, baseline, regressions)
+        self.stdout.write(markdown)
+        if options['json']:
+            with open(options['json'], 'w', encoding='utf-8') as file:
+                json.dump(report, file, ensure_ascii=False, indent=2)
+        if options['markdown']:
+            with open(options['markdown'], 'w', encoding='utf-8') as file:
+                file.write(markdown)
+        if regressions:
+            raise CommandError('Регрессии: ' + ', '.join(regressions))
+
+    def run(self, traffic, mix, address, options):
+        """Гонять сценарии из concurrency потоков; вернуть замеры."""
+        names = list(mix)
+        weights = [mix[name] for name in names]
+        started = time.monotonic()
+        measure_from = started + options['warmup']
+        stop_at = measure_from + options['duration']
+        results = defaultdict(lambda: {
+            'latencies': [], 'statuses': Counter(), 'errors': 0,
+        })
+        lock = threading.Lock()
+
+        def worker(number):
+            rng = random.Random(options['seed'] * 1000 + number)
+            connection = http.client.HTTPConnection(*address, timeout=30)
+            while True:
+                now = time.monotonic()
+                if now >= stop_at:
+                    break
+                name = rng.choices(names, weights)[0]
+                status, elapsed = fetch(
+                    connection, *traffic.request(name, rng)
+                )
+                if now < measure_from:
+                    continue
+                with lock:
+                    result = results[name]
+                    if status is None or status >= 500:
+                        result['errors'] += 1
+                    if status is not None:
+                        result['statuses'][status] += 1
+                        result['latencies'].append(elapsed)
+            connection.close()
+
+        threads = [
+            threading.Thread(target=worker, args=(number,))
+            for number in range(options['concurrency'])
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.elapsed = time.monotonic() - measure_from
+        return results
+
+    def report(self, results, mix, options):
+        def summary(latencies, errors, statuses):
+            latencies = sorted(latencies)
+            return {
+                'requests': len(latencies),
+                'errors': errors,
+                'statuses': {
+                    str(status): count
+                    for status, count in sorted(statuses.items())
+                },
+                'rps': round(len(latencies) / self.elapsed, 2),
+                'mean': round(statistics.mean(latencies), 2)
+                if latencies else None,
+                **{
+                    name: round(percentile(latencies, fraction), 2)
+                    if latencies else None
+                    for name, fraction in (
+                        ('p50', 0.5), ('p90', 0.9), ('p99', 0.99),
+                        ('max', 1),
+                    )
+                },
+            }
+
+        scenarios = {
+            name: summary(
+                result['latencies'], result['errors'], result['statuses']
+            )
+            for name, result in sorted(results.items())
+        }
+        return {
+            'config': {
+                'concurrency': options['concurrency'],
+                'duration': round(self.elapsed, 2),
+                'mix': mix,
+                'seed': options['seed'],
+                'target': options['url'] or 'in-process',
+            },
+            'scenarios': scenarios,
+            'total': summary(
+                [value for result in results.values()
+                 for value in result['latencies']],
+                sum(result['errors'] for result in results.values()),
+                sum(
+                    (result['statuses'] for result in results.values()),
+                    Counter(),
+                ),
+            ),
+        }
+
+    def compare(self, report, baseline, threshold):
+        """Сценарии, у которых p50/p99 выросли или rps упали сильнее."""
+        if baseline is None:
+            return []
+        regressions = []
+        current = {**report['scenarios'], 'total': report['total']}
+        previous = {**baseline['scenarios'], 'total': baseline['total']}
+        for name, stats in current.items():
+            old = previous.get(name)
+            if not old:
+                continue
+            for metric in ('p50', 'p99'):
+                if old[metric] and stats[metric] and (
+                    stats[metric] > old[metric] * (1 + threshold)
+                ):
+                    regressions.append(f'{name} {metric}')
+            if old['rps'] and stats['rps'] < old['rps'] * (1 - threshold):
+                regressions.append(f'{name} rps')
+        return regressions
+
+    def markdown(self, report, baseline, regressions):
+        config = report['config']
+        lines = [
+            f"Нагрузка: {config['target']}, потоков: "
+            f"{config['concurrency']}, {config['duration']} с.",
+            '',
+            '| сценарий | запросов | ошибок | rps | p50, мс | p90, мс '
+            '| p99, мс | max, мс |',
+            '|---|---:|---:|---:|---:|---:|---:|---:|',
+        ]
+        previous = {}
+        if baseline is not None:
+            previous = {**baseline['scenarios'], 'total': baseline['total']}
+        rows = [*report['scenarios'].items(), ('total', report['total'])]
+        for name, stats in rows:
+            old = previous.get(name, {})
+            cells = [name, str(stats['requests']), str(stats['errors'])]
+            for metric in ('rps', 'p50', 'p90', 'p99', 'max'):
+                cell = '-' if stats[metric] is None else f'{stats[metric]}'
+                if old.get(metric) and stats[metric] is not None:
+                    change = stats[metric] / old[metric] - 1
+                    cell += f' ({change:+.0%})'
+                cells.append(cell)
+            lines.append('| ' + ' | '.join(cells) + ' |')
+        if regressions:
+            lines += ['', 'Регрессии: ' + ', '.join(regressions)]
+        return '\n'.join(lines) + '\n'
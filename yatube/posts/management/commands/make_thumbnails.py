@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+
+from posts import thumbnails
+from posts.models import Post
+
+
+class Command(BaseCommand):
+    help = 'Ставит в очередь (или сразу создаёт) миниатюры картинок постов.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--now', action='store_true',
+            help='Создать миниатюры сразу, без очереди.',
+        )
+
+    def handle(self, *args, **options):
+        # Картинку одного импорта делят несколько постов.
+        names = Post.objects.exclude(image='').values_list(
+            'image', flat=True
+        ).order_by().distinct().iterator()
+        total = 0
+        for name in names:
+            if options['now']:
+                thumbnails.generate(name)
+            else:
+                thumbnails.schedule(name)
+            total += 1
+        self.stdout.write(f'Картинок: {total}')
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+
+from posts import counters
+
+COMMENTS = 'comments'
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает хранимые счётчики постов, комментариев и подписок.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Сколько строк пересчитывать за один запрос.',
+        )
+        parser.add_argument(
+            '--scope', action='append',
+            choices=[*counters.SCOPES, COMMENTS],
+            help='Какие счётчики пересчитать (по умолчанию все).',
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        for scope in options['scope'] or [*counters.SCOPES, COMMENTS]:
+            if scope == COMMENTS:
+                total = counters.rebuild_comments(batch_size)
+            else:
+                total = counters.rebuild(scope, batch_size)
+            self.stdout.write(f'{scope}: {total}')
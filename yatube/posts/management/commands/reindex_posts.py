@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import search
+
+
+class Command(BaseCommand):
+    help = 'Перестраивает полнотекстовый индекс постов (FTS5).'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--optimize', action='store_true',
+            help='После перестройки слить сегменты индекса.',
+        )
+
+    def handle(self, *args, **options):
+        if not search.is_available():
+            raise CommandError('Полнотекстовый индекс есть только у SQLite.')
+        search.rebuild()
+        if options['optimize']:
+            search.optimize()
+        self.stdout.write('Индекс постов перестроен.')
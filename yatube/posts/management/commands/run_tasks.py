@@ -0,0 +1,33 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from posts import tasks
+
+
+class Command(BaseCommand):
+    help = 'Выполняет фоновые задачи постов (миниатюры и т. п.).'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--once', action='store_true',
+            help='Разобрать очередь один раз и выйти.',
+        )
+        parser.add_argument(
+            '--interval', type=float, default=1.0,
+            help='Пауза между проверками пустой очереди, в секундах.',
+        )
+        parser.add_argument(
+            '--limit', type=int, default=100,
+            help='Сколько задач брать за один проход.',
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            done = tasks.run_pending(limit=options['limit'])
+            if done:
+                self.stdout.write(f'Выполнено задач: {done}')
+            if options['once']:
+                return
+            if not done:
+                time.sleep(options['interval'])
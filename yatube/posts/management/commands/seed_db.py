@@ -0,0 +1,327 @@
+import io
+import json
+import random
+import time
+from datetime import date, datetime, timedelta
+
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import Count, DateTimeField, Max, Min
+from django.utils import timezone
+from faker import Faker
+from PIL import Image
+from sorl.thumbnail import default
+from sorl.thumbnail.images import ImageFile
+
+from posts import counters, feed_cache, search, thumbnails, timeline
+from posts.models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+# Из скольких предложений Faker собираются тексты постов и комментариев.
+SENTENCES = 2000
+# Сколько разных картинок у постов с картинкой.
+IMAGES = 8
+# Последний день данных по умолчанию: от даты запуска они не зависят.
+END_DATE = '2024-01-01'
+# Доля постов без группы.
+NO_GROUP_RATIO = 0.3
+# Страничный кеш SQLite на время загрузки, КиБ. С кешем по умолчанию
+# (2 МиБ) индексы лент не помещаются в память и вставка упирается в диск.
+SQLITE_CACHE_SIZE = 256 * 1024
+
+
+def skewed(rng, number, skew):
+    """Индекс от 0 до number - 1; чем больше skew, тем чаще малые.
+
+    При skew = 3 на первый 1 % индексов приходится пятая часть выборок:
+    так получаются популярные авторы и группы.
+    """
+    return int(number * rng.random() ** skew)
+
+
+def insert(model, fields, rows):
+    """Вставить пачку строк одним executemany в одной транзакции.
+
+    Мимо ORM: bulk_create заменил бы pub_date текущим временем
+    (auto_now_add) и строил бы объект модели на каждую строку.
+    Для базы готовятся только даты, остальное драйвер принимает как есть.
+    """
+    fields = [model._meta.get_field(name) for name in fields]
+    dates = [
+        index for index, field in enumerate(fields)
+        if isinstance(field, DateTimeField)
+    ]
+    quote = connection.ops.quote_name
+    sql = 'INSERT INTO {} ({}) VALUES ({})'.format(
+        quote(model._meta.db_table),
+        ', '.join(quote(field.column) for field in fields),
+        ', '.join(['%s'] * len(fields)),
+    )
+    if dates:
+        adapt = connection.ops.adapt_datetimefield_value
+        rows = [list(row) for row in rows]
+        for row in rows:
+            for index in dates:
+                row[index] = adapt(row[index])
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.executemany(sql, rows)
+
+
+def inserted_ids(queryset):
+    """id строк; range, если они идут подряд, иначе список.
+
+    В SQLite строки одной загрузки получают id подряд, и тогда
+    память не зависит от их числа.
+    """
+    stats = queryset.aggregate(first=Min('id'), last=Max('id'),
+                               count=Count('id'))
+    if not stats['count']:
+        return range(0)
+    if stats['last'] - stats['first'] + 1 == stats['count']:
+        return range(stats['first'], stats['last'] + 1)
+    return list(queryset.order_by('id').values_list('id', flat=True))
+
+
+class Command(BaseCommand):
+    help = (
+        'Заполняет базу синтетическими пользователями, группами, '
+        'постами, комментариями и подписками с перекосом популярности. '
+        'Одно и то же --seed даёт одни и те же данные.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=10000)
+        parser.add_argument('--groups', type=int, default=200)
+        parser.add_argument('--posts', type=int, default=200000)
+        parser.add_argument('--comments', type=int, default=300000)
+        parser.add_argument('--follows', type=int, default=100000)
+        parser.add_argument(
+            '--image-ratio', type=float, default=0.1,
+            help='Доля постов с картинкой.',
+        )
+        parser.add_argument(
+            '--days', type=int, default=365,
+            help='За сколько дней до --end-date идут посты.',
+        )
+        parser.add_argument(
+            '--end-date', type=date.fromisoformat, default=END_DATE,
+            help='Дата (ГГГГ-ММ-ДД), к началу которой заканчиваются посты.',
+        )
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument(
+            '--prefix', default='seed',
+            help='Начало имён пользователей и адресов групп.',
+        )
+
+    def handle(self, *args, **options):
+        self.rng = random.Random(options['seed'])
+        self.faker = Faker('ru_RU')
+        self.faker.seed_instance(options['seed'])
+        self.batch_size = options['batch_size']
+        self.prefix = options['prefix']
+        self.end = timezone.make_aware(
+            datetime.combine(options['end_date'], datetime.min.time())
+        )
+        self.span = timedelta(days=options['days'])
+        if connection.vendor == 'sqlite':
+            with connection.cursor() as cursor:
+                cursor.execute(f'PRAGMA cache_size = -{SQLITE_CACHE_SIZE}')
+        self.sentences = [
+            self.faker.sentence(nb_words=10) for _ in range(SENTENCES)
+        ]
+
+        users = self.step('users', self.create_users, options['users'])
+        groups = self.step('groups', self.create_groups, options['groups'])
+        images = self.create_images(options['image_ratio'])
+        with search.suspended():
+            posts = self.step(
+                'posts', self.create_posts, options['posts'], users, groups,
+                images, options['image_ratio'],
+            )
+        self.step('comments', self.create_comments, options['comments'],
+                  users, posts)
+        self.step('follows', self.create_follows, options['follows'], users)
+        self.rebuild()
+
+    def step(self, name, create, number, *args):
+        started = time.perf_counter()
+        result = create(number, *args)
+        elapsed = time.perf_counter() - started
+        self.stdout.write(
+            f'{name}: {number} за {elapsed:.1f} с '
+            f'({number / max(elapsed, 1e-6):.0f} в секунду)'
+        )
+        return result
+
+    def batches(self, rows):
+        batch = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= self.batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    def text(self, low, high):
+        return ' '.join(
+            self.rng.choice(self.sentences)
+            for _ in range(self.rng.randint(low, high))
+        )
+
+    def create_users(self, number):
+        joined = self.end - self.span
+        last_id = User.objects.aggregate(last=Max('id'))['last'] or 0
+        rows = (
+            (
+                f'{self.prefix}_{self.faker.user_name()}_{index}', '!',
+                self.faker.first_name(), self.faker.last_name(), '',
+                False, True, False, joined,
+            )
+            for index in range(number)
+        )
+        for batch in self.batches(rows):
+            insert(User, (
+                'username', 'password', 'first_name', 'last_name', 'email',
+                'is_staff', 'is_active', 'is_superuser', 'date_joined',
+            ), batch)
+        return inserted_ids(User.objects.filter(id__gt=last_id))
+
+    def create_groups(self, number):
+        last_id = Group.objects.aggregate(last=Max('id'))['last'] or 0
+        rows = (
+            (
+                self.faker.catch_phrase()[:200], f'{self.prefix}-{index}',
+                self.text(1, 3),
+            )
+            for index in range(number)
+        )
+        for batch in self.batches(rows):
+            insert(Group, ('title', 'slug', 'description'), batch)
+        return inserted_ids(Group.objects.filter(id__gt=last_id))
+
+    def create_images(self, image_ratio):
+        """Несколько картинок с готовыми миниатюрами: (имя, JSON)."""
+        if not image_ratio:
+            return []
+        images = []
+        for index in range(IMAGES):
+            colors = [
+                tuple(self.rng.randrange(256) for _ in range(3))
+                for _ in range(2)
+            ]
+            image = Image.new('RGB', (1200, 800), colors[0])
+            image.paste(colors[1], (0, 400, 1200, 800))
+            data = io.BytesIO()
+            image.save(data, 'JPEG', quality=80)
+            name = default_storage.save(
+                f'posts/{self.prefix}_{index}.jpg',
+                ContentFile(data.getvalue()),
+            )
+            source = ImageFile(name, default.storage)
+            made = {}
+            for alias in thumbnails.ALIASES:
+                variants = thumbnails.make(source, alias)
+                if variants is not None:
+                    made[alias] = variants
+            images.append((name, json.dumps(made) if made else ''))
+        return images
+
+    def post_date(self, index, number):
+        """Посты идут по времени: id растёт вместе с датой."""
+        return self.end - self.span + self.span * (index + 0.5) / number
+
+    def create_posts(self, number, users, groups, images, image_ratio):
+        last_id = Post.objects.aggregate(last=Max('id'))['last'] or 0
+
+        def rows():
+            for index in range(number):
+                image, thumbnails_data = '', ''
+                if images and self.rng.random() < image_ratio:
+                    image, thumbnails_data = self.rng.choice(images)
+                group_id = None
+                if groups and self.rng.random() >= NO_GROUP_RATIO:
+                    group_id = groups[skewed(self.rng, len(groups), 2)]
+                yield (
+                    self.text(1, 6),
+                    users[skewed(self.rng, len(users), 2)],
+                    group_id, image, thumbnails_data, '', 0,
+                    self.post_date(index, number),
+                )
+
+        for batch in self.batches(rows()):
+            insert(Post, (
+                'text', 'author', 'group', 'image', 'thumbnails',
+                'staged_image', 'comments_count', 'pub_date',
+            ), batch)
+        self.posts_number = number
+        return inserted_ids(Post.objects.filter(id__gt=last_id))
+
+    def create_comments(self, number, users, posts):
+        if not posts:
+            return
+
+        def rows():
+            for _ in range(number):
+                # Чаще комментируют свежие посты.
+                index = len(posts) - 1 - skewed(self.rng, len(posts), 2)
+                posted = self.post_date(index, self.posts_number)
+                delay = (self.end - posted) * self.rng.random() ** 4
+                yield (
+                    posts[index], users[skewed(self.rng, len(users), 1.5)],
+                    self.text(1, 2), posted + delay,
+                )
+
+        for batch in self.batches(rows()):
+            insert(Comment, ('post', 'author', 'text', 'pub_date'), batch)
+
+    def create_follows(self, number, users):
+        """Подписки без повторов; на популярных авторов подписаны чаще.
+
+        Каждый читатель подписывается примерно на number / len(users)
+        авторов, а первые авторы собирают больше всего подписчиков и
+        оказываются за порогом раскладки лент (TIMELINE_FANOUT_LIMIT).
+        """
+        users_number = len(users)
+        if users_number < 2:
+            return
+        per_user = number / users_number
+
+        def rows():
+            for index in range(users_number):
+                wanted = min(
+                    int((index + 1) * per_user) - int(index * per_user),
+                    users_number - 1,
+                )
+                if wanted * 2 > users_number:
+                    chosen = set(self.rng.sample(range(users_number), wanted))
+                    chosen.discard(index)
+                else:
+                    chosen = set()
+                    while len(chosen) < wanted:
+                        author = skewed(self.rng, users_number, 3)
+                        if author != index:
+                            chosen.add(author)
+                for author in sorted(chosen):
+                    yield users[index], users[author]
+
+        for batch in self.batches(rows()):
+            insert(Follow, ('user', 'author'), batch)
+
+    def rebuild(self):
+        """Счётчики и ленты, которые обычно ведут сигналы записи."""
+        started = time.perf_counter()
+        for scope in counters.SCOPES:
+            counters.rebuild(scope)
+        counters.rebuild_comments()
+        entries = timeline.rebuild()
+        feed_cache.bump(feed_cache.SITE)
+        self.stdout.write(
+            f'счётчики и ленты ({entries} записей в лентах): '
+            f'{time.perf_counter() - started:.1f} с'
+        )
@@ -0,0 +1,139 @@
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.urls import Resolver404, resolve
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+
+from . import feed_cache, holes
+
+
+def post_page_scopes(post_id):
+    """Пост и его автор: на странице есть число постов автора."""
+    scopes = [feed_cache.post_scope(post_id)]
+    author_id = feed_cache.post_author_id(post_id)
+    if author_id is not None:
+        scopes.append(feed_cache.author_scope(author_id))
+    return scopes
+
+
+PAGE_SCOPES = {
+    'posts:index': lambda kwargs: [feed_cache.INDEX],
+    'posts:group_list': lambda kwargs: [
+        feed_cache.group_scope(kwargs['slug'])
+    ],
+    'posts:profile': lambda kwargs: [
+        feed_cache.profile_scope(kwargs['username'])
+    ],
+    'posts:post_detail': lambda kwargs: post_page_scopes(kwargs['post_id']),
+}
+
+STORED_HEADERS = ('Content-Type', 'Content-Language', 'Vary')
+
+
+class PageCacheMiddleware:
+    """Кеш целых страниц лент и постов, общий для всех читателей.
+
+    Всё, что зависит от пользователя (навигация, кнопки подписки и
+    редактирования, форма комментария), шаблоны выводят метками
+    (см. posts.holes), поэтому в кеше лежит одно тело страницы,
+    а метки заполняются для каждого запроса — и закешированного,
+    и только что отрендеренного.
+
+    Валидаторы страницы считаются по поколениям её областей
+    (см. posts.feed_cache): ETag — по их номерам, Last-Modified — по
+    времени последнего изменения, если его секунда уже прошла. Поколения
+    сдвигают записи постов, комментариев и подписок, поэтому условный
+    GET получает 304, а повторный — готовый ответ, и представление не
+    вызывается.
+    Валидаторы отдаются только анонимным читателям (запрос без cookie
+    сессии): у остальных ответ зависит ещё и от их фрагментов.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request.punch_holes = True
+        scopes = self.page_scopes(request)
+        if scopes is None:
+            return self.fill_holes(request, self.get_response(request))
+        generations = feed_cache.generations(*scopes)
+        etag = self.etag(request, generations)
+        last_modified = feed_cache.last_modified(generations)
+        anonymous = self.is_anonymous(request)
+        if anonymous:
+            response = get_conditional_response(
+                request, etag=etag, last_modified=last_modified
+            )
+            if response is not None:
+                return self.set_validators(response, etag, last_modified)
+        key = f'page_cache:{etag}'
+        cached = cache.get(key)
+        if cached is not None:
+            status, headers, content = cached
+            response = HttpResponse(content, status=status)
+            for header, value in headers:
+                response[header] = value
+        else:
+            response = self.get_response(request)
+            if not self.is_cacheable(request, response):
+                return self.fill_holes(request, response)
+            cache.set(key, (
+                response.status_code,
+                [(header, response[header]) for header in STORED_HEADERS
+                 if response.has_header(header)],
+                response.content,
+            ), settings.PAGE_CACHE_TIMEOUT)
+        if anonymous:
+            self.set_validators(response, etag, last_modified)
+        return self.fill_holes(request, response)
+
+    def is_anonymous(self, request):
+        return settings.SESSION_COOKIE_NAME not in request.COOKIES
+
+    def fill_holes(self, request, response):
+        if (
+            response.streaming
+            or 'text/html' not in response.get('Content-Type', '')
+        ):
+            return response
+        response.content = holes.fill(request, response.content)
+        if response.has_header('Content-Length'):
+            response['Content-Length'] = str(len(response.content))
+        return response
+
+    def page_scopes(self, request):
+        """Области страницы или None, если её не кешируем."""
+        if request.method not in ('GET', 'HEAD'):
+            return None
+        try:
+            match = resolve(request.path_info)
+        except Resolver404:
+            return None
+        scopes = PAGE_SCOPES.get(match.view_name)
+        return scopes(match.kwargs) if scopes else None
+
+    def etag(self, request, generations):
+        raw = '|'.join(
+            [request.get_full_path(), *(str(gen) for gen in generations)]
+        )
+        return quote_etag(hashlib.md5(raw.encode()).hexdigest())
+
+    def is_cacheable(self, request, response):
+        return (
+            request.method == 'GET'
+            and response.status_code == 200
+            and not response.streaming
+            and not response.cookies
+            and not response.has_header('Cache-Control')
+        )
+
+    def set_validators(self, response, etag, last_modified):
+        response['ETag'] = etag
+        if last_modified is not None:
+            response['Last-Modified'] = http_date(last_modified)
+        patch_cache_control(response, no_cache=True)
+        return response
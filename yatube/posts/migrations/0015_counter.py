@@ -0,0 +1,26 @@
+# Generated by Django 2.2.16 on 2026-10-18 03:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0014_post_ordering_id'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Counter',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('scope', models.CharField(max_length=32, verbose_name='область подсчёта')),
+                ('key', models.PositiveIntegerField(default=0, verbose_name='ключ области')),
+                ('value', models.IntegerField(default=0, verbose_name='значение')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='counter',
+            constraint=models.UniqueConstraint(fields=('scope', 'key'), name='unique_counter_scope_key'),
+        ),
+    ]
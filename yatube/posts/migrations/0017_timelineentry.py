@@ -0,0 +1,75 @@
+# Generated by Django 2.2.16 on 2026-10-18 03:04
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+# Значения TIMELINE_BACKFILL и TIMELINE_FANOUT_LIMIT на момент миграции:
+# её результат не должен зависеть от текущих настроек.
+TIMELINE_BACKFILL = 200
+TIMELINE_FANOUT_LIMIT = 1000
+
+
+def backfill_timelines(apps, schema_editor):
+    """Одним INSERT ... SELECT, как posts.timeline.rebuild.
+
+    Подписчики получают последние посты автора; посты авторов с
+    подписчиками больше TIMELINE_FANOUT_LIMIT подтягиваются при чтении.
+    """
+    Follow = apps.get_model('posts', 'Follow')
+    Post = apps.get_model('posts', 'Post')
+    TimelineEntry = apps.get_model('posts', 'TimelineEntry')
+    quote = schema_editor.connection.ops.quote_name
+    follow_table = quote(Follow._meta.db_table)
+    schema_editor.execute(
+        f'INSERT INTO {quote(TimelineEntry._meta.db_table)} '
+        '(user_id, post_id, author_id, pub_date) '
+        'SELECT follow.user_id, post.id, post.author_id, post.pub_date '
+        f'FROM {follow_table} follow JOIN ('
+        'SELECT id, author_id, pub_date, row_number() OVER ('
+        'PARTITION BY author_id ORDER BY pub_date DESC, id DESC) AS number '
+        f'FROM {quote(Post._meta.db_table)}'
+        ') post ON post.author_id = follow.author_id '
+        'WHERE post.number <= %s AND follow.author_id IN ('
+        f'SELECT author_id FROM {follow_table} '
+        'GROUP BY author_id HAVING COUNT(*) <= %s)',
+        [TIMELINE_BACKFILL, TIMELINE_FANOUT_LIMIT],
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('posts', '0016_post_comments_count'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TimelineEntry',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('pub_date', models.DateTimeField(verbose_name='дата публикации поста')),
+                ('author', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='timeline_entries', to='posts.Post')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='timeline', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ('-pub_date', '-post'),
+            },
+        ),
+        migrations.AddIndex(
+            model_name='timelineentry',
+            index=models.Index(fields=['user', 'pub_date', 'post'], name='timeline_user_pub_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='timelineentry',
+            index=models.Index(fields=['user', 'author'], name='timeline_user_author_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='timelineentry',
+            constraint=models.UniqueConstraint(fields=('user', 'post'), name='unique_timeline_user_post'),
+        ),
+        migrations.RunPython(backfill_timelines, migrations.RunPython.noop),
+    ]
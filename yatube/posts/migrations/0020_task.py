@@ -0,0 +1,28 @@
+# Generated by Django 2.2.16 on 2026-10-18 03:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0019_post_fts'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Task',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=200, verbose_name='функция')),
+                ('args', models.TextField(default='[]', verbose_name='аргументы (JSON)')),
+                ('key', models.CharField(blank=True, max_length=255, null=True, unique=True, verbose_name='ключ для дедупликации')),
+                ('created', models.DateTimeField(auto_now_add=True, verbose_name='дата постановки')),
+                ('attempts', models.PositiveSmallIntegerField(default=0, verbose_name='попыток')),
+                ('last_error', models.TextField(blank=True, verbose_name='последняя ошибка')),
+            ],
+            options={
+                'ordering': ('id',),
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 2.2.16 on 2026-10-18 03:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0020_task'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='thumbnails',
+            field=models.TextField(blank=True, editable=False, verbose_name='миниатюры картинки (JSON)'),
+        ),
+    ]
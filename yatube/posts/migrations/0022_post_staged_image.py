@@ -0,0 +1,18 @@
+# Generated by Django 2.2.16 on 2026-10-18 04:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0021_post_thumbnails'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='staged_image',
+            field=models.CharField(blank=True, editable=False, max_length=255, verbose_name='загруженная картинка в обработке'),
+        ),
+    ]
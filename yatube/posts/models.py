@@ -1,7 +1,11 @@
+import json
+
 from core.models import CreatedModel
 from django.contrib.auth import get_user_model
 from django.db import models
 
+from . import links
+
 
 User = get_user_model()
 
@@ -17,6 +21,9 @@ class Group(models.Model):
     def __str__(self):
         return f'{self.title}'
 
+    def get_absolute_url(self):
+        return links.group_list(self.slug)
+
 
 class Post(CreatedModel):
     text = models.TextField('posts text')
@@ -39,13 +46,64 @@ class Post(CreatedModel):
         upload_to='posts/',
         blank=True,
     )
+    comments_count = models.PositiveIntegerField(
+        'число комментариев',
+        default=0,
+        editable=False,
+    )
+    thumbnails = models.TextField(
+        'миниатюры картинки (JSON)',
+        blank=True,
+        editable=False,
+    )
+    staged_image = models.CharField(
+        'загруженная картинка в обработке',
+        max_length=255,
+        blank=True,
+        editable=False,
+    )
 
     class Meta:
-        ordering = ('-pub_date',)
+        ordering = ('-pub_date', '-id')
+        indexes = [
+            models.Index(fields=['pub_date', 'id'],
+                         name='post_pub_date_idx'),
+            models.Index(fields=['author', 'pub_date', 'id'],
+                         name='post_author_pub_date_idx'),
+            models.Index(fields=['group', 'pub_date', 'id'],
+                         name='post_group_pub_date_idx'),
+        ]
 
     def __str__(self):
         return self.text[:15]
 
+    def get_absolute_url(self):
+        return links.post_detail(self.pk)
+
+    @property
+    def image_processing(self):
+        """Новая картинка ещё не обработана, см. posts.images."""
+        return bool(self.staged_image)
+
+    def get_thumbnails(self):
+        """Готовые миниатюры по видам, см. posts.thumbnails.
+
+        Испорченное описание считается отсутствующим: тогда шаблон
+        покажет оригинал картинки.
+        """
+        try:
+            data = json.loads(self.thumbnails) if self.thumbnails else {}
+        except ValueError:
+            return {}
+        return data if isinstance(data, dict) else {}
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        """Запоминает загруженные значения, чтобы видеть смену группы."""
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_values = dict(zip(field_names, values))
+        return instance
+
 
 class Comment(CreatedModel):
     post = models.ForeignKey(
@@ -67,6 +125,10 @@ class Comment(CreatedModel):
 
     class Meta:
         ordering = ('-pub_date',)
+        indexes = [
+            models.Index(fields=['post', 'pub_date'],
+                         name='comment_post_pub_date_idx'),
+        ]
 
     def __str__(self):
         return self.text[:15]
@@ -86,6 +148,74 @@ class Follow(models.Model):
 
     class Meta:
         constraints = [
-            models.UniqueConstraint(fields=['author'],
-                                    name='unique_following_author')
+            models.UniqueConstraint(fields=['user', 'author'],
+                                    name='unique_follow_user_author')
+        ]
+
+
+class Counter(models.Model):
+    """Хранимый счётчик: посты всего, по группе и автору, подписки."""
+    scope = models.CharField('область подсчёта', max_length=32)
+    key = models.PositiveIntegerField('ключ области', default=0)
+    value = models.IntegerField('значение', default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['scope', 'key'],
+                                    name='unique_counter_scope_key')
+        ]
+
+    def __str__(self):
+        return f'{self.scope}:{self.key}={self.value}'
+
+
+class TimelineEntry(models.Model):
+    """Пост в ленте подписок читателя, разложенный при публикации."""
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='timeline',
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='timeline_entries',
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+',
+    )
+    pub_date = models.DateTimeField('дата публикации поста')
+
+    class Meta:
+        ordering = ('-pub_date', '-post_id')
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'post'],
+                                    name='unique_timeline_user_post')
+        ]
+        indexes = [
+            models.Index(fields=['user', 'pub_date', 'post'],
+                         name='timeline_user_pub_date_idx'),
+            models.Index(fields=['user', 'author'],
+                         name='timeline_user_author_idx'),
         ]
+
+
+class Task(models.Model):
+    """Фоновая задача: функция и её аргументы, см. posts.tasks."""
+    name = models.CharField('функция', max_length=200)
+    args = models.TextField('аргументы (JSON)', default='[]')
+    key = models.CharField(
+        'ключ для дедупликации', max_length=255,
+        unique=True, null=True, blank=True,
+    )
+    created = models.DateTimeField('дата постановки', auto_now_add=True)
+    attempts = models.PositiveSmallIntegerField('попыток', default=0)
+    last_error = models.TextField('последняя ошибка', blank=True)
+
+    class Meta:
+        ordering = ('id',)
+
+    def __str__(self):
+        return f'{self.name}{self.args}'
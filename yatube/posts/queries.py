@@ -0,0 +1,33 @@
+from .models import Comment, Post
+
+FEED_POST_FIELDS = (
+    'text', 'pub_date', 'image', 'thumbnails', 'staged_image',
+    'comments_count',
+    'author', 'author__username',
+    'group', 'group__slug', 'group__title',
+)
+
+
+def feed_queryset(queryset=None, prefix='', fields=()):
+    """Посты для карточек ленты: автор и группа в том же запросе.
+
+    Загружаются только поля, которые выводит includes/article.html.
+    prefix — путь до поста, если лента строится по другой модели
+    (например 'post__' для TimelineEntry), fields — её собственные поля.
+    """
+    if queryset is None:
+        queryset = Post.objects.all()
+    return queryset.select_related(
+        f'{prefix}author', f'{prefix}group'
+    ).only(*fields, *(f'{prefix}{field}' for field in FEED_POST_FIELDS))
+
+
+def post_detail_queryset():
+    return Post.objects.select_related('author', 'group')
+
+
+def comments_queryset(post):
+    """Комментарии поста вместе с именами авторов."""
+    return Comment.objects.filter(post=post).select_related('author').only(
+        'text', 'author', 'author__username'
+    )
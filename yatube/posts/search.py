@@ -0,0 +1,193 @@
+import re
+from contextlib import contextmanager
+
+from django.db import connection, models
+from django.db.models.expressions import RawSQL
+
+from .models import Post
+from .queries import feed_queryset
+from .utils import CursorPaginator
+
+FTS_TABLE = 'posts_post_fts'
+MAX_TERMS = 16
+
+SCHEMA = (
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+    "text, content='posts_post', content_rowid='id', tokenize='unicode61')",
+)
+TRIGGERS = {
+    'posts_post_fts_insert': (
+        'AFTER INSERT ON posts_post BEGIN '
+        f'INSERT INTO {FTS_TABLE}(rowid, text) VALUES (new.id, new.text); '
+        'END'
+    ),
+    'posts_post_fts_delete': (
+        'AFTER DELETE ON posts_post BEGIN '
+        f'INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, text) '
+        "VALUES ('delete', old.id, old.text); "
+        'END'
+    ),
+    'posts_post_fts_update': (
+        'AFTER UPDATE OF text ON posts_post BEGIN '
+        f'INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, text) '
+        "VALUES ('delete', old.id, old.text); "
+        f'INSERT INTO {FTS_TABLE}(rowid, text) VALUES (new.id, new.text); '
+        'END'
+    ),
+}
+
+RANK = models.FloatField()
+RANK.set_attributes_from_name('rank')
+
+
+def is_available():
+    """Полнотекстовый индекс есть только у SQLite (таблица FTS5)."""
+    return connection.vendor == 'sqlite'
+
+
+def to_match(query):
+    """Запрос пользователя как выражение MATCH: все слова по префиксу.
+
+    Каждое слово берётся в кавычки, поэтому операторы FTS5 (AND, NEAR,
+    двоеточия) из строки поиска не интерпретируются.
+    """
+    terms = re.findall(r'\w+', query)[:MAX_TERMS]
+    return ' '.join(f'"{term}"*' for term in terms)
+
+
+def matching_ids(match):
+    """Подзапрос id постов, подходящих под выражение MATCH."""
+    return RawSQL(
+        f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s',
+        (match,),
+    )
+
+
+def match_count(match):
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'SELECT count(*) FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s',
+            (match,),
+        )
+        return cursor.fetchone()[0]
+
+
+def install(**kwargs):
+    """Вернуть триггеры индекса, если их нет, и перестроить индекс.
+
+    SQLite меняет схему таблицы, пересоздавая её, и триггеры на
+    posts_post при этом пропадают. Поэтому функция вызывается после
+    каждого migrate (см. PostsConfig.ready).
+    """
+    if not is_available():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'trigger' "
+            "AND tbl_name = 'posts_post'"
+        )
+        existing = {name for name, in cursor.fetchall()}
+        if existing >= set(TRIGGERS):
+            return
+        for sql in SCHEMA:
+            cursor.execute(sql)
+        for name, body in TRIGGERS.items():
+            if name not in existing:
+                cursor.execute(f'CREATE TRIGGER {name} {body}')
+    rebuild()
+
+
+def rebuild():
+    """Перестроить индекс по таблице постов."""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')"
+        )
+
+
+@contextmanager
+def suspended():
+    """Массовая загрузка постов без построчного обновления индекса.
+
+    Триггеры снимаются, а после загрузки возвращаются, и индекс
+    перестраивается целиком: так в разы быстрее.
+    """
+    if not is_available():
+        yield
+        return
+    with connection.cursor() as cursor:
+        for name in TRIGGERS:
+            cursor.execute(f'DROP TRIGGER IF EXISTS {name}')
+    try:
+        yield
+    finally:
+        install()
+
+
+def optimize():
+    """Слить сегменты индекса в один."""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('optimize')"
+        )
+
+
+class SearchPaginator(CursorPaginator):
+    """Результаты поиска по релевантности (bm25) с курсором (rank, id).
+
+    Ключ курсора берётся из индекса FTS5, а карточки постов
+    догружаются одним запросом по найденным id.
+    """
+    keys = ('rank', 'id')
+
+    def __init__(self, query, per_page, queryset=None):
+        self.match = to_match(query)
+        if queryset is None:
+            queryset = feed_queryset()
+        super().__init__(
+            queryset, per_page, count=lambda: match_count(self.match)
+        )
+
+    def key_fields(self):
+        return [RANK, self.object_list.model._meta.pk]
+
+    def window(self, values=None, forward=True):
+        """Найти per_page + 1 постов после ключа (или до него)."""
+        if not self.match:
+            return []
+        sql = (
+            f'SELECT rowid, rank FROM {FTS_TABLE} '
+            f'WHERE {FTS_TABLE} MATCH %s'
+        )
+        params = [self.match]
+        lookup, direction = ('>', 'ASC') if forward else ('<', 'DESC')
+        if values is not None:
+            sql += (
+                f' AND (rank {lookup} %s OR (rank = %s AND rowid {lookup} %s))'
+            )
+            params += [values[0], values[0], values[1]]
+        sql += f' ORDER BY rank {direction}, rowid {direction} LIMIT %s'
+        params.append(self.per_page + 1)
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            ranks = cursor.fetchall()
+        posts = self.object_list.in_bulk([post_id for post_id, _ in ranks])
+        rows = []
+        for post_id, rank in ranks:
+            post = posts.get(post_id)
+            if post is not None:
+                post.rank = rank
+                rows.append(post)
+        return rows
+
+
+def search_queryset(query, queryset=None):
+    """Посты, подходящие под запрос, без учёта релевантности."""
+    if queryset is None:
+        queryset = Post.objects.all()
+    if not is_available():
+        return queryset.filter(text__icontains=query)
+    match = to_match(query)
+    if not match:
+        return queryset.none()
+    return queryset.filter(id__in=matching_ids(match))
@@ -0,0 +1,155 @@
+from django.contrib.auth import get_user_model
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from . import counters, feed_cache, thumbnails, timeline
+from .models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+
+def expire_post_pages(post, group_ids=()):
+    """Сбросить закешированные ленты и страницы, где виден пост."""
+    if Post.author.field.is_cached(post):
+        username = post.author.username
+    else:
+        username = User.objects.filter(pk=post.author_id).values_list(
+            'username', flat=True
+        ).first()
+    scopes = [
+        feed_cache.INDEX, feed_cache.post_scope(post.pk),
+        feed_cache.author_scope(post.author_id),
+    ]
+    if username is not None:
+        scopes.append(feed_cache.profile_scope(username))
+    group_ids = [group_id for group_id in group_ids if group_id]
+    if group_ids:
+        scopes.extend(
+            feed_cache.group_scope(slug) for slug in Group.objects.filter(
+                pk__in=group_ids
+            ).values_list('slug', flat=True)
+        )
+    feed_cache.bump(*scopes)
+
+
+@receiver(pre_save, sender=Post)
+def reset_thumbnails(sender, instance, **kwargs):
+    """Миниатюры старой картинки не подходят к новой."""
+    loaded_values = getattr(instance, '_loaded_values', None)
+    if loaded_values is None or 'image' not in loaded_values:
+        return
+    if loaded_values['image'] != instance.image.name:
+        instance.thumbnails = ''
+
+
+@receiver(post_save, sender=Post)
+def count_saved_post(sender, instance, created, **kwargs):
+    if created:
+        timeline.fan_out(instance)
+        counters.change(counters.POSTS, 0, 1)
+        counters.change(counters.AUTHOR_POSTS, instance.author_id, 1)
+        if instance.group_id:
+            counters.change(counters.GROUP_POSTS, instance.group_id, 1)
+        instance._loaded_values = {
+            'group_id': instance.group_id, 'image': instance.image.name,
+        }
+        if instance.image:
+            thumbnails.schedule(instance.image.name)
+        expire_post_pages(instance, [instance.group_id])
+        return
+    loaded_values = getattr(instance, '_loaded_values', {})
+    if instance.image and not instance.thumbnails:
+        thumbnails.schedule(instance.image.name)
+    loaded_values['image'] = instance.image.name
+    old_group_id = loaded_values.get('group_id', instance.group_id)
+    if old_group_id != instance.group_id:
+        if old_group_id:
+            counters.change(counters.GROUP_POSTS, old_group_id, -1)
+        if instance.group_id:
+            counters.change(counters.GROUP_POSTS, instance.group_id, 1)
+        loaded_values['group_id'] = instance.group_id
+    expire_post_pages(instance, {old_group_id, instance.group_id})
+
+
+@receiver(post_delete, sender=Post)
+def count_deleted_post(sender, instance, **kwargs):
+    timeline.reset_counts(instance.author_id)
+    counters.change(counters.POSTS, 0, -1)
+    counters.change(counters.AUTHOR_POSTS, instance.author_id, -1)
+    if instance.group_id:
+        counters.change(counters.GROUP_POSTS, instance.group_id, -1)
+    expire_post_pages(instance, [instance.group_id])
+
+
+@receiver(post_save, sender=Group)
+def expire_group_pages(sender, instance, **kwargs):
+    """Название группы выводится в карточках всех лент."""
+    feed_cache.bump(feed_cache.SITE)
+
+
+@receiver(post_delete, sender=Group)
+def reset_group_counter(sender, instance, **kwargs):
+    counters.reset(counters.GROUP_POSTS, instance.pk)
+    feed_cache.bump(feed_cache.SITE)
+
+
+def _expire_commented_post_pages(post_id):
+    post = Post.objects.select_related('author').filter(pk=post_id).first()
+    if post is not None:
+        expire_post_pages(post, [post.group_id])
+
+
+@receiver(post_save, sender=Comment)
+def count_saved_comment(sender, instance, created, **kwargs):
+    if created and instance.post_id:
+        counters.change_comments(instance.post_id, 1)
+        _expire_commented_post_pages(instance.post_id)
+
+
+@receiver(post_delete, sender=Comment)
+def count_deleted_comment(sender, instance, **kwargs):
+    if instance.post_id:
+        counters.change_comments(instance.post_id, -1)
+        _expire_commented_post_pages(instance.post_id)
+
+
+def _expire_follow_profiles(follow):
+    """Число подписчиков и подписок выводится в профилях обоих,
+    а кнопка подписки — во фрагментах подписчика."""
+    feed_cache.bump(feed_cache.user_scope(follow.user_id), *(
+        feed_cache.profile_scope(username)
+        for username in User.objects.filter(
+            pk__in=[follow.user_id, follow.author_id]
+        ).values_list('username', flat=True)
+    ))
+
+
+@receiver(post_save, sender=Follow)
+def count_saved_follow(sender, instance, created, **kwargs):
+    if created:
+        counters.change(counters.FOLLOWERS, instance.author_id, 1)
+        counters.change(counters.FOLLOWING, instance.user_id, 1)
+        timeline.backfill(instance.user_id, instance.author_id)
+        _expire_follow_profiles(instance)
+
+
+@receiver(post_delete, sender=Follow)
+def count_deleted_follow(sender, instance, **kwargs):
+    counters.change(counters.FOLLOWERS, instance.author_id, -1)
+    counters.change(counters.FOLLOWING, instance.user_id, -1)
+    timeline.remove(instance.user_id, instance.author_id)
+    _expire_follow_profiles(instance)
+
+
+@receiver(post_save, sender=User)
+def expire_user_fragments(sender, instance, created, **kwargs):
+    """Имя пользователя выводится в его навигации."""
+    if not created:
+        feed_cache.bump(feed_cache.user_scope(instance.pk))
+
+
+@receiver(post_delete, sender=User)
+def reset_user_counters(sender, instance, **kwargs):
+    for scope in (counters.AUTHOR_POSTS, counters.FOLLOWERS,
+                  counters.FOLLOWING):
+        counters.reset(scope, instance.pk)
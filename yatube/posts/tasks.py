@@ -0,0 +1,55 @@
+"""Очередь фоновых задач в базе данных.
+
+Задача пишется в ту же транзакцию, что и изменение, которое её
+породило, и выполняется командой run_tasks вне запросов читателей.
+"""
+import json
+import logging
+import traceback
+
+from django.db.models import F
+from django.utils.module_loading import import_string
+
+from .models import Task
+
+logger = logging.getLogger(__name__)
+
+MAX_ATTEMPTS = 5
+
+
+def enqueue(func, *args, key=None):
+    """Поставить func(*args) в очередь.
+
+    Пока задача с тем же key не выполнена, повторная не ставится.
+    Аргументы должны сериализоваться в JSON.
+    """
+    Task.objects.bulk_create([Task(
+        name=f'{func.__module__}.{func.__qualname__}',
+        args=json.dumps(args),
+        key=key,
+    )], ignore_conflicts=True)
+
+
+def run(task):
+    """Выполнить задачу; True — если она выполнена и удалена."""
+    claimed = Task.objects.filter(
+        pk=task.pk, attempts=task.attempts
+    ).update(attempts=F('attempts') + 1)
+    if not claimed:
+        return False
+    try:
+        import_string(task.name)(*json.loads(task.args))
+    except Exception:
+        logger.exception('Фоновая задача %s завершилась ошибкой', task)
+        Task.objects.filter(pk=task.pk).update(
+            last_error=traceback.format_exc()
+        )
+        return False
+    Task.objects.filter(pk=task.pk).delete()
+    return True
+
+
+def run_pending(limit=100, max_attempts=MAX_ATTEMPTS):
+    """Выполнить до limit задач из очереди, вернуть число выполненных."""
+    tasks = Task.objects.filter(attempts__lt=max_attempts)[:limit]
+    return sum(run(task) for task in tasks)
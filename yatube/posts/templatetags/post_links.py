@@ -0,0 +1,11 @@
+from django import template
+
+from posts import links
+
+register = template.Library()
+
+
+@register.filter
+def profile_url(username):
+    """Адрес профиля без reverse() на каждый пост (см. posts.links)."""
+    return links.profile(username)
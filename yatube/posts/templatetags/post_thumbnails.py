@@ -0,0 +1,21 @@
+from django import template
+
+from posts import thumbnails
+
+register = template.Library()
+
+
+@register.inclusion_tag('posts/includes/picture.html')
+def post_picture(post, alias, css_class=''):
+    """<picture> по сохранённому в посте описанию миниатюр.
+
+    Ни картинки, ни хранилище ключей sorl шаблон не трогает: пока
+    фоновая задача не создала миниатюры, показывается оригинал, а
+    пока не обработана новая картинка — прежняя или заглушка.
+    """
+    return {
+        'image': post.image,
+        'processing': post.image_processing,
+        'picture': thumbnails.picture(post, alias),
+        'css_class': css_class,
+    }
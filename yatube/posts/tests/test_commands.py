@@ -0,0 +1,343 @@
+import json
+import os
+import shutil
+import tempfile
+from datetime import datetime
+from io import StringIO
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.db.models import F, Max, Min
+from django.test import (
+    Client, LiveServerTestCase, TestCase, override_settings,
+)
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from PIL import Image
+
+from .. import counters, export, search, thumbnails
+from ..models import (
+    Comment, Follow, Group, Post, Task, TimelineEntry, User
+)
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class SeedDbTests(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def _seed(self, **options):
+        options = {
+            'users': 30, 'groups': 3, 'posts': 200, 'comments': 300,
+            'follows': 60, 'image_ratio': 0.2, 'batch_size': 50, **options,
+        }
+        call_command('seed_db', stdout=StringIO(), **options)
+
+    def test_seed_db_fills_feeds(self):
+        """seed_db создаёт данные вместе со счётчиками, лентами и поиском."""
+        self._seed()
+        self.assertEqual(User.objects.count(), 30)
+        self.assertEqual(Post.objects.count(), 200)
+        self.assertEqual(Comment.objects.count(), 300)
+        self.assertEqual(Follow.objects.count(), 60)
+        self.assertFalse(Follow.objects.filter(user=F('author')))
+        self.assertEqual(counters.get_count(counters.POSTS), 200)
+        post = Post.objects.exclude(image='').first()
+        self.assertIn(thumbnails.FEED, post.get_thumbnails())
+        self.assertEqual(
+            post.comments_count, Comment.objects.filter(post=post).count()
+        )
+        follow = Follow.objects.first()
+        self.assertTrue(TimelineEntry.objects.filter(
+            user=follow.user_id, author=follow.author_id
+        ).exists())
+        word = Post.objects.first().text.split()[0]
+        self.assertTrue(search.search_queryset(word).exists())
+        response = Client().get(reverse('posts:index'))
+        self.assertEqual(len(response.context['page_obj']), 10)
+
+    def test_seed_is_deterministic(self):
+        """Одно и то же --seed даёт одни и те же данные в любой день."""
+        fields = ('text', 'author__username', 'group__slug', 'pub_date')
+        results = []
+        for prefix in ('first', 'second'):
+            self._seed(prefix=prefix, image_ratio=0, follows=0)
+            posts = Post.objects.filter(author__username__startswith=prefix)
+            results.append([
+                (text, username.split('_', 1)[1], slug.split('-', 1)[1],
+                 pub_date)
+                for text, username, slug, pub_date in posts.order_by(
+                    'pub_date', 'id'
+                ).exclude(group=None).values_list(*fields)
+            ])
+        self.assertEqual(results[0], results[1])
+        self.assertLess(
+            results[0][-1][3],
+            timezone.make_aware(datetime(2024, 1, 1)),
+        )
+
+    def test_end_date(self):
+        """--end-date сдвигает посты к другой дате."""
+        call_command(
+            'seed_db', '--end-date=2020-03-01', users=5, groups=1, posts=20,
+            comments=0, follows=0, image_ratio=0, stdout=StringIO(),
+        )
+        dates = Post.objects.aggregate(first=Min('pub_date'),
+                                       last=Max('pub_date'))
+        self.assertGreaterEqual(
+            dates['first'], timezone.make_aware(datetime(2019, 3, 2))
+        )
+        self.assertLess(
+            dates['last'], timezone.make_aware(datetime(2020, 3, 1))
+        )
+
+
+class LoadTestTests(LiveServerTestCase):
+    def setUp(self):
+        cache.clear()
+        call_command(
+            'seed_db', users=20, groups=3, posts=100, comments=50,
+            follows=40, image_ratio=0, stdout=StringIO(),
+        )
+        self.directory = tempfile.mkdtemp()
+        self.report = os.path.join(self.directory, 'report.json')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def _run(self, **options):
+        out = StringIO()
+        call_command(
+            'load_test', url=self.live_server_url, concurrency=2,
+            duration=1, warmup=0, stdout=out, **options,
+        )
+        return out.getvalue()
+
+    def test_report_covers_every_scenario(self):
+        """load_test гоняет все сценарии без ошибок и пишет отчёт."""
+        out = self._run(json=self.report)
+        with open(self.report, encoding='utf-8') as file:
+            report = json.load(file)
+        self.assertEqual(set(report['scenarios']), {
+            'index', 'deep', 'group', 'profile', 'post', 'follow', 'comment',
+        })
+        self.assertEqual(report['total']['errors'], 0)
+        self.assertGreater(report['total']['requests'], 0)
+        self.assertIn('| total |', out)
+
+    def test_baseline_regression_fails(self):
+        """Замер, заметно хуже базового, завершается ошибкой."""
+        self._run(json=self.report, mix='index=1')
+        with open(self.report, encoding='utf-8') as file:
+            report = json.load(file)
+        for stats in (*report['scenarios'].values(), report['total']):
+            stats['p50'] = stats['p99'] = 0.001
+        with open(self.report, 'w', encoding='utf-8') as file:
+            json.dump(report, file)
+        with self.assertRaisesMessage(CommandError, 'index p50'):
+            self._run(baseline=self.report, mix='index=1')
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ImportPostsTests(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.author = User.objects.create_user(username='author')
+        self.reader = User.objects.create_user(username='reader')
+        Follow.objects.create(user=self.reader, author=self.author)
+        self.group = Group.objects.create(
+            title='Группа', slug='group', description='Описание',
+        )
+        self.directory = tempfile.mkdtemp()
+        Image.new('RGB', (2, 2)).save(
+            os.path.join(self.directory, 'photo.gif')
+        )
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def _import(self, name, content, **options):
+        path = os.path.join(self.directory, name)
+        with open(path, 'w', encoding='utf-8', newline='') as file:
+            file.write(content)
+        out, err = StringIO(), StringIO()
+        call_command('import_posts', path, stdout=out, stderr=err, **options)
+        return err.getvalue()
+
+    def test_import_jsonl(self):
+        """Посты из JSONL попадают в счётчики, поиск и ленты."""
+        rows = [
+            {'text': 'Перенесённый пост', 'author': 'author',
+             'group': 'group', 'pub_date': '2015-03-01T10:00:00',
+             'image': 'photo.gif'},
+            {'text': 'Ещё один', 'author': 'author'},
+            {'text': 'Чужой', 'author': 'stranger'},
+            {'text': '', 'author': 'author'},
+        ]
+        err = self._import(
+            'posts.jsonl',
+            '\n'.join(json.dumps(row, ensure_ascii=False) for row in rows)
+            + '\nне json\n',
+            images=self.directory, batch_size=1,
+        )
+        self.assertIn('строка 3: нет пользователя stranger', err)
+        self.assertIn('строка 5: неверный JSON', err)
+        self.assertEqual(Post.objects.count(), 2)
+        post = Post.objects.get(text='Перенесённый пост')
+        self.assertEqual(post.pub_date.year, 2015)
+        self.assertEqual(post.group, self.group)
+        self.assertTrue(post.image.name.startswith('posts/photo.'))
+        self.assertTrue(Task.objects.filter(
+            key=f'thumbnails:{post.image.name}'
+        ).exists())
+        self.assertEqual(counters.get_count(counters.POSTS), 2)
+        self.assertEqual(
+            counters.get_count(counters.GROUP_POSTS, self.group.id), 1
+        )
+        self.assertTrue(search.search_queryset('перенесённый').exists())
+        self.assertEqual(
+            TimelineEntry.objects.filter(user=self.reader).count(), 2
+        )
+        self.assertTrue(
+            Post._meta.get_field('pub_date').auto_now_add
+        )
+
+    @override_settings(TIMELINE_BACKFILL=1)
+    def test_import_keeps_timelines_and_counters(self):
+        """Загрузка дополняет ленты и счётчики, а не строит их заново."""
+        for i in range(3):
+            Post.objects.create(text=f'Пост {i}', author=self.author)
+        self.assertEqual(counters.follow_feed_count(self.reader), 3)
+        self.assertEqual(
+            counters.get_count(counters.AUTHOR_POSTS, self.author.id), 3
+        )
+        rows = [
+            {'text': 'Загруженный', 'author': 'author', 'group': 'group'},
+            {'text': 'Пост читателя', 'author': 'reader'},
+        ]
+        with CaptureQueriesContext(connection) as queries:
+            self._import('posts.jsonl', '\n'.join(
+                json.dumps(row, ensure_ascii=False) for row in rows
+            ))
+        self.assertFalse([
+            query for query in queries
+            if query['sql'].startswith('DELETE FROM "posts_timelineentry"')
+        ])
+        self.assertEqual(
+            TimelineEntry.objects.filter(user=self.reader).count(), 4
+        )
+        self.assertEqual(counters.follow_feed_count(self.reader), 4)
+        self.assertEqual(counters.get_count(counters.POSTS), 5)
+        self.assertEqual(
+            counters.get_count(counters.AUTHOR_POSTS, self.author.id), 4
+        )
+        self.assertEqual(
+            counters.get_count(counters.AUTHOR_POSTS, self.reader.id), 1
+        )
+        self.assertEqual(
+            counters.get_count(counters.GROUP_POSTS, self.group.id), 1
+        )
+
+    @override_settings(TIMELINE_FANOUT_LIMIT=0)
+    def test_import_skips_popular_authors(self):
+        """Посты авторов без раскладки в ленты не раскладываются."""
+        self._import('posts.jsonl', json.dumps({
+            'text': 'Пост звезды', 'author': 'author',
+        }, ensure_ascii=False))
+        self.assertFalse(TimelineEntry.objects.exists())
+
+    def test_import_csv_creates_missing(self):
+        """С --create-missing из CSV заводятся авторы и группы."""
+        self._import(
+            'posts.csv',
+            'text,author,group\r\n'
+            'Пост новичка,newcomer,new-group\r\n'
+            '"Текст, с запятой",author,\r\n',
+            create_missing=True,
+        )
+        post = Post.objects.get(author__username='newcomer')
+        self.assertEqual(post.group.slug, 'new-group')
+        self.assertFalse(post.author.has_usable_password())
+        self.assertTrue(Post.objects.filter(
+            text='Текст, с запятой', group=None
+        ).exists())
+
+
+class ExportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='author')
+        cls.group = Group.objects.create(
+            title='Группа', slug='group', description='Описание',
+        )
+        cls.posts = [
+            Post.objects.create(
+                author=cls.author, text=f'Пост {number}',
+                group=cls.group if number % 2 else None,
+            )
+            for number in range(5)
+        ]
+        cls.staff = User.objects.create_user(username='staff', is_staff=True)
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(self.staff)
+
+    def _export(self, **params):
+        response = self.client.get(reverse('posts:export'), params)
+        self.assertEqual(response.status_code, 200)
+        return b''.join(response.streaming_content).decode()
+
+    def test_rows_are_read_by_keyset_chunks(self):
+        """Пачки идут по ключу ленты без пропусков и повторов."""
+        with CaptureQueriesContext(connection) as queries:
+            chunks = list(export.rows(chunk_size=2))
+        self.assertEqual(len(queries), 2)
+        self.assertNotIn('OFFSET', queries[-1]['sql'])
+        self.assertEqual(
+            [row['id'] for chunk in chunks for row in chunk],
+            [post.id for post in reversed(self.posts)],
+        )
+
+    def test_ndjson_export(self):
+        rows = [
+            json.loads(line)
+            for line in self._export(group='group').splitlines()
+        ]
+        self.assertEqual(
+            [row['text'] for row in rows], ['Пост 3', 'Пост 1']
+        )
+        self.assertEqual(rows[0]['author'], 'author')
+        self.assertEqual(rows[0]['group'], 'group')
+        self.assertEqual(rows[0]['comments_count'], 0)
+
+    def test_csv_export_and_command(self):
+        content = self._export(format='csv', author='author')
+        self.assertEqual(content.splitlines()[0], ','.join(export.COLUMNS))
+        self.assertEqual(len(content.splitlines()), 6)
+        out = StringIO()
+        call_command(
+            'export_posts', format='csv', author='author', chunk_size=2,
+            stdout=out,
+        )
+        self.assertEqual(out.getvalue(), content)
+
+    def test_export_is_for_staff(self):
+        self.client.force_login(self.author)
+        response = self.client.get(reverse('posts:export'))
+        self.assertEqual(response.status_code, 302)
+        self.client.force_login(self.staff)
+        response = self.client.get(reverse('posts:export'), {'group': 'no'})
+        self.assertEqual(response.status_code, 404)
@@ -0,0 +1,122 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from .. import counters
+from ..models import Comment, Follow, Group, Post, User
+
+
+class CounterTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='counter_author')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test_slug',
+            description='Тестовое описание',
+        )
+        cls.group_2 = Group.objects.create(
+            title='Тестовая группа 2',
+            slug='test_slug_2',
+            description='Тестовое описание 2',
+        )
+        cls.post = Post.objects.create(
+            text='Тестовый текст',
+            author=cls.user,
+            group=cls.group,
+        )
+
+    def setUp(self):
+        self.guest_client = Client()
+
+    def _counts(self):
+        return (
+            counters.get_count(counters.POSTS),
+            counters.get_count(counters.AUTHOR_POSTS, self.user.pk),
+            counters.get_count(counters.GROUP_POSTS, self.group.pk),
+            counters.get_count(counters.GROUP_POSTS, self.group_2.pk),
+        )
+
+    def test_counters_follow_post_writes(self):
+        """Счётчики меняются при создании, переносе и удалении поста."""
+        self.assertEqual(self._counts(), (1, 1, 1, 0))
+        post = Post.objects.create(
+            text='Ещё пост', author=self.user, group=self.group
+        )
+        self.assertEqual(self._counts(), (2, 2, 2, 0))
+        post = Post.objects.get(pk=post.pk)
+        post.group = self.group_2
+        post.save()
+        self.assertEqual(self._counts(), (2, 2, 1, 1))
+        post.delete()
+        self.assertEqual(self._counts(), (1, 1, 1, 0))
+
+    def test_group_counter_is_reset_on_group_delete(self):
+        """Удаление группы сбрасывает её счётчик."""
+        counters.get_count(counters.GROUP_POSTS, self.group_2.pk)
+        self.group_2.delete()
+        self.assertFalse(
+            counters.Counter.objects.filter(
+                scope=counters.GROUP_POSTS, key=self.group_2.pk
+            ).exists()
+        )
+
+    def test_page_links_use_stored_count(self):
+        """Номера страниц рисуются без COUNT(*) по таблице постов."""
+        counters.get_count(counters.POSTS)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.guest_client.get(
+                reverse('posts:index'), {'page': 1}
+            )
+        self.assertEqual(response.context['page_obj'].paginator.count, 1)
+        self.assertFalse(
+            [query for query in queries if 'COUNT(' in query['sql']]
+        )
+
+    def test_comment_and_follow_counters(self):
+        """Комментарии и подписки меняют хранимые счётчики."""
+        reader = User.objects.create_user(username='reader')
+        comment = Comment.objects.create(
+            post=self.post, author=reader, text='Комментарий'
+        )
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comments_count, 1)
+        comment.delete()
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comments_count, 0)
+        counters.get_count(counters.FOLLOWERS, self.user.pk)
+        follow = Follow.objects.create(user=reader, author=self.user)
+        self.assertEqual(
+            counters.get_count(counters.FOLLOWERS, self.user.pk), 1
+        )
+        self.assertEqual(
+            counters.get_count(counters.FOLLOWING, reader.pk), 1
+        )
+        follow.delete()
+        self.assertEqual(
+            counters.get_count(counters.FOLLOWERS, self.user.pk), 0
+        )
+
+    def test_rebuild_counters_command(self):
+        """Команда rebuild_counters исправляет разошедшиеся счётчики."""
+        counters.get_count(counters.AUTHOR_POSTS, self.user.pk)
+        Post.objects.bulk_create(
+            [Post(text=f'Пост {i}', author=self.user) for i in range(3)]
+        )
+        Comment.objects.bulk_create(
+            [Comment(post=self.post, author=self.user, text='Комментарий')]
+        )
+        call_command(
+            'rebuild_counters', '--batch-size', '2', stdout=StringIO()
+        )
+        self.assertEqual(
+            counters.get_count(counters.AUTHOR_POSTS, self.user.pk), 4
+        )
+        self.assertEqual(counters.get_count(counters.POSTS), 4)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comments_count, 1)
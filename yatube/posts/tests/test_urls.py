@@ -1,4 +1,6 @@
-from django.test import Client, TestCase
+from django.test import Client, SimpleTestCase, TestCase
+from django.urls import reverse
+from posts import links
 from posts.models import Group, Post, User
 
 
@@ -89,3 +91,19 @@ class PostURLTests(TestCase):
         response = self.guest_client.get('/unexisting_page/')
         self.assertEqual(response.status_code, 404)
         self.assertTemplateUsed(response, 'core/404.html')
+
+
+class LinksTests(SimpleTestCase):
+    def test_links_match_reverse(self):
+        """Собранные по заглушке адреса совпадают с reverse()."""
+        for name, kwarg, build, values in (
+            ('posts:post_detail', 'post_id', links.post_detail, (1, 4096)),
+            ('posts:profile', 'username', links.profile,
+             ('user', 'a.b+c@d', 'пользователь', 'x987654321x')),
+            ('posts:group_list', 'slug', links.group_list, ('slug-1',)),
+        ):
+            for value in values:
+                with self.subTest(name=name, value=value):
+                    self.assertEqual(
+                        build(value), reverse(name, kwargs={kwarg: value})
+                    )
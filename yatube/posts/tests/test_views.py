@@ -1,14 +1,32 @@
+import os
 import shutil
 import tempfile
+import time
+from importlib import import_module
+from io import BytesIO, StringIO
 
 from django import forms
+from django.apps import apps
 from django.conf import settings
 from django.core.cache import cache
 from django.core.files.uploadedfile import SimpleUploadedFile
-from django.test import Client, TestCase, override_settings
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.template import engines
+from django.template.loaders import cached
+from unittest import mock, skipUnless
+from django.test import (
+    Client, TestCase, TransactionTestCase, override_settings,
+)
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from PIL import Image
+from sorl.thumbnail.models import KVStore
 
-from ..models import Follow, Group, Post, User
+from .. import counters, images, tasks, thumbnails, timeline
+from ..models import (
+    Comment, Follow, Group, Post, Task, TimelineEntry, User
+)
 
 
 class PostViewsTests(TestCase):
@@ -57,6 +75,22 @@ class PostViewsTests(TestCase):
                 response = self.authorized_client.get(reverse_name)
                 self.assertTemplateUsed(response, template)
 
+    def test_feed_renders_post_links(self):
+        """Карточка в ленте ссылается на пост, автора и группу."""
+        response = self.guest_client.get(reverse('posts:index'))
+        for url in (
+            reverse('posts:post_detail', args=[self.post.id]),
+            reverse('posts:profile', args=[self.post_author.username]),
+            reverse('posts:group_list', args=[self.group.slug]),
+        ):
+            with self.subTest(url=url):
+                self.assertContains(response, f'href="{url}"')
+
+    def test_templates_are_cached(self):
+        """Вне DEBUG шаблоны читаются и разбираются один раз."""
+        loader = engines['django'].engine.template_loaders[0]
+        self.assertIsInstance(loader, cached.Loader)
+
     def _assert_post_has_equal_context(self, post):
         self.assertEqual(post.text, self.post.text)
         self.assertEqual(post.group, self.post.group)
@@ -173,11 +207,47 @@ class PostViewsTests(TestCase):
         """Проверка кеша."""
         response = self.guest_client.get(reverse('posts:index'))
         old_response = response.content
-        Post.objects.get(id=1).delete()
+        Post.objects.filter(id=self.post.id).update(text='Без сигналов')
         response_new = self.guest_client.get(reverse('posts:index'))
         new_response = response_new.content
         self.assertEqual(old_response, new_response)
 
+    def test_cache_expires_on_post_writes(self):
+        """Кеш лент сбрасывается при создании, правке и удалении поста."""
+        urls = (
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': self.group.slug}),
+            reverse('posts:profile', kwargs={'username': self.post_author}),
+        )
+        for url in urls:
+            self.guest_client.get(url)
+        post = Post.objects.get(id=self.post.id)
+        post.text = 'Отредактированный текст'
+        post.save()
+        for url in urls:
+            with self.subTest(url=url):
+                response = self.guest_client.get(url)
+                self.assertContains(response, 'Отредактированный текст')
+        post.delete()
+        for url in urls:
+            with self.subTest(url=url):
+                response = self.guest_client.get(url)
+                self.assertNotContains(response, 'Отредактированный текст')
+
+    def test_cache_is_page_aware(self):
+        """Вторая страница ленты не берётся из кеша первой."""
+        Post.objects.bulk_create(
+            Post(text=f'Пост {i}', author=self.post_author)
+            for i in range(settings.NUM_POSTS_ON_PAGE)
+        )
+        first_page = self.guest_client.get(reverse('posts:index'))
+        second_page = self.guest_client.get(
+            reverse('posts:index'),
+            {'after': first_page.context['page_obj'].paginator.next_cursor},
+        )
+        self.assertContains(second_page, self.post.text)
+        self.assertNotContains(first_page, self.post.text)
+
     def test_follow_page(self):
         """Тест авторизованный пользователь может подписываться на других
         пользователей."""
@@ -258,6 +328,489 @@ class PaginatorViewsTest(TestCase):
                          - settings.NUM_POSTS_ON_PAGE)
                          )
 
+    def test_cursor_pages_follow_each_other(self):
+        """Курсоры ?after= и ?before= листают ленту без пропусков."""
+        url = reverse('posts:index')
+        first_page = self.client.get(url).context['page_obj']
+        self.assertEqual(len(first_page), settings.NUM_POSTS_ON_PAGE)
+        self.assertFalse(first_page.has_previous())
+        self.assertTrue(first_page.has_next())
+        second_page = self.client.get(
+            url, {'after': first_page.paginator.next_cursor}
+        ).context['page_obj']
+        self.assertEqual(
+            len(second_page),
+            self.NUMBER_POSTS_FOR_PAGINATOR_TEST - settings.NUM_POSTS_ON_PAGE
+        )
+        self.assertFalse(second_page.has_next())
+        self.assertFalse(set(first_page) & set(second_page))
+        back_page = self.client.get(
+            url, {'before': second_page.paginator.previous_cursor}
+        ).context['page_obj']
+        self.assertEqual(list(back_page), list(first_page))
+        self.assertFalse(back_page.has_previous())
+        last_page = self.client.get(
+            url, {'before': 'last'}
+        ).context['page_obj']
+        self.assertEqual(last_page[-1], second_page[-1])
+        self.assertFalse(last_page.has_next())
+
+    def test_numbered_links_keep_search_query(self):
+        """Все ссылки страниц поиска без FTS5 сохраняют запрос."""
+        with mock.patch('posts.search.is_available', return_value=False):
+            response = self.client.get(
+                reverse('posts:search'), {'q': 'Тестовый', 'page': 1}
+            )
+        self.assertContains(response, 'page=2')
+        self.assertNotContains(response, 'href="?page=')
+
+    def test_cursor_page_does_not_count_rows(self):
+        """Страница по курсору не выполняет COUNT(*)."""
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(reverse('posts:index'), {'after': 'broken'})
+        self.assertFalse(
+            [query for query in queries if 'COUNT(' in query['sql']]
+        )
+
+
+class TimelineTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create(username='timeline_author')
+        cls.reader = User.objects.create(username='timeline_reader')
+
+    def setUp(self):
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.reader)
+
+    def _feed(self):
+        response = self.authorized_client.get(reverse('posts:follow_index'))
+        return list(response.context['page_obj'])
+
+    def test_post_is_fanned_out_to_followers(self):
+        """Новый пост попадает в ленты подписчиков при публикации."""
+        Follow.objects.create(user=self.reader, author=self.author)
+        post = Post.objects.create(text='Новый пост', author=self.author)
+        self.assertTrue(
+            TimelineEntry.objects.filter(user=self.reader, post=post).exists()
+        )
+        self.assertEqual(self._feed(), [post])
+
+    def test_follow_backfills_and_unfollow_trims_timeline(self):
+        """Подписка добавляет старые посты, отписка их убирает."""
+        post = Post.objects.create(text='Старый пост', author=self.author)
+        follow = Follow.objects.create(user=self.reader, author=self.author)
+        self.assertEqual(self._feed(), [post])
+        follow.delete()
+        self.assertEqual(self._feed(), [])
+        self.assertFalse(TimelineEntry.objects.filter(user=self.reader))
+
+    @override_settings(TIMELINE_FANOUT_LIMIT=0)
+    def test_popular_author_posts_are_pulled_on_read(self):
+        """Посты популярного автора подтягиваются при чтении ленты."""
+        Follow.objects.create(user=self.reader, author=self.author)
+        post = Post.objects.create(text='Пост звезды', author=self.author)
+        self.assertFalse(TimelineEntry.objects.filter(post=post))
+        self.assertEqual(self._feed(), [post])
+
+    @override_settings(TIMELINE_BACKFILL=5)
+    def test_page_count_follows_timeline(self):
+        """Номера страниц ленты считаются по её записям, а не по всем
+        постам авторов."""
+        for i in range(30):
+            Post.objects.create(text=f'Пост {i}', author=self.author)
+        Follow.objects.create(user=self.reader, author=self.author)
+        url = reverse('posts:follow_index')
+
+        def count():
+            response = self.authorized_client.get(url, {'page': 1})
+            return response.context['page_obj'].paginator.count
+
+        self.assertEqual(count(), 5)
+        post = Post.objects.create(text='Новый пост', author=self.author)
+        self.assertEqual(count(), 6)
+        post.delete()
+        self.assertEqual(count(), 5)
+
+    @override_settings(TIMELINE_BACKFILL=2)
+    def test_rebuild_matches_backfill(self):
+        """Перестройка лент даёт то же, что подписка на автора."""
+        for i in range(3):
+            Post.objects.create(text=f'Пост {i}', author=self.author)
+        Follow.objects.create(user=self.reader, author=self.author)
+        Follow.objects.create(user=self.author, author=self.reader)
+        entries = set(TimelineEntry.objects.values_list(
+            'user', 'post', 'author', 'pub_date'
+        ))
+        self.assertEqual(timeline.rebuild(batch_size=1), 2)
+        self.assertEqual(set(TimelineEntry.objects.values_list(
+            'user', 'post', 'author', 'pub_date'
+        )), entries)
+
+    def test_migration_backfill(self):
+        """Миграция раскладывает ленты одним запросом по своим константам."""
+        migration = import_module('posts.migrations.0017_timelineentry')
+        fan = User.objects.create(username='timeline_fan')
+        for i in range(3):
+            Post.objects.create(text=f'Пост {i}', author=self.author)
+        reader_posts = [
+            Post.objects.create(text=f'Пост читателя {i}', author=self.reader)
+            for i in range(3)
+        ]
+        Follow.objects.create(user=self.reader, author=self.author)
+        Follow.objects.create(user=fan, author=self.author)
+        Follow.objects.create(user=self.author, author=self.reader)
+        TimelineEntry.objects.all().delete()
+        with mock.patch.multiple(
+            migration, TIMELINE_BACKFILL=2, TIMELINE_FANOUT_LIMIT=1,
+        ), self.assertNumQueries(1):
+            migration.backfill_timelines(apps, connection.schema_editor())
+        self.assertEqual(list(TimelineEntry.objects.values_list(
+            'user', 'post', 'author', 'pub_date'
+        )), [
+            (self.author.id, post.id, self.reader.id, post.pub_date)
+            for post in reversed(reader_posts[1:])
+        ])
+
+
+@skipUnless(connection.vendor == 'sqlite', 'Поиск FTS5 есть только у SQLite')
+class SearchTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create(username='search_author')
+        cls.admin = User.objects.create_superuser(
+            username='search_admin', email='admin@example.com',
+            password='password',
+        )
+
+    def setUp(self):
+        self.guest_client = Client()
+
+    def _search(self, query, **params):
+        response = self.guest_client.get(
+            reverse('posts:search'), {'q': query, **params}
+        )
+        return response.context['page_obj']
+
+    def test_search_follows_post_writes(self):
+        """Индекс обновляется при создании, правке и удалении поста."""
+        post = Post.objects.create(text='Лесные ягоды', author=self.user)
+        Post.objects.create(text='Морская рыба', author=self.user)
+        self.assertEqual(list(self._search('ягод')), [post])
+        Post.objects.filter(pk=post.pk).update(text='Лесные грибы')
+        self.assertEqual(list(self._search('ягод')), [])
+        self.assertEqual(list(self._search('ЛЕСНЫЕ гриб')), [post])
+        post.delete()
+        self.assertEqual(list(self._search('гриб')), [])
+
+    def test_search_pages_keep_query(self):
+        """Результаты листаются курсором, не теряя запрос."""
+        Post.objects.bulk_create(
+            Post(text=f'Поиск номер {i}', author=self.user)
+            for i in range(settings.NUM_POSTS_ON_PAGE + 3)
+        )
+        Post.objects.create(text='Другое', author=self.user)
+        first = self._search('поиск')
+        self.assertEqual(len(first), settings.NUM_POSTS_ON_PAGE)
+        self.assertTrue(first.has_next())
+        second = self._search(
+            'поиск', after=first.paginator.next_cursor
+        )
+        self.assertEqual(len(second), 3)
+        self.assertFalse(set(first) & set(second))
+        response = self.guest_client.get(
+            reverse('posts:search'), {'q': 'поиск'}
+        )
+        self.assertContains(response, '?q=%D0%BF%D0%BE%D0%B8%D1%81%D0%BA&amp;')
+
+    def test_search_ignores_fts_syntax(self):
+        """Операторы FTS5 в запросе не ломают поиск."""
+        post = Post.objects.create(text='Текст NEAR OR', author=self.user)
+        self.assertEqual(list(self._search('"near" OR текст:*')), [post])
+        self.assertIsNone(
+            self.guest_client.get(reverse('posts:search')).context['page_obj']
+        )
+
+    def test_admin_search_uses_index(self):
+        """Поиск в админке идёт по индексу, а не по LIKE."""
+        post = Post.objects.create(text='Админский пост', author=self.user)
+        self.guest_client.force_login(self.admin)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.guest_client.get(
+                reverse('admin:posts_post_changelist'), {'q': 'админск'}
+            )
+        self.assertEqual(
+            list(response.context['cl'].result_list), [post]
+        )
+        self.assertFalse(
+            [query for query in queries if 'LIKE' in query['sql']]
+        )
+
+    def test_reindex_command(self):
+        """Команда reindex_posts восстанавливает индекс."""
+        post = Post.objects.create(text='Потерянный пост', author=self.user)
+        with connection.cursor() as cursor:
+            cursor.execute('DELETE FROM posts_post_fts')
+        self.assertEqual(list(self._search('потерян')), [])
+        call_command('reindex_posts', '--optimize', stdout=StringIO())
+        self.assertEqual(list(self._search('потерян')), [post])
+
+
+class PageCacheTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create(username='page_cache_author')
+        cls.post = Post.objects.create(text='Закешированный', author=cls.user)
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+        self.detail_url = reverse(
+            'posts:post_detail', kwargs={'post_id': self.post.id}
+        )
+
+    def test_anonymous_page_is_served_from_cache(self):
+        """Повторный анонимный запрос не вызывает представление."""
+        first = self.guest_client.get(reverse('posts:index'))
+        self.assertIsNotNone(first.context)
+        with self.assertNumQueries(0):
+            second = self.guest_client.get(reverse('posts:index'))
+        self.assertIsNone(second.context)
+        self.assertEqual(second.content, first.content)
+        self.assertEqual(second['ETag'], first['ETag'])
+
+    def test_conditional_get_returns_304(self):
+        """If-None-Match и If-Modified-Since дают 304 без рендеринга."""
+        self.guest_client.get(self.detail_url)
+        # Last-Modified отдаётся, когда секунда изменения уже прошла.
+        with mock.patch('posts.feed_cache.time') as clock:
+            clock.time.return_value = time.time() + 1
+            response = self.guest_client.get(self.detail_url)
+            for header, value in (
+                ('HTTP_IF_NONE_MATCH', response['ETag']),
+                ('HTTP_IF_MODIFIED_SINCE', response['Last-Modified']),
+            ):
+                with self.subTest(header=header):
+                    with self.assertNumQueries(0):
+                        conditional = self.guest_client.get(
+                            self.detail_url, **{header: value}
+                        )
+                    self.assertEqual(conditional.status_code, 304)
+
+    def test_no_last_modified_in_the_second_of_a_write(self):
+        """Запись в ту же секунду не оставляет прежний Last-Modified."""
+        self.guest_client.get(reverse('posts:index'))
+        Post.objects.create(text='Свежий пост', author=self.user)
+        response = self.guest_client.get(reverse('posts:index'))
+        self.assertFalse(response.has_header('Last-Modified'))
+        self.assertTrue(response.has_header('ETag'))
+
+    def test_writes_change_validators(self):
+        """Новый пост и комментарий меняют ETag и содержимое страниц."""
+        index = self.guest_client.get(reverse('posts:index'))
+        detail = self.guest_client.get(self.detail_url)
+        Post.objects.create(text='Свежий пост', author=self.user)
+        Comment.objects.create(
+            post=self.post, author=self.user, text='Свежий комментарий'
+        )
+        for url, old, text in (
+            (reverse('posts:index'), index, 'Свежий пост'),
+            (self.detail_url, detail, 'Свежий комментарий'),
+        ):
+            with self.subTest(url=url):
+                response = self.guest_client.get(
+                    url, HTTP_IF_NONE_MATCH=old['ETag']
+                )
+                self.assertEqual(response.status_code, 200)
+                self.assertNotEqual(response['ETag'], old['ETag'])
+                self.assertContains(response, text)
+
+    def test_new_post_updates_author_count_on_post_page(self):
+        """Новый пост автора меняет ETag страниц его старых постов."""
+        detail = self.guest_client.get(self.detail_url)
+        count = counters.get_count(counters.AUTHOR_POSTS, self.user.pk)
+        Post.objects.create(text='Ещё пост', author=self.user)
+        response = self.guest_client.get(
+            self.detail_url, HTTP_IF_NONE_MATCH=detail['ETag']
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(
+            response, f'Всего постов автора:  <span>{count + 1}</span>'
+        )
+
+    def test_logged_in_pages_reuse_cached_body(self):
+        """Пользователь с сессией получает общее тело страницы со своими
+        фрагментами, но без валидаторов."""
+        self.guest_client.get(self.detail_url)
+        client = Client()
+        client.force_login(self.user)
+        response = client.get(self.detail_url)
+        self.assertTemplateNotUsed(response, 'posts/post_detail.html')
+        self.assertFalse(response.has_header('ETag'))
+        self.assertNotContains(response, '<!--hole:')
+        self.assertContains(response, 'Пользователь:')
+        self.assertContains(response, 'Редактировать')
+        self.assertContains(response, 'csrfmiddlewaretoken')
+        guest = self.guest_client.get(self.detail_url)
+        self.assertContains(guest, 'Войти')
+        self.assertNotContains(guest, 'Редактировать')
+        self.assertNotContains(guest, 'csrfmiddlewaretoken')
+
+    def test_follow_button_depends_on_reader(self):
+        """Кнопка подписки показывает подписку именно читателя."""
+        follower = User.objects.create(username='page_cache_follower')
+        reader = User.objects.create(username='page_cache_reader')
+        Follow.objects.create(user=follower, author=self.user)
+        url = reverse(
+            'posts:profile', kwargs={'username': self.user.username}
+        )
+        for user, button in (
+            (follower, 'Отписаться'),
+            (reader, 'Подписаться'),
+            (self.user, None),
+        ):
+            with self.subTest(user=user.username):
+                client = Client()
+                client.force_login(user)
+                response = client.get(url)
+                for text in ('Отписаться', 'Подписаться'):
+                    if text == button:
+                        self.assertContains(response, text)
+                    else:
+                        self.assertNotContains(response, text)
+
+    def test_follow_changes_reader_fragment(self):
+        """Подписка сбрасывает закешированную кнопку подписчика."""
+        reader = User.objects.create(username='page_cache_subscriber')
+        client = Client()
+        client.force_login(reader)
+        url = reverse(
+            'posts:profile', kwargs={'username': self.user.username}
+        )
+        self.assertContains(client.get(url), 'Подписаться')
+        client.get(reverse(
+            'posts:profile_follow', kwargs={'username': self.user.username}
+        ))
+        self.assertContains(client.get(url), 'Отписаться')
+
+
+class PageCacheCommitTests(TransactionTestCase):
+    """Страница, закешированная до коммита записи, после него устаревает.
+
+    Читатель из другого соединения до коммита видит прежние строки, но
+    берёт уже сдвинутые поколения; здесь его заменяет запрос внутри
+    той же транзакции.
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create(username='commit_author')
+        self.post = Post.objects.create(
+            text='Пост до коммита', author=self.user
+        )
+        self.guest_client = Client()
+
+    def _assert_expires_on_commit(self, url, write):
+        with transaction.atomic():
+            write()
+            during = self.guest_client.get(url)
+        response = self.guest_client.get(
+            url, HTTP_IF_NONE_MATCH=during['ETag']
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], during['ETag'])
+        return response
+
+    def test_delete(self):
+        self.guest_client.get(reverse('posts:index'))
+        response = self._assert_expires_on_commit(
+            reverse('posts:index'), self.post.delete
+        )
+        self.assertNotContains(response, 'Пост до коммита')
+
+    def test_edit(self):
+        url = reverse('posts:post_detail', kwargs={'post_id': self.post.id})
+        self.guest_client.get(url)
+
+        def edit():
+            self.post.text = 'Пост после коммита'
+            self.post.save()
+
+        response = self._assert_expires_on_commit(url, edit)
+        self.assertContains(response, 'Пост после коммита')
+
+
+class QueryCountTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create(username='query_author')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test_slug',
+            description='Тестовое описание',
+        )
+        Follow.objects.create(user=cls.user, author=cls.user)
+
+    def setUp(self):
+        self.guest_client = Client()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    def _add_posts(self, number):
+        for i in range(number):
+            post = Post.objects.create(
+                text=f'Пост {i}', author=self.user, group=self.group
+            )
+            Comment.objects.create(
+                post=post, author=self.user, text='Комментарий'
+            )
+        return post
+
+    def _assert_queries(self, client, url, number):
+        client.get(url)
+        cache.clear()
+        with self.assertNumQueries(number):
+            client.get(url)
+
+    def test_query_count_does_not_depend_on_page_size(self):
+        """Число запросов к ленте не зависит от числа постов и
+        комментариев на странице."""
+        for posts_number in (1, settings.NUM_POSTS_ON_PAGE):
+            post = self._add_posts(posts_number)
+            pages = (
+                (self.guest_client, reverse('posts:index'), 1),
+                (self.guest_client, reverse(
+                    'posts:group_list', kwargs={'slug': self.group.slug}
+                ), 2),
+                (self.guest_client, reverse(
+                    'posts:profile', kwargs={'username': self.user}
+                ), 3),
+                # С пустым кешем middleware ищет ещё и автора поста.
+                (self.guest_client, reverse(
+                    'posts:post_detail', kwargs={'post_id': post.id}
+                ), 4),
+                (self.authorized_client, reverse('posts:follow_index'), 4),
+            )
+            for client, url, number in pages:
+                with self.subTest(url=url, posts_number=posts_number):
+                    self._assert_queries(client, url, number)
+
+    def test_feed_queries_use_indexes(self):
+        """Ленты и комментарии читаются по индексам без сортировки."""
+        out = StringIO()
+        call_command(
+            'explain_feeds', '--posts', '500', '--users', '20',
+            '--groups', '3', stdout=out,
+        )
+        self.assertNotIn('FAIL', out.getvalue())
+        self.assertFalse(Post.objects.filter(
+            author__username__startswith='explain_'
+        ).exists())
+
 
 TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
 
@@ -340,6 +893,225 @@ class ImageTests(TestCase):
     def test_image_in_db(self):
         """Проверяем что пост с картинкой создается в БД."""
         self.assertTrue(
-            Post.objects.filter(text='Тестовый текст',
-                                image='posts/small.gif').exists(),
+            Post.objects.filter(
+                text='Тестовый текст',
+                image__regex=r'^posts/small\.[0-9a-f]{12}\.gif$',
+            ).exists(),
+        )
+
+    def test_page_render_does_not_make_thumbnails(self):
+        """Пока миниатюры нет, страница показывает оригинал картинки."""
+        response = self.guest_client.get(
+            reverse('posts:post_detail', kwargs={'post_id': self.post.id})
+        )
+        self.assertContains(response, self.post.image.url)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.thumbnails, '')
+
+
+@override_settings(
+    MEDIA_ROOT=TEMP_MEDIA_ROOT,
+    IMAGE_STAGING_ROOT=os.path.join(TEMP_MEDIA_ROOT, 'staging'),
+)
+class ThumbnailTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='thumbnail_author')
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def _upload(self, name='thumb.gif'):
+        self.authorized_client.post(reverse('posts:post_create'), {
+            'text': 'Пост с картинкой',
+            'image': SimpleUploadedFile(
+                name, ImageTests.small_gif, content_type='image/gif'
+            ),
+        })
+        return Post.objects.latest('id')
+
+    def test_thumbnails_are_made_on_upload(self):
+        """Все миниатюры из реестра создаются при загрузке картинки."""
+        post = self._upload()
+        self.assertEqual(post.thumbnails, '')
+        self.assertTrue(post.image_processing)
+        self.assertEqual(tasks.run_pending(), 1)
+        post.refresh_from_db()
+        for alias in thumbnails.ALIASES:
+            made = post.get_thumbnails()[alias]['variants']
+            self.assertEqual(len(made), len(thumbnails.variants(alias)))
+            for format_, width, name in made:
+                with self.subTest(alias=alias, name=name):
+                    self.assertTrue(post.image.storage.exists(name))
+        response = self.authorized_client.get(
+            reverse('posts:post_detail', kwargs={'post_id': post.id})
+        )
+        picture = thumbnails.picture(post, thumbnails.DETAIL)
+        self.assertContains(response, f'src="{picture["src"]}"')
+        self.assertContains(response, 'loading="lazy"')
+        for width in thumbnails.ALIASES[thumbnails.DETAIL].widths:
+            with self.subTest(width=width):
+                self.assertContains(response, f' {width}w')
+
+    def test_feed_renders_thumbnails_without_lookups(self):
+        """Лента строит <picture> по данным поста, без хранилища sorl."""
+        post = self._upload()
+        tasks.run_pending()
+        post.refresh_from_db()
+        KVStore.objects.all().delete()
+        cache.clear()
+        response = self.authorized_client.get(reverse('posts:index'))
+        self.assertContains(
+            response, thumbnails.picture(post, thumbnails.FEED)['srcset']
+        )
+        self.assertFalse(KVStore.objects.exists())
+
+    def test_new_image_resets_thumbnails(self):
+        """Смена картинки сбрасывает миниатюры и ставит новые в очередь."""
+        post = self._upload()
+        tasks.run_pending()
+        post = Post.objects.get(pk=post.pk)
+        post.image = SimpleUploadedFile(
+            'new.gif', ImageTests.small_gif, content_type='image/gif'
+        )
+        post.save()
+        self.assertEqual(post.thumbnails, '')
+        self.assertEqual(tasks.run_pending(), 1)
+        post.refresh_from_db()
+        self.assertIn(thumbnails.FEED, post.get_thumbnails())
+
+    def test_make_thumbnails_command(self):
+        """Команда make_thumbnails создаёт миниатюры старых постов."""
+        post = Post.objects.create(
+            text='Старый пост', author=self.user, image=SimpleUploadedFile(
+                'old.gif', ImageTests.small_gif, content_type='image/gif'
+            ),
+        )
+        Post.objects.create(
+            text='Та же картинка', author=self.user, image=post.image.name,
+        )
+        Task.objects.all().delete()
+        out = StringIO()
+        call_command('make_thumbnails', '--now', stdout=out)
+        self.assertEqual(out.getvalue(), 'Картинок: 1\n')
+        post.refresh_from_db()
+        self.assertIn(thumbnails.FEED, post.get_thumbnails())
+
+
+@override_settings(
+    MEDIA_ROOT=TEMP_MEDIA_ROOT,
+    IMAGE_STAGING_ROOT=os.path.join(TEMP_MEDIA_ROOT, 'staging'),
+    IMAGE_MAX_SIZE=300,
+)
+class ImageProcessingTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='photographer')
+        self.client = Client()
+        self.client.force_login(self.user)
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def _photo(self, name='IMG_0001.jpg', image_format='JPEG'):
+        """Снимок 600×200 с EXIF: повернуть на 90° и данные камеры."""
+        image = Image.new('RGB', (600, 200), 'red')
+        exif = image.getexif()
+        exif[0x0112] = 6
+        exif[0x010F] = 'Camera'
+        data = BytesIO()
+        image.save(data, image_format, exif=exif)
+        return SimpleUploadedFile(
+            name, data.getvalue(), f'image/{image_format.lower()}'
+        )
+
+    def test_upload_is_processed_in_background(self):
+        """Загрузка ждёт очереди, а задача чистит, поворачивает и жмёт."""
+        self.client.post(reverse('posts:post_create'), {
+            'text': 'Фото', 'image': self._photo(),
+        })
+        post = Post.objects.get(text='Фото')
+        self.assertEqual(post.image.name, '')
+        self.assertTrue(post.image_processing)
+        response = self.client.get(
+            reverse('posts:profile', args=(self.user.username,))
+        )
+        self.assertContains(response, 'Картинка обрабатывается')
+        self.assertEqual(tasks.run_pending(), 1)
+        post.refresh_from_db()
+        self.assertFalse(post.image_processing)
+        self.assertRegex(post.image.name, r'^posts/IMG_0001\.\w{12}\.jpg$')
+        self.assertIn(thumbnails.FEED, post.get_thumbnails())
+        with Image.open(post.image.path) as image:
+            self.assertEqual(image.size, (100, 300))
+            self.assertFalse(image.getexif())
+        self.assertEqual(
+            os.listdir(os.path.join(TEMP_MEDIA_ROOT, 'staging')), []
+        )
+        response = self.client.get(
+            reverse('posts:profile', args=(self.user.username,))
+        )
+        self.assertNotContains(response, 'Картинка обрабатывается')
+
+    def test_png_loses_exif(self):
+        """EXIF убирается и из картинок не в JPEG."""
+        self.client.post(reverse('posts:post_create'), {
+            'text': 'PNG', 'image': self._photo('scan.png', 'PNG'),
+        })
+        tasks.run_pending()
+        post = Post.objects.get(text='PNG')
+        self.assertRegex(post.image.name, r'\.png$')
+        with Image.open(post.image.path) as image:
+            self.assertEqual(image.size, (100, 300))
+            self.assertFalse(image.getexif())
+            self.assertNotIn('exif', image.info)
+
+    def test_text_edit_keeps_processed_image(self):
+        """Правка текста не затирает картинку, обработанную во время неё."""
+        self.client.post(reverse('posts:post_create'), {
+            'text': 'Фото', 'image': self._photo(),
+        })
+        post = Post.objects.get(text='Фото')
+        defer = images.defer
+
+        def process_then_defer(post):
+            # Задача заканчивается, когда пост уже прочитан для правки.
+            tasks.run_pending()
+            return defer(post)
+
+        with mock.patch('posts.images.defer', process_then_defer):
+            self.client.post(reverse('posts:post_edit', args=(post.id,)), {
+                'text': 'Новый текст',
+            })
+        post.refresh_from_db()
+        self.assertEqual(post.text, 'Новый текст')
+        self.assertFalse(post.image_processing)
+        self.assertRegex(post.image.name, r'^posts/IMG_0001\.\w{12}\.jpg$')
+        self.assertIn(thumbnails.FEED, post.get_thumbnails())
+
+    def test_edit_keeps_old_image_until_processed(self):
+        """Пока новая картинка в обработке, видна прежняя."""
+        post = Post.objects.create(
+            author=self.user, text='Пост', image=self._photo('old.jpg'),
         )
+        old_name = post.image.name
+        self.client.post(reverse('posts:post_edit', args=(post.id,)), {
+            'text': 'Пост', 'image': self._photo('new.jpg'),
+        })
+        post.refresh_from_db()
+        self.assertEqual(post.image.name, old_name)
+        self.assertTrue(post.image_processing)
+        staging = images.staging_storage()
+        with staging.open(post.staged_image, 'wb') as file:
+            file.write(b'not an image')
+        with self.assertLogs('posts.images', 'WARNING'):
+            tasks.run_pending()
+        post.refresh_from_db()
+        self.assertEqual(post.image.name, old_name)
+        self.assertFalse(post.image_processing)
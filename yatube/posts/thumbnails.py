@@ -0,0 +1,162 @@
+"""Реестр миниатюр картинок постов.
+
+Размеры миниатюр объявлены здесь, а не в шаблонах: при загрузке
+картинки они ставятся в очередь (см. posts.tasks), а описание готовых
+миниатюр сохраняется в Post.thumbnails. Пока его нет, шаблон
+показывает оригинал.
+
+Для каждого вида картинки создаётся несколько ширин в современных
+форматах (AVIF, WebP — если их умеет установленный Pillow) и в JPEG
+для остальных браузеров.
+"""
+import json
+from collections import namedtuple
+
+from PIL import Image
+from sorl.thumbnail import default
+from sorl.thumbnail.base import EXTENSIONS, ThumbnailBackend
+from sorl.thumbnail.images import ImageFile
+
+from . import tasks
+from .models import Post
+
+FEED = 'feed'
+DETAIL = 'detail'
+
+Alias = namedtuple('Alias', 'width height options widths sizes')
+
+ALIASES = {
+    FEED: Alias(
+        900, 339, {'padding': True, 'upscale': True},
+        widths=(360, 640, 900),
+        sizes='(max-width: 960px) 100vw, 900px',
+    ),
+    DETAIL: Alias(
+        960, 339, {'crop': 'center', 'upscale': True},
+        widths=(360, 640, 960),
+        sizes='(max-width: 992px) 100vw, 66vw',
+    ),
+}
+
+FALLBACK_FORMAT = 'JPEG'
+MODERN_FORMATS = ('AVIF', 'WEBP')
+MIME_TYPES = {
+    'AVIF': 'image/avif',
+    'WEBP': 'image/webp',
+    'JPEG': 'image/jpeg',
+}
+FILE_EXTENSIONS = {**EXTENSIONS, 'AVIF': 'avif'}
+
+Variant = namedtuple('Variant', 'format width height geometry')
+
+
+def modern_formats():
+    """Современные форматы, в которые умеет писать установленный Pillow."""
+    Image.init()
+    return [format_ for format_ in MODERN_FORMATS if format_ in Image.SAVE]
+
+
+def variants(alias):
+    """Все варианты вида картинки.
+
+    Базовый JPEG идёт последним: адрес последнего варианта уходит
+    в src тега <img>.
+    """
+    spec = ALIASES[alias]
+    result = []
+    for format_ in [*modern_formats(), FALLBACK_FORMAT]:
+        for width in spec.widths:
+            height = round(spec.height * width / spec.width)
+            result.append(
+                Variant(format_, width, height, f'{width}x{height}')
+            )
+    result.sort(key=lambda variant: (
+        variant.format == FALLBACK_FORMAT and variant.width == spec.width
+    ))
+    return result
+
+
+class Backend(ThumbnailBackend):
+    """Бэкенд sorl, который знает расширение файлов AVIF."""
+
+    def _get_thumbnail_filename(self, source, geometry_string, options):
+        if options['format'] in EXTENSIONS:
+            return super()._get_thumbnail_filename(
+                source, geometry_string, options
+            )
+        name = super()._get_thumbnail_filename(
+            source, geometry_string, {**options, 'format': FALLBACK_FORMAT}
+        )
+        return '{}.{}'.format(
+            name.rsplit('.', 1)[0], FILE_EXTENSIONS[options['format']]
+        )
+
+
+backend = Backend()
+
+
+def make(source, alias):
+    """Создать варианты вида alias; None, если базовый не получился."""
+    spec = ALIASES[alias]
+    made = []
+    for variant in variants(alias):
+        thumbnail = backend.get_thumbnail(
+            source, variant.geometry,
+            **spec.options, format=variant.format,
+        )
+        if default.storage.exists(thumbnail.name):
+            made.append([variant.format, variant.width, thumbnail.name])
+    if not made or made[-1][:2] != [FALLBACK_FORMAT, spec.width]:
+        return None
+    return {'width': spec.width, 'height': spec.height, 'variants': made}
+
+
+def generate(name):
+    """Создать миниатюры картинки и сохранить их описание в постах.
+
+    После этого страницы строят <picture> по Post.thumbnails и не
+    обращаются ни к хранилищу ключей sorl, ни к файлам.
+    """
+    from .signals import expire_post_pages
+
+    source = ImageFile(name, default.storage)
+    if not source.exists():
+        return
+    data = {}
+    for alias in ALIASES:
+        made = make(source, alias)
+        if made is not None:
+            data[alias] = made
+    posts = Post.objects.filter(image=name)
+    posts.update(thumbnails=json.dumps(data) if data else '')
+    for post in posts.select_related('author'):
+        expire_post_pages(post, [post.group_id])
+
+
+def schedule(name):
+    """Поставить генерацию миниатюр в очередь (один раз на картинку)."""
+    tasks.enqueue(generate, name, key=f'thumbnails:{name}')
+
+
+def picture(post, alias):
+    """Данные для <picture> или None, если миниатюры ещё не готовы."""
+    data = post.get_thumbnails().get(alias)
+    if not data:
+        return None
+    srcsets = {}
+    for format_, width, name in data['variants']:
+        srcsets.setdefault(format_, []).append(
+            f'{default.storage.url(name)} {width}w'
+        )
+    fallback = srcsets.pop(FALLBACK_FORMAT)
+    return {
+        'sources': [
+            {'type': MIME_TYPES[format_], 'srcset': ', '.join(srcset)}
+            for format_, srcset in srcsets.items()
+        ],
+        'src': fallback[-1].rsplit(' ', 1)[0],
+        'srcset': ', '.join(fallback),
+        'sizes': ALIASES[alias].sizes,
+        'width': data['width'],
+        'height': data['height'],
+    }
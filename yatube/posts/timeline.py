@@ -0,0 +1,207 @@
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Count, F, Max
+
+from . import counters
+from .models import Counter, Follow, Post, TimelineEntry
+from .queries import feed_queryset
+
+FANOUT_BATCH_SIZE = 1000
+# Авторов за один запрос при перестройке лент: по параметру на автора.
+REBUILD_BATCH_SIZE = 500
+
+
+def celebrity_ids(author_ids):
+    """Авторы, чьи посты не раскладываются, а подтягиваются при чтении."""
+    return Counter.objects.filter(
+        scope=counters.FOLLOWERS,
+        key__in=author_ids,
+        value__gt=settings.TIMELINE_FANOUT_LIMIT,
+    ).values_list('key', flat=True)
+
+
+def _entries(user_id, posts):
+    return [
+        TimelineEntry(user_id=user_id, post_id=post_id,
+                      author_id=author_id, pub_date=pub_date)
+        for post_id, author_id, pub_date in posts
+    ]
+
+
+def fan_out(post):
+    """Разложить новый пост по лентам подписчиков автора."""
+    if counters.get_count(counters.FOLLOWERS, post.author_id) > (
+        settings.TIMELINE_FANOUT_LIMIT
+    ):
+        return
+    follower_ids = Follow.objects.filter(
+        author_id=post.author_id
+    ).values_list('user_id', flat=True)
+    row = (post.pk, post.author_id, post.pub_date)
+    batch = []
+    for user_id in follower_ids.iterator(chunk_size=FANOUT_BATCH_SIZE):
+        batch.extend(_entries(user_id, [row]))
+        if len(batch) >= FANOUT_BATCH_SIZE:
+            _add(batch)
+            batch = []
+    _add(batch)
+
+
+def _add(entries):
+    """Записи нового поста и +1 к заведённым счётчикам их лент."""
+    TimelineEntry.objects.bulk_create(entries, ignore_conflicts=True)
+    Counter.objects.filter(
+        scope=counters.TIMELINE,
+        key__in=[entry.user_id for entry in entries],
+    ).update(value=F('value') + 1)
+
+
+def fan_out_loaded(last_id):
+    """Разложить посты массовой загрузки с id больше last_id.
+
+    Одним INSERT ... SELECT из подписок на авторов этих постов; авторы
+    без раскладки пропускаются, как в fan_out. Вызывается в транзакции
+    загрузки, пока в неё не попали чужие посты. Счётчики лент
+    затронутых читателей сбрасываются.
+    """
+    quote = connection.ops.quote_name
+    post_table = quote(Post._meta.db_table)
+    follow_table = quote(Follow._meta.db_table)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {quote(TimelineEntry._meta.db_table)} '
+            '(user_id, post_id, author_id, pub_date) '
+            'SELECT follow.user_id, post.id, post.author_id, post.pub_date '
+            f'FROM {post_table} post JOIN {follow_table} follow '
+            'ON follow.author_id = post.author_id '
+            'WHERE post.id > %s AND post.author_id IN ('
+            f'SELECT author_id FROM {follow_table} WHERE author_id IN ('
+            f'SELECT author_id FROM {post_table} WHERE id > %s) '
+            'GROUP BY author_id HAVING COUNT(*) <= %s)',
+            [last_id, last_id, settings.TIMELINE_FANOUT_LIMIT],
+        )
+        created = cursor.rowcount
+    Counter.objects.filter(
+        scope=counters.TIMELINE,
+        key__in=Follow.objects.filter(
+            author_id__in=Post.objects.filter(id__gt=last_id).values(
+                'author_id'
+            )
+        ).values('user_id'),
+    ).delete()
+    return created
+
+
+def reset_counts(author_id):
+    """Сбросить счётчики лент подписчиков автора после удаления поста."""
+    Counter.objects.filter(
+        scope=counters.TIMELINE,
+        key__in=Follow.objects.filter(author_id=author_id).values('user_id'),
+    ).delete()
+
+
+def _latest_posts(author_id, newer_than=None):
+    posts = Post.objects.filter(author_id=author_id)
+    if newer_than is not None:
+        posts = posts.filter(pub_date__gt=newer_than)
+    return posts.order_by('-pub_date', '-id').values_list(
+        'id', 'author_id', 'pub_date'
+    )[:settings.TIMELINE_BACKFILL]
+
+
+def backfill(user_id, author_id):
+    """Добавить в ленту последние посты автора после подписки."""
+    TimelineEntry.objects.bulk_create(
+        _entries(user_id, _latest_posts(author_id)), ignore_conflicts=True
+    )
+    counters.reset(counters.TIMELINE, user_id)
+
+
+def remove(user_id, author_id):
+    """Убрать из ленты посты автора после отписки."""
+    TimelineEntry.objects.filter(user_id=user_id, author_id=author_id).delete()
+    counters.reset(counters.TIMELINE, user_id)
+
+
+def pull(user):
+    """Подтянуть в ленту новые посты авторов без раскладки."""
+    author_ids = celebrity_ids(user.follower.values('author_id'))
+    for author_id in author_ids:
+        newer_than = TimelineEntry.objects.filter(
+            user=user, author_id=author_id
+        ).aggregate(latest=Max('pub_date'))['latest']
+        entries = _entries(user.pk, _latest_posts(author_id, newer_than))
+        if entries:
+            TimelineEntry.objects.bulk_create(entries, ignore_conflicts=True)
+            counters.reset(counters.TIMELINE, user.pk)
+
+
+def _backfill_sql(authors_number):
+    """INSERT ... SELECT: последние посты авторов всем их подписчикам."""
+    quote = connection.ops.quote_name
+    placeholders = ', '.join(['%s'] * authors_number)
+    return (
+        f'INSERT INTO {quote(TimelineEntry._meta.db_table)} '
+        '(user_id, post_id, author_id, pub_date) '
+        'SELECT follow.user_id, post.id, post.author_id, post.pub_date '
+        f'FROM {quote(Follow._meta.db_table)} follow JOIN ('
+        'SELECT id, author_id, pub_date, row_number() OVER ('
+        'PARTITION BY author_id ORDER BY pub_date DESC, id DESC) AS number '
+        f'FROM {quote(Post._meta.db_table)} '
+        f'WHERE author_id IN ({placeholders})'
+        ') post ON post.author_id = follow.author_id '
+        'WHERE post.number <= %s'
+    )
+
+
+def _backfill(author_ids):
+    with connection.cursor() as cursor:
+        cursor.execute(
+            _backfill_sql(len(author_ids)),
+            [*author_ids, settings.TIMELINE_BACKFILL],
+        )
+        return cursor.rowcount
+
+
+def rebuild(batch_size=REBUILD_BATCH_SIZE):
+    """Разложить ленты подписок заново, например после seed_db.
+
+    Каждому подписчику достаются TIMELINE_BACKFILL последних постов
+    автора, как при подписке. Посты авторов без раскладки подтягиваются
+    при чтении. Авторы обрабатываются пачками по batch_size.
+
+    Записи, добавленные раскладкой сверх TIMELINE_BACKFILL, пропадают:
+    для загрузки постов в живую базу есть fan_out_loaded.
+    """
+    author_ids = Follow.objects.values('author_id').annotate(
+        followers=Count('id')
+    ).filter(
+        followers__lte=settings.TIMELINE_FANOUT_LIMIT
+    ).order_by('author_id').values_list('author_id', flat=True)
+    created = 0
+    with transaction.atomic():
+        # Одним запросом: delete() ORM выбирал бы записи, чтобы
+        # отправить сигналы удаления.
+        with connection.cursor() as cursor:
+            cursor.execute('DELETE FROM {}'.format(
+                connection.ops.quote_name(TimelineEntry._meta.db_table)
+            ))
+        batch = []
+        for author_id in author_ids.iterator(chunk_size=batch_size):
+            batch.append(author_id)
+            if len(batch) >= batch_size:
+                created += _backfill(batch)
+                batch = []
+        if batch:
+            created += _backfill(batch)
+        Counter.objects.filter(scope=counters.TIMELINE).delete()
+    return created
+
+
+def feed(user):
+    """Лента подписок: чтение диапазона по индексу (user, pub_date)."""
+    pull(user)
+    return feed_queryset(
+        TimelineEntry.objects.filter(user=user),
+        prefix='post__', fields=('pub_date', 'post'),
+    )
@@ -16,6 +16,8 @@ urlpatterns = [
         views.add_comment,
         name='add_comment'
     ),
+    path('search/', views.post_search, name='search'),
+    path('export/', views.post_export, name='export'),
     path('follow/', views.follow_index, name='follow_index'),
     path(
         'profile/<str:username>/follow/',
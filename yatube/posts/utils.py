@@ -1,9 +1,157 @@
+import base64
+
 from django.conf import settings
-from django.core.paginator import Paginator
+from django.core.exceptions import ValidationError
+from django.core.paginator import Page, Paginator
+from django.db.models import Q
+from django.utils.functional import cached_property
+
+
+class FeedPaginator(Paginator):
+    """Пагинатор, которому число записей сообщают снаружи.
+
+    count может быть числом или функцией без аргументов; без него
+    пагинатор, как обычно, выполняет COUNT(*).
+    """
+
+    def __init__(self, object_list, per_page, count=None):
+        super().__init__(object_list, per_page)
+        self._count = count
+
+    @cached_property
+    def count(self):
+        if self._count is None:
+            return super().count
+        if callable(self._count):
+            return self._count()
+        return self._count
+
+
+class CursorPaginator(FeedPaginator):
+    """Пагинатор по ключу (pub_date, id) без COUNT(*) и OFFSET.
+
+    Страница ищется по индексу от ключа крайней показанной записи,
+    поэтому глубокие страницы стоят столько же, сколько первая.
+    Позиция передаётся непрозрачными токенами ?after= и ?before=.
+    """
+    is_cursor = True
+    keys = ('pub_date', 'id')
+    LAST_PAGE = 'last'
+
+    def __init__(self, object_list, per_page, keys=None, count=None):
+        super().__init__(object_list, per_page, count=count)
+        if keys is not None:
+            self.keys = keys
+        self._fields = self.key_fields()
+        self.next_cursor = None
+        self.previous_cursor = None
+        self._has_next = False
+        self._has_previous = False
+
+    def key_fields(self):
+        """Поля модели, из которых собирается ключ курсора."""
+        model = self.object_list.model
+        return [model._meta.get_field(key) for key in self.keys]
+
+    @property
+    def num_pages(self):
+        """Номер страницы известен только относительно соседних."""
+        return 1 + self._has_previous + self._has_next
+
+    def validate_number(self, number):
+        return number
+
+    def encode_cursor(self, obj):
+        raw = '|'.join(
+            str(getattr(obj, field.attname)) for field in self._fields
+        )
+        return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+    def decode_cursor(self, cursor):
+        """Вернуть значения ключа или None, если токен испорчен."""
+        try:
+            raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+            values = raw.decode().split('|')
+        except ValueError:
+            return None
+        if len(values) != len(self._fields):
+            return None
+        try:
+            return [
+                field.to_python(value)
+                for field, value in zip(self._fields, values)
+            ]
+        except ValidationError:
+            return None
+
+    def _seek_filter(self, values, lookup):
+        """Условие (k1, k2, ...) < (v1, v2, ...) для составного ключа.
+
+        Лишняя граница k1 <= v1 даёт планировщику диапазон по индексу
+        вместо объединения нескольких поисков через OR.
+        """
+        condition = None
+        for key, value in reversed(list(zip(self.keys, values))):
+            step = Q(**{f'{key}__{lookup}': value})
+            if condition is not None:
+                step |= Q(**{key: value}) & condition
+            condition = step
+        return Q(**{f'{self.keys[0]}__{lookup}e': values[0]}) & condition
+
+    def _ordering(self, descending=True):
+        prefix = '-' if descending else ''
+        return [f'{prefix}{key}' for key in self.keys]
+
+    def window(self, values=None, forward=True):
+        """Запрос per_page + 1 записей после ключа (или до него)."""
+        queryset = self.object_list
+        if values is not None:
+            queryset = queryset.filter(
+                self._seek_filter(values, 'lt' if forward else 'gt')
+            )
+        return queryset.order_by(*self._ordering(forward))[:self.per_page + 1]
+
+    def seek(self, after=None, before=None):
+        """Вернуть страницу после/до курсора или первую страницу."""
+        values = self.decode_cursor(before) if before else None
+        if before == self.LAST_PAGE:
+            rows = list(self.window(forward=False))
+            self._has_previous = len(rows) > self.per_page
+            rows = rows[:self.per_page][::-1]
+        elif values is not None:
+            rows = list(self.window(values, forward=False))
+            self._has_previous = len(rows) > self.per_page
+            self._has_next = True
+            rows = rows[:self.per_page][::-1]
+        else:
+            values = self.decode_cursor(after) if after else None
+            self._has_previous = values is not None
+            rows = list(self.window(values))
+            self._has_next = len(rows) > self.per_page
+            rows = rows[:self.per_page]
+        if rows:
+            self.previous_cursor = self.encode_cursor(rows[0])
+            self.next_cursor = self.encode_cursor(rows[-1])
+        return Page(rows, 1 + self._has_previous, self)
+
 
+def paginator_function(posts, request, count=None, keys=None):
+    """Страница ленты: по курсору, а по ?page=N — в режиме совместимости.
 
-def paginator_function(posts, request):
-    paginator = Paginator(posts, settings.NUM_POSTS_ON_PAGE)
+    count — число записей ленты или функция, которая его вернёт
+    (см. posts.counters), чтобы не считать ленту заново. keys — поля
+    ключа курсора, если лента упорядочена не по (pub_date, id).
+    """
     page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
-    return page_obj
+    if page_number is not None:
+        paginator = FeedPaginator(
+            posts, settings.NUM_POSTS_ON_PAGE, count=count
+        )
+        return paginator.get_page(page_number)
+    paginator = CursorPaginator(
+        posts, settings.NUM_POSTS_ON_PAGE, keys=keys, count=count
+    )
+    return paginator.seek(
+        after=request.GET.get('after'),
+        before=request.GET.get('before'),
+    )
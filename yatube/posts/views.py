@@ -1,9 +1,18 @@
+from functools import partial
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib.auth import get_user_model
 from django.contrib.auth.decorators import login_required
+from django.db import transaction
+from django.http import Http404, StreamingHttpResponse
 from django.shortcuts import get_object_or_404, redirect, render
 
+from . import counters, export, feed_cache, images, search, timeline
 from .forms import CommentForm, PostForm
-from .models import Comment, Follow, Group, Post
+from .models import Follow, Group, Post
+from .queries import comments_queryset, feed_queryset, post_detail_queryset
 from .utils import paginator_function
 
 User = get_user_model()
@@ -11,9 +20,14 @@ User = get_user_model()
 
 @login_required
 def follow_index(request):
-    posts = Post.objects.filter(author__following__user=request.user)
+    page_obj = paginator_function(
+        timeline.feed(request.user), request,
+        count=partial(counters.follow_feed_count, request.user),
+        keys=('pub_date', 'post_id'),
+    )
+    page_obj.object_list = [entry.post for entry in page_obj]
     context = {
-        'page_obj': paginator_function(posts, request),
+        'page_obj': page_obj,
     }
     return render(request, 'posts/follow_index.html', context)
 
@@ -52,7 +66,11 @@ def post_create(request):
     if form.is_valid():
         new_post = form.save(commit=False)
         new_post.author = request.user
-        new_post.save()
+        staged = images.defer(new_post)
+        with transaction.atomic():
+            new_post.save()
+            if staged:
+                images.schedule(new_post)
         return redirect('posts:profile', request.user.username)
     return render(request, 'posts/create_post.html', {'form': form})
 
@@ -65,7 +83,12 @@ def post_edit(request, pk):
     form = PostForm(request.POST or None,
                     files=request.FILES or None, instance=post)
     if form.is_valid():
-        form.save()
+        post = form.save(commit=False)
+        staged = images.defer(post)
+        with transaction.atomic():
+            post.save(update_fields=images.edited_fields(form, staged))
+            if staged:
+                images.schedule(post)
         return redirect('posts:post_detail', pk)
     else:
         return render(
@@ -76,42 +99,118 @@ def post_edit(request, pk):
 
 def profile(request, username):
     author = get_object_or_404(User, username=username)
-    posts = author.posts.all()
-    following = author.following.exists()
+    posts = feed_queryset(author.posts.all())
+    counts = counters.get_scopes(
+        (counters.AUTHOR_POSTS, counters.FOLLOWERS, counters.FOLLOWING),
+        author.pk,
+    )
     context = {
         'author': author,
-        'page_obj': paginator_function(posts, request),
-        'following': following,
+        'page_obj': paginator_function(
+            posts, request, count=counts[counters.AUTHOR_POSTS]
+        ),
+        'posts_count': counts[counters.AUTHOR_POSTS],
+        'followers_count': counts[counters.FOLLOWERS],
+        'following_count': counts[counters.FOLLOWING],
+        'feed_version': feed_cache.feed_version(
+            request, feed_cache.profile_scope(author.username)
+        ),
     }
     return render(request, 'posts/profile.html', context)
 
 
 def post_detail(request, post_id):
-    post = get_object_or_404(Post, id=post_id)
+    post = get_object_or_404(post_detail_queryset(), id=post_id)
     form = CommentForm(request.POST or None)
-    comments = Comment.objects.filter(post=post)
+    comments = comments_queryset(post)
     context = {
         'post': post,
         'form': form,
         'comments': comments,
+        'author_posts_count': counters.get_count(
+            counters.AUTHOR_POSTS, post.author_id
+        ),
     }
     return render(request, 'posts/post_detail.html', context)
 
 
 def group_posts(request, slug):
     group = get_object_or_404(Group, slug=slug)
-    posts = group.posts.all()
+    posts = feed_queryset(group.posts.all())
     context = {
         'group': group,
-        'page_obj': paginator_function(posts, request),
+        'page_obj': paginator_function(
+            posts, request,
+            count=partial(
+                counters.get_count, counters.GROUP_POSTS, group.pk
+            ),
+        ),
+        'feed_version': feed_cache.feed_version(
+            request, feed_cache.group_scope(group.slug)
+        ),
     }
 
     return render(request, 'posts/group_list.html', context)
 
 
+def post_search(request):
+    query = request.GET.get('q', '').strip()
+    page_obj = None
+    if query and search.is_available():
+        page_obj = search.SearchPaginator(
+            query, settings.NUM_POSTS_ON_PAGE
+        ).seek(
+            after=request.GET.get('after'),
+            before=request.GET.get('before'),
+        )
+    elif query:
+        page_obj = paginator_function(
+            feed_queryset(search.search_queryset(query)), request
+        )
+    context = {
+        'query': query,
+        'page_obj': page_obj,
+        'extra_query': urlencode({'q': query}),
+    }
+    return render(request, 'posts/search.html', context)
+
+
 def index(request):
-    posts = Post.objects.all()
+    posts = feed_queryset()
     context = {
-        'page_obj': paginator_function(posts, request),
+        'page_obj': paginator_function(
+            posts, request,
+            count=partial(counters.get_count, counters.POSTS),
+        ),
+        'feed_version': feed_cache.feed_version(request, feed_cache.INDEX),
     }
     return render(request, 'posts/index.html', context)
+
+
+@staff_member_required
+def post_export(request):
+    """Посты сайта, группы (?group=) или автора (?author=) файлом.
+
+    Формат — ?format=ndjson (по умолчанию) или csv.
+    """
+    file_format = request.GET.get('format', 'ndjson')
+    if file_format not in export.FORMATS:
+        raise Http404
+    posts = Post.objects.all()
+    name = 'posts'
+    if 'group' in request.GET:
+        group = get_object_or_404(Group, slug=request.GET['group'])
+        posts = posts.filter(group=group)
+        name = f'group-{group.slug}'
+    if 'author' in request.GET:
+        author = get_object_or_404(User, username=request.GET['author'])
+        posts = posts.filter(author=author)
+        name = f'author-{author.pk}'
+    response = StreamingHttpResponse(
+        export.stream(posts, file_format),
+        content_type=export.FORMATS[file_format],
+    )
+    response['Content-Disposition'] = (
+        f'attachment; filename="{name}.{file_format}"'
+    )
+    return response
@@ -10,7 +10,11 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/2.2/ref/settings/
 """
 
+import atexit
 import os
+import shutil
+import sys
+import tempfile
 
 # Build paths inside the project like this: os.path.join(BASE_DIR, ...)
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -50,26 +54,33 @@ INSTALLED_APPS = [
     "core.apps.CoreConfig",
     "about.apps.AboutConfig",
     "sorl.thumbnail",
-    "debug_toolbar",
 ]
 
 MIDDLEWARE = [
+    "core.middleware.ProfilerMiddleware",
+    "core.middleware.TimingMiddleware",
     "django.middleware.security.SecurityMiddleware",
+    "core.middleware.StaticFilesMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
     "django.contrib.auth.middleware.AuthenticationMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
+    "posts.middleware.PageCacheMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
-    "debug_toolbar.middleware.DebugToolbarMiddleware",
 ]
 
 ROOT_URLCONF = "yatube.urls"
 
 TEMPLATES_DIR = os.path.join(BASE_DIR, "templates")
+# Без "loaders" в OPTIONS и при DEBUG = False Django сам оборачивает
+# загрузчики в django.template.loaders.cached.Loader: шаблоны читаются
+# и разбираются один раз на процесс.
 TEMPLATES = [
     {
-        "BACKEND": "django.template.backends.django.DjangoTemplates",
+        # DjangoTemplates, который замеряет время рендеринга (core.timing).
+        "BACKEND": "core.template_backend.DjangoTemplates",
+        "NAME": "django",
         "DIRS": [TEMPLATES_DIR],
         "APP_DIRS": True,
         "OPTIONS": {
@@ -85,6 +96,9 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = "yatube.wsgi.application"
+# Сколько запросов yatube.asgi выполняет одновременно: размер пула
+# потоков и наибольшее число соединений с базой.
+ASGI_THREADS = 16
 
 
 # Database
@@ -136,9 +150,28 @@ USE_TZ = True
 
 STATIC_URL = "/static/"
 STATICFILES_DIRS = [os.path.join(BASE_DIR, "static")]
+STATIC_ROOT = os.path.join(BASE_DIR, "staticfiles")
+# collectstatic добавляет к именам хеш и пишет сжатые копии .gz/.br.
+STATICFILES_STORAGE = "core.staticfiles.CompressedManifestStaticFilesStorage"
+# Отдавать статику через core.middleware.StaticFilesMiddleware; False,
+# если её отдаёт веб-сервер перед Django.
+SERVE_STATIC = True
+# Сколько секунд браузеры и прокси хранят файлы с хешем в имени.
+STATIC_IMMUTABLE_MAX_AGE = 365 * 24 * 60 * 60
 
 NUM_POSTS_ON_PAGE = 10
 
+# Лента подписок раскладывается по читателям при публикации поста.
+# У авторов с большим числом подписчиков посты подтягиваются при чтении.
+TIMELINE_FANOUT_LIMIT = 1000
+# Сколько последних постов автора добавляется в ленту при подписке.
+TIMELINE_BACKFILL = 200
+
+# Сколько секунд хранится общее для всех читателей тело страницы.
+PAGE_CACHE_TIMEOUT = 300
+# Сколько секунд хранится фрагмент страницы пользователя (posts.holes).
+HOLE_CACHE_TIMEOUT = 300
+
 LOGIN_URL = "users:login"
 LOGIN_REDIRECT_URL = "posts:index"
 # LOGOUT_REDIRECT_URL = 'posts:index'
@@ -150,13 +183,71 @@ CSRF_FAILURE_VIEW = "core.views.csrf_failure"
 
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+# Имена загрузок содержат хеш содержимого (см. core.storage).
+DEFAULT_FILE_STORAGE = 'core.storage.HashedMediaStorage'
+# Отдавать загрузки через core.views.media; False, если их отдаёт
+# веб-сервер перед Django.
+SERVE_MEDIA = True
+# Сколько секунд браузеры и прокси хранят файлы с неизменным адресом.
+MEDIA_IMMUTABLE_MAX_AGE = 365 * 24 * 60 * 60
+# Картинки из форм ждут фоновой обработки (posts.images) здесь, вне
+# MEDIA_ROOT.
+IMAGE_STAGING_ROOT = os.path.join(BASE_DIR, 'staging')
+# Длинная сторона обработанной картинки, пикселей.
+IMAGE_MAX_SIZE = 2560
+IMAGE_QUALITY = 85
 
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'BACKEND': 'core.cache.SQLiteCache',
+        'LOCATION': os.path.join(BASE_DIR, 'cache', 'default.sqlite3'),
+        'OPTIONS': {
+            'MAX_ENTRIES': 50000,
+            'CLEAR_ON_MIGRATE': True,
+        },
     }
 }
 
+# Выборочное профилирование запросов (core.profiler). Включается здесь
+# или без перезапуска созданием PROFILER_SIGNAL_FILE; JSON в этом файле
+# заменяет PROFILER_RATES. Пока не задано ни то, ни другое, middleware
+# профилировщика не подключается. Файл-сигнал задаётся явно, например
+# os.path.join(PROFILER_DIR, 'enabled').
+PROFILER_ENABLED = False
+PROFILER_DIR = os.path.join(BASE_DIR, 'profiles')
+PROFILER_SIGNAL_FILE = None
+# Доля профилируемых запросов по имени маршрута, '*' — для остальных.
+PROFILER_RATES = {'*': 0.01}
+# Как часто снимать стек запроса, секунд.
+PROFILER_INTERVAL = 0.005
+
+# Замеры SQL, кеша и шаблонов по маршрутам (core.timing): копятся в
+# файле TIMING_LOCATION, сбрасываются туда раз в TIMING_FLUSH_EVERY
+# запросов, выводятся командой timing_stats.
+TIMING_LOCATION = os.path.join(BASE_DIR, 'cache', 'timing.sqlite3')
+TIMING_FLUSH_EVERY = 20
+# Отдавать замеры клиенту в заголовке Server-Timing.
+SERVER_TIMING = True
+
+# Тесты (manage.py test и pytest) держат кеш, замеры и загрузки в
+# обработке во временной папке: иначе они стирали бы кеш запущенного
+# сервера и оставляли ему свои страницы и файлы.
+TESTING = sys.argv[1:2] == ['test'] or 'pytest' in sys.modules
+if TESTING:
+    TEST_RUNTIME_DIR = tempfile.mkdtemp(prefix='yatube-tests-')
+    atexit.register(shutil.rmtree, TEST_RUNTIME_DIR, ignore_errors=True)
+    CACHES['default']['LOCATION'] = os.path.join(
+        TEST_RUNTIME_DIR, 'default.sqlite3'
+    )
+    TIMING_LOCATION = os.path.join(TEST_RUNTIME_DIR, 'timing.sqlite3')
+    IMAGE_STAGING_ROOT = os.path.join(TEST_RUNTIME_DIR, 'staging')
+
+# debug_toolbar только для разработки: в продакшене он лишь замедляет
+# каждый запрос.
+if DEBUG:
+    INSTALLED_APPS += ["debug_toolbar"]
+    MIDDLEWARE += ["debug_toolbar.middleware.DebugToolbarMiddleware"]
+
 INTERNAL_IPS = [
     '127.0.0.1',
 ]